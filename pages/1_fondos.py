@@ -15,6 +15,7 @@ st.set_page_config(
 
 # Importaciones de funciones compartidas
 from src.utils import load_funds_from_db
+from src.nav_cache import get_nav_cache
 from src.data_manager import request_new_fund
 from src.config import HORIZONTE_OPCIONES, HORIZONTE_DEFAULT_INDEX
 from src.auth import page_init_and_auth, logout_user
@@ -47,6 +48,7 @@ with col1:
 with col2:
     if st.button("🔄 Recargar Catálogo", help="Vuelve a leer la base de datos"):
         st.cache_data.clear()
+        get_nav_cache().clear()
         st.toast("Catálogo recargado desde la base de datos.")
         st.rerun()
 
@@ -75,7 +77,9 @@ def load_data_with_metrics(selected_horizon: str):
         query = """
             SELECT
                 f.isin, f.name, f.ter, f.gestora, f.domicilio, f.srri, f.morningstar_category, f.currency, f.performance_id,
-                m.annualized_return_pct, m.volatility_pct, m.sharpe_ratio, m.sortino_ratio, m.calmar_ratio
+                m.annualized_return_pct, m.volatility_pct, m.sharpe_ratio, m.sortino_ratio, m.calmar_ratio,
+                m.var_hist_pct, m.cvar_hist_pct, m.var_param_pct, m.cvar_param_pct,
+                m.ulcer_index, m.max_drawdown_days, m.recovery_days
             FROM funds f
             LEFT JOIN fund_metrics m ON f.isin = m.isin AND m.horizon = %(horizon)s
         """
@@ -165,6 +169,16 @@ df_filtered = create_dynamic_slider(df_filtered, 'sharpe_ratio', 'Rango de Ratio
 df_filtered = create_dynamic_slider(df_filtered, 'sortino_ratio', 'Rango de Ratio de Sortino', step=0.1)
 df_filtered = create_dynamic_slider(df_filtered, 'calmar_ratio', 'Rango de Ratio de Calmar', step=0.1)
 
+# Riesgo extremo y caídas (VaR/CVaR diarios al 95%, en % negativo si es pérdida)
+st.sidebar.subheader("Riesgo extremo y caídas")
+df_filtered = create_dynamic_slider(df_filtered, 'var_hist_pct', 'VaR histórico diario 95% (%)', step=0.05)
+df_filtered = create_dynamic_slider(df_filtered, 'cvar_hist_pct', 'CVaR histórico diario 95% (%)', step=0.05)
+df_filtered = create_dynamic_slider(df_filtered, 'var_param_pct', 'VaR paramétrico diario 95% (%)', step=0.05)
+df_filtered = create_dynamic_slider(df_filtered, 'cvar_param_pct', 'CVaR paramétrico diario 95% (%)', step=0.05)
+df_filtered = create_dynamic_slider(df_filtered, 'ulcer_index', 'Índice Ulcer', step=0.1)
+df_filtered = create_dynamic_slider(df_filtered, 'max_drawdown_days', 'Duración máxima de caída (días)')
+df_filtered = create_dynamic_slider(df_filtered, 'recovery_days', 'Días de recuperación de la caída máxima')
+
 # --- BÚSQUEDA RÁPIDA (TEXTO) ---
 st.markdown("---")
 search_term = st.text_input("🔎 Búsqueda rápida por Nombre o ISIN", placeholder="Escribe para filtrar...")
@@ -181,7 +195,8 @@ st.write(f"Mostrando **{len(df_filtered)}** de **{len(df_display)}** fondos.")
 df_filtered['seleccionar'] = False
 df_editable = st.data_editor(
     df_filtered,
-    column_order=("seleccionar", "name", "morningstar_url", "ter", "annualized_return_pct", "volatility_pct", "sharpe_ratio", "sortino_ratio", "calmar_ratio"),
+    column_order=("seleccionar", "name", "morningstar_url", "ter", "annualized_return_pct", "volatility_pct", "sharpe_ratio", "sortino_ratio", "calmar_ratio",
+                  "cvar_hist_pct", "ulcer_index", "max_drawdown_days", "recovery_days"),
     column_config={
         "seleccionar": st.column_config.CheckboxColumn(required=True),
         "name": st.column_config.TextColumn("Nombre", width="large"),
@@ -192,6 +207,10 @@ df_editable = st.data_editor(
         "sharpe_ratio": st.column_config.NumberColumn(f"Sharpe {horizonte}", format="%.2f"),
         "sortino_ratio": st.column_config.NumberColumn(f"Sortino {horizonte}", format="%.2f"),
         "calmar_ratio": st.column_config.NumberColumn(f"Calmar {horizonte}", format="%.2f"),
+        "cvar_hist_pct": st.column_config.NumberColumn(f"CVaR 95% {horizonte}", format="%.2f%%"),
+        "ulcer_index": st.column_config.NumberColumn(f"Ulcer {horizonte}", format="%.2f"),
+        "max_drawdown_days": st.column_config.NumberColumn("Caída más larga (días)", format="%d"),
+        "recovery_days": st.column_config.NumberColumn("Recuperación (días)", format="%d"),
         "currency": "Moneda",
         "performance_id": None # Ocultar esta columna
     },
@@ -80,7 +80,7 @@ def calculate_portfolio_metrics(cartera_tuple, horizonte_seleccionado):
 
     isines = tuple(pesos.keys())
     # _data_manager se pasa implícitamente por el cache
-    all_navs = load_all_navs(data_manager, isines)
+    all_navs = load_all_navs(data_manager, isines, horizonte_seleccionado)
     if all_navs.empty:
         return {"nombre": nombre_cartera}
     
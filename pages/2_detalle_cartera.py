@@ -8,16 +8,19 @@ st.set_page_config(layout="wide")
 
 from src.auth import page_init_and_auth
 from src.database import save_user_data
-from src.utils import load_funds_from_db, load_all_navs
+from src.utils import load_funds_from_db, load_all_navs, load_fresh_fund_metrics
 from src.portfolio import Portfolio
+from src.backtest import DEFAULT_REBALANCE_BAND
 from src.data_manager import DataManager, filtrar_por_horizonte
-from src.metrics import calcular_metricas_desde_rentabilidades
+from src.metrics_service import get_fund_metrics
 from src.optimizer import optimize_portfolio
 from src.components.detalle_cartera_view import (
     render_analysis_sidebar,
     render_portfolio_summary,
     render_composition_controls,
-    render_funds_analysis
+    render_funds_analysis,
+    render_cashflow_simulation,
+    render_montecarlo_projection
 )
 
 # --- LÓGICA DE NEGOCIO ENCAPSULADA ---
@@ -40,7 +43,8 @@ def handle_optimization(run_optimization, daily_returns, modelo_seleccionado, ca
     else:
         st.error("No se pudo optimizar la cartera con los parámetros seleccionados.")
 
-def calculate_page_metrics(daily_returns, filtered_navs, pesos_cartera_activa, df_catalogo):
+def calculate_page_metrics(filtered_navs, pesos_cartera_activa, df_catalogo, horizonte,
+                           rebalanceo="daily", banda=DEFAULT_REBALANCE_BAND):
     # Cálculo del TER ponderado
     ter_ponderado = 0
     if pesos_cartera_activa:
@@ -49,24 +53,20 @@ def calculate_page_metrics(daily_returns, filtered_navs, pesos_cartera_activa, d
             ter_fondo = pd.to_numeric(ter_map.get(isin, 0), errors='coerce')
             ter_ponderado += (peso / 100) * (0 if pd.isna(ter_fondo) else ter_fondo)
 
-    # Cálculo de métricas de fondos individuales
+    # Métricas de fondos individuales: precalculadas en fund_metrics si están al día,
+    # el resto todas las columnas a la vez (sobre los NAVs, como el worker)
     mapa_datos_fondos = df_catalogo.set_index('isin').to_dict('index')
-    metricas_fondos = []
-    for isin in daily_returns.columns:
-        m = calcular_metricas_desde_rentabilidades(daily_returns[isin])
+    stored = load_fresh_fund_metrics(tuple(filtered_navs.columns), horizonte)
+    metricas_fondos = get_fund_metrics(filtered_navs, horizonte, stored=stored).to_dict('index')
+    for isin, m in metricas_fondos.items():
         m.update(mapa_datos_fondos.get(isin, {}))
-        metricas_fondos.append(m)
-    df_funds_metrics = pd.DataFrame(metricas_fondos)
+    df_funds_metrics = pd.DataFrame(list(metricas_fondos.values()))
 
     # Cálculo de métricas de la cartera
-    portfolio = Portfolio(filtered_navs, pesos_cartera_activa)
-    portfolio_metrics = {}
-    if portfolio and portfolio.nav is not None:
-        calculated_metrics = portfolio.calculate_metrics(risk_free_rate=0.0)
-        if calculated_metrics:
-            portfolio.metrics = calculated_metrics
-            portfolio_metrics = calculated_metrics
-            
+    portfolio = Portfolio(filtered_navs, pesos_cartera_activa, rebalance=rebalanceo, band=banda)
+    # Se calculan una vez y quedan en portfolio.metrics para las vistas
+    portfolio_metrics = portfolio.metrics
+
     return portfolio, portfolio_metrics, df_funds_metrics, ter_ponderado
 
 # --- INICIALIZACIÓN Y FLUJO PRINCIPAL ---
@@ -97,7 +97,7 @@ mapa_nombre_isin = {f"{row['name']} ({row['isin']})": row['isin'] for _, row in
 data_manager = DataManager()
 
 # 3. Renderizado de UI y obtención de parámetros del usuario
-horizonte, run_optimization, modelo_seleccionado = render_analysis_sidebar()
+horizonte, run_optimization, modelo_seleccionado, (rebalanceo, banda) = render_analysis_sidebar()
 pesos_cartera_activa = st.session_state.carteras[cartera_activa_nombre]["pesos"]
 with st.expander("✍️ Editar Composición"):
     render_composition_controls(pesos_cartera_activa, mapa_nombre_isin, mapa_isin_nombre)
@@ -108,7 +108,7 @@ if not isines_a_cargar:
     st.warning("Esta cartera está vacía. Añade fondos desde el expander de composición.")
     st.stop()
 
-all_navs_df = load_all_navs(data_manager, isines_a_cargar)
+all_navs_df = load_all_navs(data_manager, isines_a_cargar, horizonte)
 if all_navs_df.empty:
     st.warning("No se encontraron datos de precios para los fondos de esta cartera.")
     st.stop()
@@ -119,11 +119,16 @@ daily_returns = filtered_navs.pct_change().fillna(0)
 # 5. Lógica de negocio principal
 handle_optimization(run_optimization, daily_returns, modelo_seleccionado, cartera_activa_nombre)
 portfolio, portfolio_metrics, df_funds_metrics, ter_ponderado = calculate_page_metrics(
-    daily_returns, filtered_navs, pesos_cartera_activa, df_catalogo
+    filtered_navs, pesos_cartera_activa, df_catalogo, horizonte, rebalanceo, banda
 )
 
 # 6. Renderizado de resultados
 render_portfolio_summary(portfolio_metrics, pesos_cartera_activa, ter_ponderado, mapa_isin_nombre, horizonte)
+if rebalanceo not in ("daily", "none") and portfolio_metrics:
+    st.caption(f"🔁 {len(portfolio.rebalance_dates)} rebalanceos en el horizonte, "
+               f"rotación acumulada del {portfolio.turnover * 100:.1f}% de la cartera.")
+render_cashflow_simulation(portfolio)
+render_montecarlo_projection(daily_returns, pesos_cartera_activa)
 st.markdown("---")
 render_funds_analysis(df_funds_metrics, daily_returns, portfolio, mapa_isin_nombre, horizonte)
 
@@ -6,9 +6,11 @@ from streamlit_local_storage import LocalStorage
 
 # Importaciones de funciones compartidas
 from src.state import initialize_session_state
-from src.utils import load_all_navs, load_funds_from_db
+from src.utils import load_all_navs, load_funds_from_db, load_fresh_fund_metrics
 from src.data_manager import DataManager, filtrar_por_horizonte
+from src.metrics_service import get_fund_metrics
 from src.portfolio import Portfolio
+from src.components.detalle_cartera_view import render_rebalance_selector
 from src.config import HORIZONTE_OPCIONES, HORIZONTE_DEFAULT_INDEX
 from src.auth import page_init_and_auth, logout_user
 
@@ -101,6 +103,8 @@ horizonte = st.sidebar.selectbox(
             index=HORIZONTE_DEFAULT_INDEX,
             key="horizonte"
         )
+with st.sidebar:
+    rebalanceo, banda = render_rebalance_selector("rebalanceo_comparador")
 
 st.markdown("---")
 
@@ -112,7 +116,7 @@ for nombre_cartera in carteras_seleccionadas:
 
 data_manager = DataManager()
 with st.spinner(f"Cargando datos de precios para {len(todos_los_isines)} fondos seleccionados..."):
-    all_navs_df = load_all_navs(data_manager, tuple(sorted(todos_los_isines)))
+    all_navs_df = load_all_navs(data_manager, tuple(sorted(todos_los_isines)), horizonte)
 
 if all_navs_df.empty:
     st.error("No se pudieron cargar los datos de los fondos para la comparación."); st.stop()
@@ -130,30 +134,36 @@ for nombre_cartera in carteras_seleccionadas:
     navs_cartera = all_navs_df[isin_cartera].dropna(how='all')
     filtered_navs = filtrar_por_horizonte(navs_cartera, horizonte)
 
-    portfolio_obj = Portfolio(nav_data=filtered_navs, weights=pesos)
+    portfolio_obj = Portfolio(nav_data=filtered_navs, weights=pesos, rebalance=rebalanceo, band=banda)
     nombre_display = f"💼 {nombre_cartera}"
-    if portfolio_obj.daily_returns is not None and len(portfolio_obj.daily_returns.dropna()) > 1:
+    returns_cartera = portfolio_obj.daily_returns
+    if returns_cartera is not None and len(returns_cartera.dropna()) > 1:
         metricas = portfolio_obj.calculate_metrics(); metricas["nombre"] = nombre_display
         lista_metricas.append(metricas)
-        returns_a_correlacionar[nombre_display] = portfolio_obj.daily_returns # <-- Guardamos rentabilidades
+        returns_a_correlacionar[nombre_display] = returns_cartera # <-- Guardamos rentabilidades
     if portfolio_obj.nav is not None:
         navs_a_graficar[nombre_display] = portfolio_obj.nav
 
-# 2. Procesar los fondos individuales
-for isin in fondos_seleccionados_isines:
-    # Creamos un DF solo para este ISIN y eliminamos NaNs al final
-    nav_fondo = all_navs_df[[isin]].dropna()
-    filtered_navs = filtrar_por_horizonte(nav_fondo, horizonte)
-    
-    pesos = {isin: 100}
-    portfolio_obj = Portfolio(nav_data=filtered_navs, weights=pesos)
-    nombre_display = mapa_isin_nombre.get(isin, isin)
-    if portfolio_obj.daily_returns is not None and len(portfolio_obj.daily_returns.dropna()) > 1:
-        metricas = portfolio_obj.calculate_metrics(); metricas["nombre"] = nombre_display
-        lista_metricas.append(metricas)
-        returns_a_correlacionar[nombre_display] = portfolio_obj.daily_returns # <-- Guardamos rentabilidades
-    if portfolio_obj.nav is not None:
-        navs_a_graficar[nombre_display] = portfolio_obj.nav
+# 2. Procesar los fondos individuales (todos a la vez, como carteras de un solo fondo)
+if fondos_seleccionados_isines:
+    navs_fondos = filtrar_por_horizonte(all_navs_df[list(fondos_seleccionados_isines)], horizonte)
+    returns_fondos = navs_fondos.pct_change()
+    # Como en Portfolio.daily_returns, el primer día de cada fondo cuenta como rentabilidad 0
+    returns_fondos = returns_fondos.mask(navs_fondos.notna() & navs_fondos.shift().isna(), 0.0)
+    # Precalculadas en fund_metrics si están al día; el resto, en vivo sobre los NAVs
+    stored = load_fresh_fund_metrics(tuple(navs_fondos.columns), horizonte)
+    metricas_fondos = get_fund_metrics(navs_fondos, horizonte, stored=stored)
+    navs_normalizados = (1 + returns_fondos).cumprod() * 100
+
+    for isin in fondos_seleccionados_isines:
+        nombre_display = mapa_isin_nombre.get(isin, isin)
+        returns_fondo = returns_fondos[isin].dropna()
+        if len(returns_fondo) > 1:
+            metricas = metricas_fondos.loc[isin].to_dict(); metricas["nombre"] = nombre_display
+            lista_metricas.append(metricas)
+            returns_a_correlacionar[nombre_display] = returns_fondo # <-- Guardamos rentabilidades
+        if not returns_fondo.empty:
+            navs_a_graficar[nombre_display] = navs_normalizados[isin].dropna()
 
 # --- Visualización de Resultados ---
 # --- Visualización de Resultados ---
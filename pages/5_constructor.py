@@ -2,11 +2,13 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 
 from src.auth import page_init_and_auth
-from src.utils import load_funds_from_db, load_all_navs
+from src.utils import load_funds_from_db, load_all_navs, load_compact_navs
+from src.compact_navs import returns_inplace, memory_report
 from src.data_manager import DataManager, filtrar_por_horizonte
-from src.metrics import calcular_metricas_desde_rentabilidades
+from src.metrics import calcular_metricas_batch
 from src.optimizer import optimize_portfolio
 from src.database import save_user_data
 from src.portfolio import Portfolio
@@ -58,6 +60,13 @@ with st.sidebar:
         help="¿Cuántos fondos quieres que tenga la cartera final?"
     )
 
+    compact_mode = st.checkbox(
+        "Modo compacto (menos memoria)",
+        value=False,
+        help="Carga el universo en float32 y solo días hábiles (~4 veces menos memoria). "
+             "Las métricas pueden variar ligeramente al no contar los fines de semana."
+    )
+
     st.header("3. Define el Método de Búsqueda")
     preselection_method = st.radio(
         "Método de Preselección",
@@ -137,27 +146,37 @@ if run_build:
             st.stop()
 
         all_isins = tuple(df_filtered_catalog['isin'].unique())
-        all_navs_df = load_all_navs(data_manager, all_isins)
-        
-        if all_navs_df.empty:
-            st.error("No se encontraron datos de precios para los fondos filtrados.")
-            st.stop()
+        compact_report = None
+        if compact_mode:
+            compact_navs = load_compact_navs(data_manager, all_isins, horizonte)
+            if compact_navs is None:
+                st.error("No se encontraron datos de precios para los fondos filtrados.")
+                st.stop()
+            compact_report = memory_report(compact_navs)
+            # A partir de aquí la matriz contiene rentabilidades, no NAVs
+            returns_matrix = returns_inplace(compact_navs.values)
+            returns_isins = compact_navs.isins
+        else:
+            all_navs_df = load_all_navs(data_manager, all_isins, horizonte)
 
-        navs_filtered = filtrar_por_horizonte(all_navs_df, horizonte)
-        all_metrics = []
-        for isin in navs_filtered.columns:
-            returns = navs_filtered[isin].pct_change().dropna()
-            if len(returns) > 252: 
-                metrics = calcular_metricas_desde_rentabilidades(returns)
-                metrics['isin'] = isin
-                all_metrics.append(metrics)
-        
-        if not all_metrics:
+            if all_navs_df.empty:
+                st.error("No se encontraron datos de precios para los fondos filtrados.")
+                st.stop()
+
+            navs_filtered = filtrar_por_horizonte(all_navs_df, horizonte)
+            returns_matrix = navs_filtered.pct_change().to_numpy()
+            returns_isins = navs_filtered.columns
+
+        # Todas las métricas de todos los fondos en una pasada vectorizada
+        df_all_metrics = calcular_metricas_batch(returns_matrix)
+        df_all_metrics.index = pd.Index(returns_isins, name='isin')
+        n_returns = np.count_nonzero(~np.isnan(returns_matrix), axis=0)
+        df_all_metrics = df_all_metrics[n_returns > 252].reset_index()
+
+        if df_all_metrics.empty:
             st.error(f"No hay suficientes fondos con datos históricos en el horizonte de {horizonte}.")
             st.stop()
 
-        df_all_metrics = pd.DataFrame(all_metrics)
-
         if preselection_method == "Global (Top 50)":
             df_filtered_metrics = df_all_metrics[df_all_metrics['annualized_return_%'] >= min_return]
             if df_filtered_metrics.empty:
@@ -192,8 +211,12 @@ if run_build:
 
         with st.spinner("Fase 2: Realizando optimización profunda..."):
             top_isins = top_candidates['isin'].tolist()
-            navs_top_candidates = navs_filtered[top_isins]
-            returns_top_candidates = navs_top_candidates.pct_change().fillna(0)
+            if compact_mode:
+                returns_top_candidates = compact_navs.to_frame(top_isins).fillna(0)
+                navs_top_candidates = (1 + returns_top_candidates).cumprod()
+            else:
+                navs_top_candidates = navs_filtered[top_isins]
+                returns_top_candidates = navs_top_candidates.pct_change().fillna(0)
             model_map = {"Maximizar Ratio de Sharpe": "MSR", "Minimizar Volatilidad": "MV"}
             optimization_model = model_map.get(optimization_goal, "MSR")
             optimal_weights_series = optimize_portfolio(returns_top_candidates, model=optimization_model)
@@ -219,7 +242,8 @@ if run_build:
                 'final_metrics': final_metrics,
                 'final_pesos_dict': final_pesos_dict,
                 'optimization_goal': optimization_goal,
-                'num_assets': num_assets
+                'num_assets': num_assets,
+                'memory_report': compact_report
             }
 
 # --- BLOQUE DE DISPLAY Y GUARDADO ---
@@ -242,6 +266,14 @@ if 'constructor_results' in st.session_state:
     col2.metric("Volatilidad Estimada", f"{final_metrics.get('volatility_ann_%', 0):.2f}%")
     col3.metric("Ratio de Sharpe Estimado", f"{final_metrics.get('sharpe_ann', 0):.2f}")
 
+    report = results.get('memory_report')
+    if report:
+        st.caption(
+            f"Modo compacto: {report['funds']} fondos x {report['rows']} días hábiles en "
+            f"{report['compact_mb']:.1f} MB (frente a {report['float64_daily_mb']:.1f} MB en float64 diario, "
+            f"{report['ratio']:.0%}). Pico de memoria del proceso: {report['peak_rss_mb']:.0f} MB."
+        )
+
     st.write(f"Esta es la composición de tu cartera con **{len(df_adjusted)} fondos**:")
     st.dataframe(df_adjusted[['nombre', 'isin', 'final_weight']].rename(columns={'final_weight': 'Peso Final'}).style.format({'Peso Final': '{:.2f}%'}), use_container_width=True)
 
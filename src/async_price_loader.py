@@ -0,0 +1,96 @@
+# src/async_price_loader.py
+"""
+Carga concurrente de precios para conjuntos grandes de ISINs: el conjunto se
+parte en bloques que se leen a la vez con asyncio, cada uno con su propia
+conexión del pool y su propio COPY binario, de modo que mientras un bloque se
+decodifica los demás siguen llegando por la red.
+
+psycopg2 es síncrono, así que cada bloque se ejecuta con asyncio.to_thread
+(psycopg2 libera el GIL mientras espera al servidor). read_prices_concurrent
+es el envoltorio síncrono para Streamlit y los workers.
+"""
+
+import os
+import asyncio
+import concurrent.futures
+from datetime import date
+
+import numpy as np
+
+from src.db_connector import db_connection, get_pool
+from src.price_reader import PriceArrays, read_prices
+
+# ISINs por bloque (una consulta COPY por bloque)
+PRICE_LOADER_CHUNK_SIZE = int(os.getenv("PRICE_LOADER_CHUNK_SIZE", "200"))
+# Bloques en vuelo a la vez (conexiones del pool ocupadas)
+PRICE_LOADER_CONCURRENCY = int(os.getenv("PRICE_LOADER_CONCURRENCY", "4"))
+# Por debajo de este número de ISINs no compensa: se usa una sola consulta
+PRICE_LOADER_MIN_ISINS = int(os.getenv("PRICE_LOADER_MIN_ISINS", "400"))
+
+
+def _read_chunk(isins, watermarks: dict, start_date: date | None) -> PriceArrays:
+    with db_connection() as conn:
+        if not conn:
+            raise ConnectionError("No se pudo obtener una conexión del pool para leer precios.")
+        return read_prices(conn, isins, watermarks=watermarks, start_date=start_date)
+
+
+def merge_price_chunks(chunks) -> PriceArrays:
+    """
+    Une PriceArrays de bloques de ISINs disjuntos y ordenados entre sí
+    (el bloque i solo tiene ISINs menores que los del i+1) sin reordenar filas.
+    """
+    chunks = list(chunks)
+    isins = np.concatenate([chunk.isins for chunk in chunks]) if chunks else np.array([], dtype=object)
+    offsets = np.cumsum([0] + [len(chunk.isins) for chunk in chunks[:-1]])
+    if not chunks or not any(len(chunk) for chunk in chunks):
+        empty = np.array([], dtype=np.int32)
+        return PriceArrays(isins, empty, empty.copy(), np.array([], dtype=np.float64))
+    return PriceArrays(
+        isins=isins,
+        codes=np.concatenate([chunk.codes + np.int32(offset) for chunk, offset in zip(chunks, offsets)]),
+        dates=np.concatenate([chunk.dates for chunk in chunks]),
+        navs=np.concatenate([chunk.navs for chunk in chunks]),
+    )
+
+
+async def read_prices_async(isins, watermarks: dict | None = None, start_date: date | None = None,
+                            chunk_size: int = PRICE_LOADER_CHUNK_SIZE,
+                            concurrency: int = PRICE_LOADER_CONCURRENCY) -> PriceArrays:
+    """
+    Lee los precios de `isins` en bloques de `chunk_size` ISINs, con como
+    mucho `concurrency` consultas simultáneas. Mismo resultado que read_prices.
+    """
+    isins = sorted(set(isins))
+    watermarks = watermarks or {}
+    chunks = [isins[i:i + chunk_size] for i in range(0, len(isins), max(1, chunk_size))]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(chunk):
+        async with semaphore:
+            chunk_watermarks = {isin: watermarks[isin] for isin in chunk if isin in watermarks}
+            return await asyncio.to_thread(_read_chunk, chunk, chunk_watermarks, start_date)
+
+    results = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+    return merge_price_chunks(results)
+
+
+def read_prices_concurrent(isins, watermarks: dict | None = None, start_date: date | None = None,
+                           chunk_size: int = PRICE_LOADER_CHUNK_SIZE,
+                           concurrency: int = PRICE_LOADER_CONCURRENCY) -> PriceArrays:
+    """
+    Envoltorio síncrono de read_prices_async. La concurrencia se limita para
+    dejar siempre una conexión libre en el pool. Quien llama no debe retener
+    una conexión del pool mientras espera: dos llamadas a la vez que ya
+    tuvieran una cada una se bloquearían esperando las demás.
+    """
+    concurrency = max(1, min(concurrency, get_pool().maxconn - 1))
+    coroutine = read_prices_async(isins, watermarks=watermarks, start_date=start_date,
+                                  chunk_size=chunk_size, concurrency=concurrency)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    # Ya hay un bucle de eventos en este hilo (p. ej. un notebook): se usa otro hilo
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
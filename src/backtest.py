@@ -0,0 +1,149 @@
+# src/backtest.py
+"""
+Backtest de una cartera con distintas políticas de rebalanceo:
+  - "daily": pesos fijos cada día (lo que asume Portfolio por defecto),
+  - "none": comprar y mantener, los pesos derivan con los precios,
+  - "monthly" / "quarterly" / "yearly": vuelta a los pesos objetivo al
+    cierre del último día de cada periodo,
+  - "threshold": vuelta a los pesos objetivo cuando algún activo se aleja
+    más de `band` (en tanto por uno) de su peso objetivo.
+
+Entre dos rebalanceos la cartera es de comprar y mantener: el valor de cada
+activo es su importe inicial por el producto acumulado de (1 + r), así que
+cada tramo se calcula con un cumprod vectorizado y el bucle de Python es por
+rebalanceo, no por día. En "threshold" el primer día fuera de la banda se
+busca por bloques de BAND_SEARCH_DAYS días. Las rentabilidades NaN cuentan
+como 0, como en Portfolio.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+REBALANCE_POLICIES = ["daily", "none", "monthly", "quarterly", "yearly", "threshold"]
+# Desviación máxima por activo (en tanto por uno) antes de rebalancear en "threshold"
+DEFAULT_REBALANCE_BAND = 0.05
+# Días que se proyectan de una vez al buscar la salida de la banda
+BAND_SEARCH_DAYS = 63
+
+_CALENDAR_FREQ = {"monthly": "M", "quarterly": "Q", "yearly": "Y"}
+
+
+class BacktestResult(NamedTuple):
+    """
+    `returns` son las rentabilidades diarias de la cartera (la primera, 0),
+    `nav` su valor empezando en 100, `weights` los pesos al cierre de cada
+    día (ya rebalanceados los días de rebalanceo), `rebalance_dates` esos
+    días y `turnover` la suma de lo negociado en cada rebalanceo (en tanto
+    por uno del valor de la cartera).
+    """
+    returns: pd.Series
+    nav: pd.Series
+    weights: pd.DataFrame
+    rebalance_dates: pd.DatetimeIndex
+    turnover: float
+
+
+def calendar_rebalance_positions(dates: pd.DatetimeIndex, policy: str) -> np.ndarray:
+    """Posiciones del último día de cada mes/trimestre/año de `dates` (sin el último día de la serie)."""
+    periods = pd.DatetimeIndex(dates).to_period(_CALENDAR_FREQ[policy]).asi8
+    return np.flatnonzero(periods[1:] != periods[:-1])
+
+
+def _drift(values: np.ndarray, returns: np.ndarray) -> np.ndarray:
+    """Valor de cada activo tras cada día de `returns`, partiendo de `values` (sin rebalancear)."""
+    return values * np.cumprod(1 + returns, axis=0)
+
+
+def _first_out_of_band(returns: np.ndarray, target: np.ndarray, start: int, band: float) -> tuple[int, np.ndarray]:
+    """
+    Desde el rebalanceo del día `start`, deja derivar los pesos y devuelve
+    (primer día con algún peso fuera de la banda o el último día, valores de
+    los activos en los días start+1 .. ese día, relativos al valor en `start`).
+    """
+    n_days = len(returns)
+    values, chunks = target, []
+    day = start
+    while day < n_days - 1:
+        block = _drift(values, returns[day + 1:min(day + 1 + BAND_SEARCH_DAYS, n_days)])
+        totals = block.sum(axis=1, keepdims=True)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            outside = (np.abs(block / totals - target) > band).any(axis=1)
+        if outside.any():
+            hit = int(np.argmax(outside))
+            chunks.append(block[:hit + 1])
+            return day + 1 + hit, np.concatenate(chunks)
+        chunks.append(block)
+        values = block[-1]
+        day += len(block)
+    return n_days - 1, np.concatenate(chunks) if chunks else np.empty((0, len(target)))
+
+
+def simulate_rebalancing(returns: np.ndarray, target: np.ndarray, dates: pd.Index, policy: str = "daily",
+                         band: float = DEFAULT_REBALANCE_BAND) -> tuple[np.ndarray, np.ndarray, float]:
+    """
+    Núcleo del backtest sobre arrays: `returns` (días x activos, sin NaN,
+    la primera fila se ignora) y `target` (pesos que suman 1). Devuelve
+    (pesos al cierre de cada día, posiciones de los días de rebalanceo,
+    turnover).
+    """
+    if policy not in REBALANCE_POLICIES:
+        raise ValueError(f"Política de rebalanceo desconocida: '{policy}'.")
+    n_days = len(returns)
+
+    if policy == "daily":
+        # Lo negociado cada día para volver a los pesos objetivo
+        grown = target * (1 + returns[1:-1])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            traded = np.abs(grown / grown.sum(axis=1, keepdims=True) - target).sum(axis=1) / 2
+        return np.broadcast_to(target, returns.shape), np.arange(1, max(n_days - 1, 1)), float(np.nansum(traded))
+
+    schedule = iter(calendar_rebalance_positions(dates, policy)) if policy in _CALENDAR_FREQ else iter(())
+    asset_values = np.empty(returns.shape)
+    asset_values[0] = target
+    rebalances, turnover, start = [], 0.0, 0
+    while start < n_days - 1:
+        if policy == "threshold":
+            end, segment = _first_out_of_band(returns, target, start, band)
+        else:
+            end = next((pos for pos in schedule if pos > start), n_days - 1)
+            segment = _drift(target, returns[start + 1:end + 1])
+        # Cada tramo parte de pesos que suman 1: se escala al valor de la cartera en `start`
+        asset_values[start + 1:end + 1] = segment * asset_values[start].sum()
+        if end < n_days - 1:
+            total = asset_values[end].sum()
+            turnover += float(np.abs(asset_values[end] / total - target).sum() / 2)
+            rebalances.append(end)
+            asset_values[end] = target * total
+        start = end
+    return asset_values / asset_values.sum(axis=1, keepdims=True), np.asarray(rebalances, dtype=np.int64), turnover
+
+
+def run_backtest(returns: pd.DataFrame, weights: dict, policy: str = "daily",
+                 band: float = DEFAULT_REBALANCE_BAND) -> BacktestResult | None:
+    """
+    Backtest de `weights` (activo -> peso, se normalizan a suma 1) sobre
+    las rentabilidades diarias `returns` (fechas x activos) con la política
+    de rebalanceo `policy` (ver REBALANCE_POLICIES). None si no hay datos.
+    """
+    target = pd.Series(weights, dtype=float).reindex(returns.columns).dropna()
+    target = target[target != 0]
+    if target.empty or returns.empty:
+        return None
+    values = returns[target.index].to_numpy(dtype=np.float64)
+    values = np.where(np.isnan(values), 0.0, values)
+    values[0] = 0.0
+    target_weights = target.to_numpy() / target.sum()
+
+    drifted, rebalances, turnover = simulate_rebalancing(values, target_weights, returns.index, policy, band)
+    # La rentabilidad de cada día se obtiene con los pesos al cierre del día anterior
+    start_weights = np.vstack([target_weights, drifted[:-1]])
+    portfolio_returns = pd.Series((values * start_weights).sum(axis=1), index=returns.index)
+    return BacktestResult(
+        returns=portfolio_returns,
+        nav=(1 + portfolio_returns).cumprod() * 100,
+        weights=pd.DataFrame(drifted, index=returns.index, columns=target.index),
+        rebalance_dates=returns.index[rebalances],
+        turnover=turnover,
+    )
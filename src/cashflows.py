@@ -0,0 +1,193 @@
+# src/cashflows.py
+"""
+Simulación de aportaciones y reintegros periódicos sobre la rentabilidad
+diaria de una cartera: una inversión inicial el primer día y, después, un
+importe fijo el primer día hábil de cada mes, trimestre o año (negativo si
+es un reintegro).
+
+El valor no se re-simula por cada aportación: con G el crecimiento
+acumulado de la cartera (producto de 1 + r), el valor el día t es
+G_t * suma(aportación_k / G_k) para las aportaciones hasta t: un cumsum
+sobre los días con flujo (días con flujo x planes) y un producto por G. Si un reintegro agota la
+cartera, se retira lo que queda y el plan termina ahí.
+
+La rentabilidad ponderada por el dinero es la TIR anual de los flujos del
+inversor (aportaciones con signo negativo y el valor final), con fechas en
+años de 365,25 días como XIRR. Se resuelve con Newton para todos los planes
+a la vez.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .backtest import calendar_rebalance_positions
+
+CASHFLOW_FREQUENCIES = ["none", "monthly", "quarterly", "yearly"]
+DAYS_PER_YEAR = 365.25
+IRR_MAX_ITER = 100
+IRR_TOLERANCE = 1e-10
+
+CASHFLOW_SUMMARY_KEYS = [
+    "final_value", "invested", "withdrawn", "profit", "mwr_%", "twr_%", "depleted_on",
+]
+
+
+class CashflowPlan(NamedTuple):
+    """Inversión inicial y aportación (o reintegro, si es negativa) de cada periodo de `frequency`."""
+    initial: float
+    periodic: float = 0.0
+    frequency: str = "monthly"
+
+
+class CashflowResult(NamedTuple):
+    """
+    `values` es el valor de cada plan al cierre de cada día (fechas x
+    planes), `flows` lo aportado (+) o retirado (-) los días con flujo una
+    vez aplicado el agotamiento y `summary` una fila por plan con
+    CASHFLOW_SUMMARY_KEYS.
+    """
+    values: pd.DataFrame
+    flows: pd.DataFrame
+    summary: pd.DataFrame
+
+
+def contribution_positions(dates: pd.DatetimeIndex, frequency: str) -> np.ndarray:
+    """Posiciones del primer día de cada mes/trimestre/año de `dates`, sin contar el primer periodo."""
+    if frequency not in CASHFLOW_FREQUENCIES:
+        raise ValueError(f"Frecuencia de aportación desconocida: '{frequency}'.")
+    if frequency == "none" or len(dates) < 2:
+        return np.array([], dtype=np.int64)
+    return calendar_rebalance_positions(dates, frequency) + 1
+
+
+def cashflow_matrix(dates: pd.DatetimeIndex, plans) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Flujos previstos de `plans` solo en los días con algún flujo: devuelve
+    (posiciones de esos días en `dates`, flujos días con flujo x planes). La
+    inversión inicial va el primer día y las periódicas en su fecha.
+    """
+    if len(dates) == 0:
+        return np.array([], dtype=np.int64), np.zeros((0, len(plans)))
+    # Las fechas de aportación se calculan una vez por frecuencia, no por plan
+    by_frequency = {frequency: contribution_positions(dates, frequency) for frequency in {plan.frequency for plan in plans}}
+    positions = np.union1d([0], np.concatenate([[0], *by_frequency.values()])).astype(np.int64)
+    flows = np.zeros((len(positions), len(plans)))
+    for column, plan in enumerate(plans):
+        flows[0, column] = plan.initial
+        flows[np.searchsorted(positions, by_frequency[plan.frequency]), column] += plan.periodic
+    return positions, flows
+
+
+def simulate_cashflows(growth: np.ndarray, flows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Núcleo sobre arrays: `growth` es el crecimiento acumulado de la cartera
+    en cada día con flujo y `flows` los flujos previstos esos días (días x
+    planes). Devuelve (unidades tras cada flujo, flujos efectivos); el valor
+    un día cualquiera es su crecimiento por las unidades del último flujo.
+    """
+    growth = growth[:, None]
+    units = np.cumsum(flows / growth, axis=0)
+    # Un reintegro que deja el valor en cero o por debajo agota el plan
+    depleted = np.maximum.accumulate((units <= 0) & (flows < 0), axis=0)
+    first = depleted & ~np.vstack([np.zeros((1, flows.shape[1]), dtype=bool), depleted[:-1]])
+    actual = np.where(depleted, 0.0, flows)
+    # El día que se agota solo se retira lo que había antes del reintegro
+    actual = np.where(first, -np.maximum(growth * units - flows, 0.0), actual)
+    return np.where(depleted, 0.0, units), actual
+
+
+def irr_batch(flows: np.ndarray, years: np.ndarray, guess: np.ndarray | None = None) -> np.ndarray:
+    """
+    TIR anual de cada columna de `flows` (flujos del inversor, fechas x
+    planes) con fechas `years` (en años desde el primero). Newton sobre el
+    tipo continuo x = log(1 + TIR), vectorizado por planes; NaN si no hay
+    cambio de signo o no converge.
+    """
+    n_plans = flows.shape[1]
+    x = np.zeros(n_plans) if guess is None else np.log1p(np.clip(np.nan_to_num(guess), -0.99, 10.0))
+    has_root = (flows > 0).any(axis=0) & (flows < 0).any(axis=0)
+    active = has_root.copy()
+    converged = np.zeros(n_plans, dtype=bool)
+    years = years[:, None]
+    for _ in range(IRR_MAX_ITER):
+        if not active.any():
+            break
+        discount = np.exp(-x[active] * years)
+        value = (flows[:, active] * discount).sum(axis=0)
+        slope = -(flows[:, active] * years * discount).sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            step = value / slope
+        step = np.where(np.isfinite(step), step, np.nan)
+        x[active] = np.clip(x[active] - step, -10.0, 10.0)
+        done = np.abs(step) < IRR_TOLERANCE
+        stalled = np.isnan(step)
+        indices = np.flatnonzero(active)
+        converged[indices[done]] = True
+        active[indices[done | stalled]] = False
+    return np.where(converged, np.expm1(x), np.nan)
+
+
+def run_cashflows(returns: pd.Series, plans, names=None) -> CashflowResult:
+    """
+    Simula cada plan de `plans` (CashflowPlan) sobre las rentabilidades
+    diarias `returns` de una cartera (la primera no cuenta, NaN como 0).
+    `names` etiqueta los planes en el resultado.
+    """
+    plans = list(plans)
+    names = pd.Index(names if names is not None else range(len(plans)))
+    dates = pd.DatetimeIndex(returns.index)
+    daily = np.nan_to_num(returns.to_numpy(dtype=np.float64))
+    if len(daily):
+        daily[0] = 0.0
+    growth = np.cumprod(1 + daily)
+
+    positions, planned = cashflow_matrix(dates, plans)
+    summary = pd.DataFrame(index=names, columns=CASHFLOW_SUMMARY_KEYS, dtype=object)
+    if len(dates) == 0:
+        empty = pd.DataFrame(index=dates, columns=names, dtype=float)
+        return CashflowResult(empty, empty.copy(), summary)
+
+    units, flows = simulate_cashflows(growth[positions], planned)
+    # Entre dos flujos las unidades no cambian: el valor es el crecimiento por ellas
+    last_flow = np.searchsorted(positions, np.arange(len(dates)), side='right') - 1
+    values = growth[:, None] * units[last_flow]
+
+    final_value = values[-1]
+    invested = np.where(flows > 0, flows, 0.0).sum(axis=0)
+    withdrawn = np.where(flows < 0, -flows, 0.0).sum(axis=0)
+
+    # Flujos del inversor: lo aportado sale de su bolsillo y el valor final vuelve
+    flow_dates = dates[positions]
+    investor = -flows
+    years = (flow_dates - dates[0]).days.to_numpy() / DAYS_PER_YEAR
+    if positions[-1] == len(dates) - 1:
+        investor[-1] += final_value
+    else:
+        investor = np.vstack([investor, final_value])
+        years = np.append(years, (dates[-1] - dates[0]).days / DAYS_PER_YEAR)
+    # Punto de partida de Newton: ganancia total sobre lo aportado, anualizada
+    horizon = max(years[-1], 1 / DAYS_PER_YEAR)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        guess = (final_value + withdrawn - invested) / invested / horizon
+    mwr = irr_batch(investor, years, guess)
+
+    depleted = (units <= 0) & (planned < 0)
+    depleted_on = [flow_dates[np.argmax(column)] if column.any() else pd.NaT for column in depleted.T]
+    twr = (growth[-1] - 1) * 100
+
+    summary = pd.DataFrame({
+        "final_value": final_value,
+        "invested": invested,
+        "withdrawn": withdrawn,
+        "profit": final_value + withdrawn - invested,
+        "mwr_%": mwr * 100,
+        "twr_%": np.full(len(plans), twr),
+        "depleted_on": depleted_on,
+    }, index=names)
+    return CashflowResult(
+        values=pd.DataFrame(values, index=dates, columns=names),
+        flows=pd.DataFrame(flows, index=flow_dates, columns=names),
+        summary=summary,
+    )
@@ -6,7 +6,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 from streamlit_local_storage import LocalStorage
 
-from src.config import HORIZONTE_OPCIONES, HORIZONTE_DEFAULT_INDEX
+from src.config import HORIZONTE_OPCIONES, HORIZONTE_DEFAULT_INDEX, REBALANCEO_OPCIONES, APORTACION_OPCIONES
+from src.backtest import DEFAULT_REBALANCE_BAND
+from src.cashflows import CashflowPlan, contribution_positions
+from src.montecarlo import DEFAULT_DRAWDOWN_THRESHOLD, FAN_PERCENTILES, run_montecarlo
+from src.rolling_metrics import calcular_metricas_rolling
 
 # --- DIÁLOGOS Y FUNCIONES DE RENDERIZADO ---
 
@@ -128,6 +132,8 @@ def render_funds_analysis(df_funds_metrics, daily_returns, portfolio, mapa_isin_
             fig_rent.add_trace(go.Scatter(x=portfolio.nav.index, y=portfolio.nav.values, mode="lines", name="💼 Mi Cartera", line=dict(color="black", width=3, dash="dash")))
         st.plotly_chart(fig_rent, use_container_width=True)
 
+        render_rolling_analysis(daily_returns, portfolio, mapa_isin_nombre)
+
         st.subheader("🎯 Riesgo vs. Retorno")
         if not df_funds_metrics.empty:
             fig_risk = px.scatter(df_funds_metrics, x="volatility_ann_%", y="annualized_return_%", text="name", hover_name="name", title="Riesgo vs. Retorno de los Fondos")
@@ -145,6 +151,139 @@ def render_funds_analysis(df_funds_metrics, daily_returns, portfolio, mapa_isin_
             fig_corr = px.imshow(corr_matrix, text_auto=True, aspect="auto", color_continuous_scale='RdBu_r', range_color=[-1, 1], title="Matriz de Correlación de los Fondos")
             st.plotly_chart(fig_corr, use_container_width=True)
 
+def render_rolling_analysis(daily_returns, portfolio, mapa_isin_nombre):
+    st.subheader("📉 Volatilidad Rolling")
+    col_ventana, col_metrica = st.columns(2)
+    with col_ventana:
+        ventana = st.select_slider("Ventana (días)", options=[21, 63, 126, 252], value=63, key="rolling_window")
+    etiquetas = {
+        "volatility_ann_%": "Volatilidad Anualizada (%)", "sharpe_ann": "Ratio Sharpe",
+        "sortino_ann": "Ratio Sortino", "drawdown_%": "Caída desde el Máximo de la Ventana (%)",
+        "beta": "Beta frente a la Cartera",
+    }
+    portfolio_returns = portfolio.daily_returns if portfolio else None
+    if portfolio_returns is not None:
+        portfolio_returns = portfolio_returns.fillna(0)
+    opciones = list(etiquetas) if portfolio_returns is not None else list(etiquetas)[:-1]
+    with col_metrica:
+        metrica = st.selectbox("Métrica", opciones, format_func=etiquetas.get, key="rolling_metric")
+
+    if len(daily_returns) <= ventana:
+        st.info(f"El horizonte seleccionado tiene menos de {ventana} días: amplíalo o reduce la ventana.")
+        return
+
+    # Fondos y cartera en la misma matriz: una sola pasada vectorizada por métrica
+    rolling_input = daily_returns.rename(columns=mapa_isin_nombre)
+    if portfolio_returns is not None:
+        rolling_input = rolling_input.assign(**{"💼 Mi Cartera": portfolio_returns})
+    rolling = calcular_metricas_rolling(rolling_input, ventana, benchmark=portfolio_returns)
+
+    fig_rolling = px.line(rolling[metrica].dropna(how="all"), title=f"{etiquetas[metrica]} ({ventana} días)")
+    fig_rolling.update_layout(yaxis_title=etiquetas[metrica], xaxis_title=None, legend_title=None)
+    st.plotly_chart(fig_rolling, use_container_width=True)
+
+def render_cashflow_simulation(portfolio):
+    st.subheader("💶 Simulación de Aportaciones")
+    returns = portfolio.daily_returns if portfolio else None
+    if returns is None or len(returns) < 2:
+        st.info("No hay suficientes datos de la cartera para simular aportaciones.")
+        return
+
+    col_inicial, col_periodica, col_frecuencia = st.columns(3)
+    with col_inicial:
+        inicial = st.number_input("Inversión inicial (€)", min_value=0, step=1000, key="total_investment_amount")
+    with col_periodica:
+        periodica = st.number_input("Aportación periódica (€)", value=0, step=50, key="aportacion_periodica",
+                                    help="Usa un importe negativo para simular reintegros periódicos.")
+    with col_frecuencia:
+        frecuencia = st.selectbox("Frecuencia", list(APORTACION_OPCIONES), format_func=APORTACION_OPCIONES.get,
+                                  key="frecuencia_aportacion")
+
+    # Estrategias a comparar, todas en una sola simulación
+    planes = {"📅 Tu plan": CashflowPlan(inicial, periodica, frecuencia),
+              "💰 Solo inversión inicial": CashflowPlan(inicial, 0, "none")}
+    n_aportaciones = len(contribution_positions(returns.index, frecuencia))
+    if periodica > 0 and n_aportaciones:
+        planes["⚡ Todo invertido al inicio"] = CashflowPlan(inicial + periodica * n_aportaciones, 0, "none")
+    resultado = portfolio.simulate_cashflows(list(planes.values()), names=list(planes))
+
+    resumen = resultado.summary.rename(columns={
+        "final_value": "Valor Final (€)", "invested": "Aportado (€)", "withdrawn": "Retirado (€)",
+        "profit": "Beneficio (€)", "mwr_%": "TIR Anual (%)", "twr_%": "Rent. Cartera (%)",
+        "depleted_on": "Agotado el",
+    })
+    st.dataframe(
+        resumen.style.format({
+            "Valor Final (€)": "{:,.0f}", "Aportado (€)": "{:,.0f}", "Retirado (€)": "{:,.0f}",
+            "Beneficio (€)": "{:,.0f}", "TIR Anual (%)": "{:.2f}", "Rent. Cartera (%)": "{:.2f}",
+            "Agotado el": lambda fecha: "" if pd.isna(fecha) else f"{fecha:%d/%m/%Y}",
+        }),
+        use_container_width=True
+    )
+    st.caption("La TIR pondera cada euro por el tiempo que ha estado invertido; la rentabilidad de la cartera no depende de las aportaciones.")
+
+    valores = resultado.values.copy()
+    # Capital neto aportado de tu plan, escalonado entre aportaciones
+    valores["Capital neto aportado"] = resultado.flows["📅 Tu plan"].cumsum().reindex(valores.index).ffill()
+    fig_valor = px.line(valores, title="Valor de la Inversión con Aportaciones")
+    fig_valor.update_layout(yaxis_title="€", xaxis_title=None, legend_title=None)
+    st.plotly_chart(fig_valor, use_container_width=True)
+
+def render_montecarlo_projection(daily_returns, pesos):
+    st.subheader("🔮 Proyección Monte Carlo")
+    col_anios, col_caminos, col_objetivo, col_caida = st.columns(4)
+    with col_anios:
+        anios = st.slider("Años", 1, 30, 10, key="montecarlo_anios")
+    with col_caminos:
+        n_caminos = st.select_slider("Simulaciones", options=[1000, 2000, 5000, 10000], value=5000, key="montecarlo_caminos")
+    inicial = st.session_state.get("total_investment_amount", 10000)
+    with col_objetivo:
+        objetivo = st.number_input("Valor objetivo (€)", min_value=0, value=int(inicial), step=1000, key="montecarlo_objetivo")
+    with col_caida:
+        umbral = st.slider("Caída máxima tolerada (%)", 5, 60, int(DEFAULT_DRAWDOWN_THRESHOLD * 100), key="montecarlo_caida")
+
+    # Semilla fija: la proyección no cambia en cada recarga de la página
+    resultado = run_montecarlo(daily_returns, pesos, years=anios, initial=inicial, target=objetivo,
+                               drawdown_threshold=umbral / 100, n_paths=n_caminos, seed=0)
+    if resultado is None:
+        st.info("No hay suficientes datos de la cartera para proyectarla.")
+        return
+    if resultado.summary["history_years"] < 1:
+        st.warning("La proyección se basa en menos de un año de historia: amplía el horizonte para que sea más representativa.")
+
+    resumen = resultado.summary
+    col1, col2, col3, col4 = st.columns(4)
+    with col1: st.metric("Valor Mediano", f"{resumen['median_final']:,.0f} €")
+    with col2: st.metric("Rent. Anual Mediana", f"{resumen['median_cagr_%']:.2f}%")
+    with col3: st.metric("Prob. de No Alcanzar el Objetivo", f"{resumen['prob_shortfall_%']:.1f}%")
+    with col4: st.metric(f"Prob. de Caída ≥ {umbral}%", f"{resumen['prob_drawdown_%']:.1f}%")
+
+    bandas = resultado.bands
+    bajo, medio_bajo, mediana, medio_alto, alto = FAN_PERCENTILES
+    fig_abanico = go.Figure()
+    for inferior, superior, opacidad in [(bajo, alto, 0.15), (medio_bajo, medio_alto, 0.3)]:
+        fig_abanico.add_trace(go.Scatter(x=bandas.index, y=bandas[superior], mode="lines", line=dict(width=0), showlegend=False, hoverinfo="skip"))
+        fig_abanico.add_trace(go.Scatter(x=bandas.index, y=bandas[inferior], mode="lines", line=dict(width=0), fill="tonexty",
+                                         fillcolor=f"rgba(31, 119, 180, {opacidad})", name=f"Percentiles {inferior}-{superior}"))
+    fig_abanico.add_trace(go.Scatter(x=bandas.index, y=bandas[mediana], mode="lines", line=dict(color="black", width=2), name="Mediana"))
+    fig_abanico.add_hline(y=objetivo, line_dash="dash", line_color="red", annotation_text="Objetivo")
+    fig_abanico.update_layout(title=f"Valor de {inicial:,.0f} € en {anios} años ({n_caminos:,} simulaciones)",
+                              xaxis_title="Años", yaxis_title="€")
+    st.plotly_chart(fig_abanico, use_container_width=True)
+    st.caption("Simulación por bootstrap de bloques mensuales de las rentabilidades diarias del horizonte seleccionado. "
+               "No es una predicción: el pasado no garantiza rentabilidades futuras.")
+
+def render_rebalance_selector(key: str):
+    """Selector de la política de rebalanceo (y de la banda si es por desviación). Devuelve (política, banda)."""
+    politica = st.selectbox("Rebalanceo", list(REBALANCEO_OPCIONES), format_func=REBALANCEO_OPCIONES.get, key=key,
+                            help="Cada cuánto vuelve la cartera a sus pesos objetivo.")
+    banda = DEFAULT_REBALANCE_BAND
+    if politica == "threshold":
+        banda = st.slider("Banda de desviación (puntos de peso)", 1, 20, int(DEFAULT_REBALANCE_BAND * 100),
+                          key=f"{key}_banda") / 100
+    return politica, banda
+
+
 def render_analysis_sidebar():
     run_optimization = False
     modelo_seleccionado = None
@@ -162,6 +301,7 @@ def render_analysis_sidebar():
         
         st.header("Configuración del Análisis")
         horizonte = st.selectbox("Horizonte temporal", HORIZONTE_OPCIONES, index=HORIZONTE_DEFAULT_INDEX, key="horizonte_detalle")
+        rebalanceo = render_rebalance_selector("rebalanceo_detalle")
         
         st.markdown("---")
         st.subheader("⚖️ Optimización")
@@ -179,4 +319,4 @@ def render_analysis_sidebar():
             st.info("La optimización es una funcionalidad Premium.")
             if st.button("✨ Mejorar a Premium"): st.switch_page("pages/4_cuenta.py")
                 
-    return horizonte, run_optimization, modelo_seleccionado
+    return horizonte, run_optimization, modelo_seleccionado, rebalanceo
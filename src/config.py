@@ -21,3 +21,21 @@ try:
     HORIZONTE_DEFAULT_INDEX = HORIZONTE_OPCIONES.index("YTD")
 except ValueError:
     HORIZONTE_DEFAULT_INDEX = 3 # Fallback por si 'YTD' no estuviera
+
+# Políticas de rebalanceo de src/backtest.py y su etiqueta en la interfaz
+REBALANCEO_OPCIONES = {
+    "daily": "Diario (pesos fijos)",
+    "none": "Sin rebalanceo (comprar y mantener)",
+    "monthly": "Mensual",
+    "quarterly": "Trimestral",
+    "yearly": "Anual",
+    "threshold": "Por bandas de desviación",
+}
+
+# Frecuencias de aportación de src/cashflows.py y su etiqueta en la interfaz
+APORTACION_OPCIONES = {
+    "monthly": "Mensual",
+    "quarterly": "Trimestral",
+    "yearly": "Anual",
+    "none": "Sin aportaciones periódicas",
+}
@@ -6,7 +6,10 @@ import streamlit as st
 import json
 import time
 import random
-from src.db_connector import get_db_connection
+from src.db_connector import get_db_connection, db_connection
+from src.price_reader import PriceArrays, read_prices, read_latest_dates, date_to_days, days_to_date
+from src.navs import horizon_start, horizon_read_start, HORIZON_MARGIN_DAYS
+from src.nav_store import NavStore
 
 class DataManager:
     """
@@ -16,6 +19,7 @@ class DataManager:
     def __init__(self, data_dir: str = "fondos_data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
+        self.nav_store = NavStore.for_path(self.data_dir / "nav_store")
         self.today = date.today()
         self.recency_threshold_days = 5
         self.api_call_made_in_this_run = False
@@ -44,34 +48,112 @@ class DataManager:
             print(f"Error descargando {isin}: {e}")
             return None
 
-    def get_fund_nav(self, isin: str) -> pd.DataFrame | None:
+    def load_prices(self, isins, start_date: date | None = None) -> PriceArrays:
         """
-        Obtiene los datos de un fondo consultando la base de datos PostgreSQL.
+        Devuelve los precios de `isins` (desde `start_date` si se indica)
+        desde la caché local en disco, sincronizando antes solo las filas
+        nuevas de PostgreSQL. Si la BD no está disponible se sirve lo que haya
+        en disco; si falla el disco, se lee directamente de la BD.
         """
-        conn = get_db_connection()
-        if not conn:
-            st.error("No se pudo conectar a la base de datos de precios.")
+        isins = list(isins)
+        start = None if start_date is None else date_to_days(start_date)
+        try:
+            # Sin retener una conexión: en las cargas grandes sync reparte la
+            # lectura entre varias del pool y otra sesión podría estar esperándolas
+            self.nav_store.sync(None, isins, start=start)
+        except Exception as e:
+            print(f"⚠️ No se pudo sincronizar la caché local de NAVs: {e}")
+        try:
+            return self.nav_store.load(isins, start=start)
+        except Exception as e:
+            print(f"⚠️ No se pudo leer la caché local de NAVs: {e}")
+            with db_connection() as conn:
+                if not conn:
+                    raise
+                return read_prices(conn, isins, start_date=start_date)
+
+    def latest_nav_date(self, isins) -> date | None:
+        """
+        Última fecha con precio entre todos los `isins`. Usa las marcas de
+        agua de la caché local si están al día y, si no, una consulta por
+        índice a la BD (sin leer el histórico).
+        """
+        isins = list(dict.fromkeys(isins))
+        store = self.nav_store
+        if isins and not any(store.needs_sync(isin) for isin in isins):
+            watermarks = [store.watermark(isin) for isin in isins]
+            watermarks = [wm for wm in watermarks if wm is not None]
+            return days_to_date(max(watermarks)) if watermarks else None
+
+        with db_connection() as conn:
+            if conn:
+                try:
+                    latest = [d for d in read_latest_dates(conn, isins).values() if d is not None]
+                    return max(latest) if latest else None
+                except Exception as e:
+                    print(f"⚠️ No se pudo consultar la última fecha de precios: {e}")
+                    conn.rollback()
+        watermarks = [wm for wm in (store.watermark(isin) for isin in isins) if wm is not None]
+        return days_to_date(max(watermarks)) if watermarks else None
+
+    def horizon_start_date(self, isins, horizonte: str | None) -> date | None:
+        """
+        Primera fecha que hay que leer para mostrar `horizonte`, anclada como
+        en filtrar_por_horizonte en la última fecha disponible: el último
+        precio en el inicio del horizonte o antes de cada fondo (para el
+        forward-fill del primer día, aunque publique semanal o mensualmente
+        o haya estado suspendido). Ese precio sale de la caché local si está
+        al día y cubre la fecha; si no, de una consulta a la BD. Sin base de
+        datos se usa un margen fijo de HORIZON_MARGIN_DAYS. None = histórico
+        completo.
+        """
+        if not horizonte:
+            return None
+        anchor = self.latest_nav_date(isins)
+        if anchor is None:
             return None
-        
         try:
-            # Leemos todos los precios para el ISIN solicitado
-            query = "SELECT date, nav FROM historical_prices WHERE isin = %s ORDER BY date"
-            df = pd.read_sql(query, conn, params=(isin,), index_col="date")
-            
-            if df.empty:
+            start = horizon_start(horizonte, pd.Timestamp(anchor))
+        except ValueError:
+            return None  # filtrar_por_horizonte mostrará el error
+        if start is None:
+            return None
+
+        cutoff = start.date()
+        local = self.nav_store.latest_dates(isins, date_to_days(cutoff))
+        if local is not None:
+            # Caché local al día: sin ida y vuelta a la BD
+            prior = [None if days is None else days_to_date(days) for days in local.values()]
+            return horizon_read_start(cutoff, prior)
+        with db_connection() as conn:
+            if conn:
+                try:
+                    return horizon_read_start(cutoff, read_latest_dates(conn, isins, until=cutoff).values())
+                except Exception as e:
+                    print(f"⚠️ No se pudo consultar el último precio previo al horizonte: {e}")
+                    conn.rollback()
+        return (start - pd.Timedelta(days=HORIZON_MARGIN_DAYS)).date()
+
+    def get_fund_nav(self, isin: str, start_date: date | None = None,
+                     horizonte: str | None = None) -> pd.DataFrame | None:
+        """
+        Obtiene los datos de un fondo desde la caché local, sincronizada
+        con la base de datos PostgreSQL. Con `start_date` u `horizonte` solo
+        se leen las fechas necesarias para ese periodo.
+        """
+        try:
+            if start_date is None and horizonte:
+                start_date = self.horizon_start_date([isin], horizonte)
+            prices = self.load_prices([isin], start_date=start_date)
+
+            if len(prices) == 0:
                 st.warning(f"Aún no hay datos históricos para {isin}. El worker los descargará pronto.")
                 return None
 
-            # FIX: Asegurarse de que el índice es un DatetimeIndex
-            df.index = pd.to_datetime(df.index)
-                
-            return df
+            return prices.to_frame().drop(columns='isin').set_index('date')
         except Exception as e:
             st.error(f"Error al leer los precios desde la base de datos para {isin}: {e}")
             return None
-        finally:
-            if conn:
-                conn.close()
 
 
 def filtrar_por_horizonte(df: pd.DataFrame, horizonte: str) -> pd.DataFrame:
@@ -79,22 +161,10 @@ def filtrar_por_horizonte(df: pd.DataFrame, horizonte: str) -> pd.DataFrame:
         return df
     df = df.sort_index()
     anchor = df.index.max()
-    start = None
-    if horizonte.endswith("m"):
-        try:
-            months = int(horizonte[:-1])
-            start = anchor - pd.DateOffset(months=months)
-        except (ValueError, TypeError):
-            pass
-    elif horizonte in ("1y", "2y", "3y", "5y"):
-        years = int(horizonte[:-1])
-        start = anchor - pd.DateOffset(years=years)
-    elif horizonte.lower() == "ytd":
-        start = pd.Timestamp(year=anchor.year, month=1, day=1)
-    elif horizonte.lower() == "max":
-        return df
-    else:
-        st.error(f"Horizonte no reconocido: {horizonte}")
+    try:
+        start = horizon_start(horizonte, anchor)
+    except ValueError as e:
+        st.error(str(e))
         return df
     if start:
         return df.loc[start:anchor]
@@ -1,19 +1,219 @@
 # src/db_connector.py
 
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
 import psycopg2
 import yaml
+from psycopg2 import extensions
 from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
+
+CONFIG_PATH = os.getenv("PORTFOLIO_CONFIG", "config.yaml")
+
+# Tamaño del pool y parámetros de salud (sobrescribibles desde config.yaml -> 'pool')
+POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX", "10"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+
+@lru_cache(maxsize=1)
+def load_config() -> dict:
+    """
+    Lee y parsea config.yaml una única vez por proceso.
+    """
+    with open(CONFIG_PATH) as file:
+        return yaml.safe_load(file) or {}
+
+
+class PooledConnection(extensions.connection):
+    """
+    Conexión de psycopg2 que, al llamar a close(), vuelve al pool en lugar
+    de cerrarse. Así el código existente (conn.close() en los finally)
+    sigue funcionando sin cambios.
+    """
+    _pool = None
+    last_used = 0.0
+
+    def close(self):
+        pool = self._pool
+        if pool is None:
+            return super().close()
+        pool.putconn(self)
+
+    def discard(self):
+        """Cierra de verdad la conexión, sin devolverla al pool."""
+        self._pool = None
+        if not self.closed:
+            try:
+                super().close()
+            except Exception:
+                pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones thread-safe. Reutiliza conexiones ociosas (LIFO),
+    bloquea hasta `acquire_timeout` cuando se alcanza `maxconn` y comprueba
+    con un 'SELECT 1' las conexiones que llevan tiempo sin usarse.
+    """
+    def __init__(self, db_config: dict, minconn: int = POOL_MIN_CONN, maxconn: int = POOL_MAX_CONN,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT,
+                 healthcheck_seconds: float = POOL_HEALTHCHECK_SECONDS):
+        self.db_config = dict(db_config)
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.acquire_timeout = acquire_timeout
+        self.healthcheck_seconds = healthcheck_seconds
+        self.pid = os.getpid()
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._closed = False
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.db_config)
+        conn.last_used = time.monotonic()
+        return conn
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.healthcheck_seconds:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self) -> PooledConnection:
+        if self._closed:
+            raise PoolError("El pool de conexiones está cerrado.")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolError(
+                f"No hay conexiones libres tras {self.acquire_timeout:.0f}s (máximo {self.maxconn})."
+            )
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    conn = self._connect()
+                    break
+                if self._is_healthy(conn):
+                    break
+                conn.discard()
+        except Exception:
+            self._slots.release()
+            raise
+        conn._pool = self
+        return conn
+
+    def putconn(self, conn: PooledConnection):
+        if conn._pool is not self:
+            return  # Ya devuelta (doble close) o de otro pool
+        conn._pool = None
+        try:
+            if not conn.closed and not self._closed:
+                if conn.autocommit:
+                    conn.autocommit = False
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                conn.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+                    conn = None
+        except Exception:
+            pass
+        finally:
+            if conn is not None:
+                conn.discard()
+            self._slots.release()
+
+    def warmup(self):
+        """Abre las `minconn` conexiones iniciales."""
+        conns = [self.getconn() for _ in range(self.minconn)]
+        for conn in conns:
+            self.putconn(conn)
+
+    def closeall(self):
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.discard()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Devuelve el pool del proceso, creándolo la primera vez. Si el proceso
+    es un hijo (fork), crea uno nuevo en vez de compartir los sockets del padre.
+    """
+    global _pool
+    pool = _pool
+    if pool is not None and pool.pid == os.getpid() and not pool._closed:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid() or _pool._closed:
+            config = load_config()
+            pool_config = config.get('pool', {}) or {}
+            _pool = ConnectionPool(
+                config['postgres'],
+                minconn=int(pool_config.get('min', POOL_MIN_CONN)),
+                maxconn=int(pool_config.get('max', POOL_MAX_CONN)),
+                acquire_timeout=float(pool_config.get('timeout', POOL_ACQUIRE_TIMEOUT)),
+                healthcheck_seconds=float(pool_config.get('healthcheck_seconds', POOL_HEALTHCHECK_SECONDS)),
+            )
+            _pool.warmup()
+        return _pool
+
+
+def close_pool():
+    """Cierra todas las conexiones ociosas del pool del proceso."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+atexit.register(close_pool)
+
 
 def get_db_connection():
     """
-    Establece y devuelve una conexión a la base de datos PostgreSQL.
+    Devuelve una conexión del pool de PostgreSQL. Llamar a conn.close()
+    la devuelve al pool.
     """
     try:
-        with open('config.yaml') as file:
-            config = yaml.safe_load(file)
-        db_config = config['postgres']
-        conn = psycopg2.connect(**db_config)
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         print(f"❌ Error al conectar a PostgreSQL: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager sobre el pool: `with db_connection() as conn:`.
+    Entrega None si no se pudo conectar (igual que get_db_connection) y
+    devuelve la conexión al pool al salir, deshaciendo la transacción abierta.
+    """
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        if conn:
+            conn.close()
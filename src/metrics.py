@@ -8,75 +8,313 @@ import numpy as np
 
 # src/metrics.py
 
+from statistics import NormalDist
+
 import pandas as pd
 import numpy as np
 
+from src.navs import horizon_start
+
+
+# Días de mercado por año para anualizar
+ANNUALIZATION_FACTOR = 252
+
+METRIC_KEYS = [
+    "annualized_return_%", "cumulative_return_%", "volatility_ann_%", "sharpe_ann",
+    "sortino_ann", "max_drawdown_%", "calmar_ratio",
+]
+
+# Columnas por pasada: limita los temporales (fechas x columnas) de cada bloque
+BATCH_BLOCK_COLUMNS = 256
+
+
+def _metricas_bloque(returns: np.ndarray, risk_free_rate: float) -> np.ndarray:
+    """
+    Las siete métricas de cada columna de `returns` (fechas x fondos, float64,
+    orden Fortran para que cada columna se sume igual que una pd.Series).
+    Los NaN se ignoran: cada columna equivale a su serie sin NaN.
+    Devuelve un array (n_columnas, len(METRIC_KEYS)).
+    """
+    n_rows, n_cols = returns.shape
+    result = np.full((n_cols, len(METRIC_KEYS)), np.nan)
+    if n_rows == 0 or n_cols == 0:
+        return result
+
+    valid = ~np.isnan(returns)
+    count = valid.sum(axis=0)
+    columns = np.arange(n_cols)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_daily_return = np.where(valid, returns, 0.0).sum(axis=0) / count
+        return_ann = mean_daily_return * ANNUALIZATION_FACTOR
+
+        # Volatilidad (desviación típica muestral, ddof=1, en dos pasadas como pandas)
+        deviations = np.where(valid, returns - mean_daily_return, 0.0)
+        vol_ann = np.sqrt((deviations ** 2).sum(axis=0) / (count - 1)) * np.sqrt(ANNUALIZATION_FACTOR)
+
+        # NAV = cumprod(1 + r); los NaN multiplican por 1 para no cortar la serie
+        nav = np.cumprod(np.where(valid, 1 + returns, 1.0), axis=0)
+        first = valid.argmax(axis=0)
+        last = n_rows - 1 - valid[::-1].argmax(axis=0)
+        cumulative_return = nav[last, columns] / nav[first, columns] - 1
+
+        # Drawdown: máximo acumulado solo sobre fechas válidas (fmax ignora NaN)
+        nav = np.where(valid, nav, np.nan)
+        drawdowns = (nav / np.fmax.accumulate(nav, axis=0) - 1) * 100
+        max_drawdown = np.where(valid, drawdowns, np.inf).min(axis=0)
+
+        # Downside deviation (tasa libre de riesgo como MAR), solo con más de un negativo
+        excess_returns = returns - (risk_free_rate / ANNUALIZATION_FACTOR)
+        negative = valid & (excess_returns < 0)
+        n_negative = negative.sum(axis=0)
+        negative_mean = np.where(negative, excess_returns, 0.0).sum(axis=0) / n_negative
+        negative_var = (np.where(negative, excess_returns - negative_mean, 0.0) ** 2).sum(axis=0) / (n_negative - 1)
+        downside_deviation = np.where(n_negative > 1, np.sqrt(negative_var) * np.sqrt(ANNUALIZATION_FACTOR), 0.0)
+
+        excess_return_ann = return_ann - risk_free_rate
+        sharpe = np.where(vol_ann > 0, excess_return_ann / vol_ann, np.nan)
+        sortino = np.where(
+            downside_deviation > 0,
+            excess_return_ann / downside_deviation,
+            np.where(excess_return_ann > 0, 1e9, 0.0),
+        )
+        annualized_pct = return_ann * 100
+        calmar = np.where(max_drawdown != 0, annualized_pct / np.abs(max_drawdown), np.nan)
+
+    result[:] = np.column_stack([
+        annualized_pct, cumulative_return * 100, vol_ann * 100, sharpe,
+        sortino, max_drawdown, calmar,
+    ])
+    result[count < 2] = np.nan
+    return result
+
+
+def calcular_metricas_batch(returns, risk_free_rate: float = 0.0,
+                            block_columns: int = BATCH_BLOCK_COLUMNS) -> pd.DataFrame:
+    """
+    Calcula las métricas de calcular_metricas_desde_rentabilidades para todas
+    las columnas de una matriz de rentabilidades diarias (fechas x fondos) en
+    una pasada vectorizada. Admite inicios escalonados: los NaN de cada
+    columna se ignoran. Devuelve un DataFrame fondos x métricas.
+    """
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    if isinstance(returns, pd.DataFrame):
+        index = returns.columns
+        values = returns.to_numpy(dtype=np.float64)
+    else:
+        values = np.asarray(returns)
+        if values.ndim == 1:
+            values = values[:, None]
+        index = pd.RangeIndex(values.shape[1])
+
+    out = np.full((values.shape[1], len(METRIC_KEYS)), np.nan)
+    block_columns = max(1, block_columns)
+    for start in range(0, values.shape[1], block_columns):
+        block = np.asfortranarray(values[:, start:start + block_columns], dtype=np.float64)
+        out[start:start + block.shape[1]] = _metricas_bloque(block, risk_free_rate)
+    return pd.DataFrame(out, index=index, columns=METRIC_KEYS)
+
 
 def calcular_metricas_desde_rentabilidades(daily_returns: pd.Series, risk_free_rate: float = 0.0) -> dict:
     """
     Calcula las métricas clave, incluyendo la rentabilidad acumulada.
+    Envoltorio de calcular_metricas_batch para una sola serie.
     """
     if daily_returns is None or daily_returns.empty or len(daily_returns) < 2:
-        return {
-            "annualized_return_%": np.nan,
-            "cumulative_return_%": np.nan,
-            "volatility_ann_%": np.nan,
-            "sharpe_ann": np.nan,
-            "max_drawdown_%": np.nan,
-            "sortino_ann": np.nan,
-            "calmar_ratio": np.nan,
-        }
-
-    # --- Cálculos ---
-    annualization_factor = 252
-    mean_daily_return = daily_returns.mean()
-    return_ann = mean_daily_return * annualization_factor
-
-    # --- Rentabilidad Acumulada ---
-    nav_series = (1 + daily_returns).cumprod()
-    cumulative_return = (nav_series.iloc[-1] / nav_series.iloc[0] - 1)
-
-    # Volatilidad
-    vol_ann = daily_returns.std() * np.sqrt(annualization_factor)
-    
-    # Downside Deviation (usando la tasa libre de riesgo como MAR)
-    excess_returns = daily_returns - (risk_free_rate / annualization_factor)
-    negative_excess_returns = excess_returns[excess_returns < 0]
-    
-    if len(negative_excess_returns) > 1:
-        downside_deviation = negative_excess_returns.std() * np.sqrt(annualization_factor)
-    else:
-        downside_deviation = 0
+        return {key: np.nan for key in METRIC_KEYS}
 
-    # --- MÉTRICAS ---
-    metrics = {}
-    metrics["annualized_return_%"] = return_ann * 100
-    metrics["cumulative_return_%"] = cumulative_return * 100
-    metrics["volatility_ann_%"] = vol_ann * 100
+    values = pd.to_numeric(daily_returns, errors='coerce').to_numpy(dtype=np.float64)
+    row = _metricas_bloque(np.asfortranarray(values[:, None]), risk_free_rate)[0]
+    return {key: float(value) for key, value in zip(METRIC_KEYS, row)}
 
-    # Ratios
-    excess_return_ann = return_ann - risk_free_rate
 
-    if vol_ann > 0:
-        metrics["sharpe_ann"] = excess_return_ann / vol_ann
-    else:
-        metrics["sharpe_ann"] = np.nan
-        
-    if downside_deviation > 0:
-        metrics["sortino_ann"] = excess_return_ann / downside_deviation
-    elif excess_return_ann > 0: # If no downside deviation and positive excess returns, Sortino is very high
-        metrics["sortino_ann"] = 1e9 # A very large number
-    else:
-        metrics["sortino_ann"] = 0 # If no downside deviation and non-positive excess returns, Sortino is 0
+def calcular_metricas_multihorizonte(navs: pd.Series, horizontes, risk_free_rate: float = 0.0) -> dict:
+    """
+    Métricas de una serie de NAV (diaria, sin huecos) para varios horizontes
+    a la vez, equivalentes a aplicar calcular_metricas_desde_rentabilidades a
+    filtrar_por_horizonte(navs, h).pct_change().dropna() para cada `h`.
 
-    # Drawdown Máximo
-    drawdowns = (nav_series / nav_series.cummax() - 1) * 100
-    metrics["max_drawdown_%"] = drawdowns.min() if not drawdowns.empty else np.nan
+    Todas las ventanas terminan en la última fecha, así que basta con una
+    pasada: sumas acumuladas de rentabilidades, cuadrados y negativos dan
+    media, volatilidad y downside de cualquier ventana en O(1); el ratio de
+    NAVs da la rentabilidad acumulada y un único recorrido inverso (mínimo
+    posterior / NAV) da la caída máxima desde cualquier fecha de inicio.
+    Devuelve {horizonte: métricas} para los horizontes con al menos 2 NAVs.
+    """
+    navs = navs.dropna()
+    n_navs = len(navs)
+    if n_navs < 2:
+        return {}
 
-    # Calmar Ratio
-    if metrics["max_drawdown_%"] != 0:
-        metrics["calmar_ratio"] = metrics["annualized_return_%"] / abs(metrics["max_drawdown_%"])
-    else:
-        metrics["calmar_ratio"] = np.nan
+    nav = navs.to_numpy(dtype=np.float64)
+    dates = navs.index
+    returns = nav[1:] / nav[:-1] - 1
+
+    # Se resta un desplazamiento para que la varianza por diferencia de sumas no pierda precisión
+    shift = returns.mean()
+    centered = returns - shift
+    prefix_sum = np.concatenate(([0.0], np.cumsum(centered)))
+    prefix_sq = np.concatenate(([0.0], np.cumsum(centered ** 2)))
+
+    excess_returns = returns - (risk_free_rate / ANNUALIZATION_FACTOR)
+    negative = excess_returns < 0
+    negative_excess = np.where(negative, excess_returns, 0.0)
+    prefix_neg_count = np.concatenate(([0], np.cumsum(negative)))
+    prefix_neg_sum = np.concatenate(([0.0], np.cumsum(negative_excess)))
+    prefix_neg_sq = np.concatenate(([0.0], np.cumsum(negative_excess ** 2)))
+
+    # Caída máxima de la ventana [i, fin]: mínimo desde i de (mínimo posterior / NAV - 1)
+    future_min = np.minimum.accumulate(nav[::-1])[::-1]
+    drawdown_from = np.minimum.accumulate((future_min / nav - 1)[::-1])[::-1] * 100
+
+    anchor = dates.max()
+    results = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for horizonte in horizontes:
+            start = horizon_start(horizonte, anchor)
+            first = 0 if start is None else int(dates.searchsorted(start, side='left'))
+            if n_navs - first < 2:
+                continue
+            # Rentabilidades de la ventana: returns[first:], NAVs: nav[first:]
+            count = n_navs - 1 - first
+            if count < 2:
+                results[horizonte] = {key: np.nan for key in METRIC_KEYS}
+                continue
+
+            centered_mean = (prefix_sum[-1] - prefix_sum[first]) / count
+            var = ((prefix_sq[-1] - prefix_sq[first]) - count * centered_mean ** 2) / (count - 1)
+            return_ann = (centered_mean + shift) * ANNUALIZATION_FACTOR
+            vol_ann = np.sqrt(max(var, 0.0)) * np.sqrt(ANNUALIZATION_FACTOR)
+
+            n_negative = prefix_neg_count[-1] - prefix_neg_count[first]
+            if n_negative > 1:
+                neg_mean = (prefix_neg_sum[-1] - prefix_neg_sum[first]) / n_negative
+                neg_var = ((prefix_neg_sq[-1] - prefix_neg_sq[first]) - n_negative * neg_mean ** 2) / (n_negative - 1)
+                downside_deviation = np.sqrt(max(neg_var, 0.0)) * np.sqrt(ANNUALIZATION_FACTOR)
+            else:
+                downside_deviation = 0
+
+            excess_return_ann = return_ann - risk_free_rate
+            if downside_deviation > 0:
+                sortino = excess_return_ann / downside_deviation
+            else:
+                sortino = 1e9 if excess_return_ann > 0 else 0
+
+            # Como cumprod(1 + r)[-1] / cumprod(1 + r)[0]: la primera rentabilidad no cuenta
+            max_drawdown = drawdown_from[first + 1]
+            annualized_pct = return_ann * 100
+            results[horizonte] = {
+                "annualized_return_%": annualized_pct,
+                "cumulative_return_%": (nav[-1] / nav[first + 1] - 1) * 100,
+                "volatility_ann_%": vol_ann * 100,
+                "sharpe_ann": excess_return_ann / vol_ann if vol_ann > 0 else np.nan,
+                "sortino_ann": sortino,
+                "max_drawdown_%": max_drawdown,
+                "calmar_ratio": annualized_pct / abs(max_drawdown) if max_drawdown != 0 else np.nan,
+            }
+    return results
+
+
+# --- Métricas de riesgo extremo y de caídas (VaR, CVaR, Ulcer, duración) ---
+
+# Nivel de confianza del VaR y el CVaR (95%: la peor rentabilidad diaria de cada 20 días)
+VAR_CONFIDENCE = 0.95
+
+RISK_METRIC_KEYS = [
+    "var_hist_%", "cvar_hist_%", "var_param_%", "cvar_param_%",
+    "ulcer_index", "max_drawdown_days", "recovery_days",
+]
+# Métricas de cola de las rentabilidades diarias: deben calcularse sobre los
+# precios publicados, no sobre un calendario con forward-fill (sus
+# rentabilidades 0 acercan el cuantil a cero)
+TAIL_RISK_KEYS = ["var_hist_%", "cvar_hist_%", "var_param_%", "cvar_param_%"]
+
+
+def _riesgo_ventana(returns: np.ndarray, nav: np.ndarray, days: np.ndarray, confidence: float) -> dict:
+    """
+    Métricas de RISK_METRIC_KEYS de una ventana: `returns` son sus
+    rentabilidades diarias y `nav`/`days` (días desde 1970-01-01) su serie de
+    NAV. Todo en O(n): el VaR histórico con una selección parcial
+    (np.partition) en lugar de ordenar, y las caídas con un único recorrido
+    del máximo acumulado.
+    """
+    n = len(returns)
+    alpha = 1 - confidence
+
+    # VaR histórico: cuantil `alpha` con interpolación lineal (como np.quantile);
+    # CVaR: media de las rentabilidades hasta ese cuantil
+    position = alpha * (n - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, n - 1)
+    partitioned = np.partition(returns, (lower, upper))
+    var_hist = partitioned[lower] + (position - lower) * (partitioned[upper] - partitioned[lower])
+    cvar_hist = partitioned[:lower + 1].mean()
+
+    # VaR y CVaR paramétricos (normal) con la media y desviación de la ventana
+    normal = NormalDist()
+    z = normal.inv_cdf(alpha)
+    mean, std = returns.mean(), returns.std(ddof=1)
+    var_param = mean + z * std
+    cvar_param = mean - std * normal.pdf(z) / alpha
+
+    # Caídas: drawdown (%) desde el máximo previo y, para cada fecha, el último máximo
+    running_max = np.maximum.accumulate(nav)
+    drawdown = (nav / running_max - 1) * 100
+    ulcer_index = np.sqrt(np.mean(drawdown ** 2))
+
+    positions = np.arange(len(nav))
+    last_peak = np.maximum.accumulate(np.where(drawdown == 0, positions, 0))
+    underwater_days = days - days[last_peak]
+    max_drawdown_days = int(underwater_days.max())
+
+    # Recuperación de la caída máxima: del mínimo hasta volver al máximo anterior
+    trough = int(np.argmin(drawdown))
+    recovered = np.flatnonzero(nav[trough:] >= running_max[trough])
+    recovery_days = int(days[trough + recovered[0]] - days[trough]) if len(recovered) else np.nan
+
+    return {
+        "var_hist_%": var_hist * 100,
+        "cvar_hist_%": cvar_hist * 100,
+        "var_param_%": var_param * 100,
+        "cvar_param_%": cvar_param * 100,
+        "ulcer_index": ulcer_index,
+        "max_drawdown_days": max_drawdown_days,
+        "recovery_days": recovery_days,
+    }
+
+
+def calcular_riesgo_multihorizonte(navs: pd.Series, horizontes, confidence: float = VAR_CONFIDENCE) -> dict:
+    """
+    Métricas de riesgo (RISK_METRIC_KEYS) de una serie de NAV para varios
+    horizontes, con las mismas ventanas que calcular_metricas_multihorizonte:
+    las rentabilidades desde el inicio del horizonte y, para las caídas, los
+    NAVs desde la fecha siguiente (como max_drawdown_%).
+    VaR y CVaR son rentabilidades diarias en % (negativas si son pérdidas),
+    por periodo entre NAVs de la serie (ver TAIL_RISK_KEYS); las duraciones
+    están en días naturales y recovery_days es NaN si la
+    caída máxima aún no se ha recuperado.
+    Devuelve {horizonte: métricas} para los horizontes con al menos 2 NAVs.
+    """
+    navs = navs.dropna()
+    n_navs = len(navs)
+    if n_navs < 2:
+        return {}
+
+    nav = navs.to_numpy(dtype=np.float64)
+    days = navs.index.values.astype('datetime64[D]').astype(np.int64)
+    returns = nav[1:] / nav[:-1] - 1
 
-    return metrics
+    anchor = navs.index.max()
+    results = {}
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for horizonte in horizontes:
+            start = horizon_start(horizonte, anchor)
+            first = 0 if start is None else int(navs.index.searchsorted(start, side='left'))
+            if n_navs - first < 2:
+                continue
+            if n_navs - 1 - first < 2:
+                results[horizonte] = {key: np.nan for key in RISK_METRIC_KEYS}
+                continue
+            results[horizonte] = _riesgo_ventana(returns[first:], nav[first + 1:], days[first + 1:], confidence)
+    return results
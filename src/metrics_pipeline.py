@@ -0,0 +1,262 @@
+# src/metrics_pipeline.py
+"""
+Recálculo incremental de fund_metrics: en cada ejecución solo se recalculan
+los fondos "sucios", es decir, los que tienen precios con fecha posterior
+al último precio que entró en su cálculo (prices_through) o que aún no
+tienen métricas.
+
+Se compara con la fecha del último precio usado y no con la del cálculo
+(last_calculated) porque el NAV de un día puede ingerirse días después: un
+precio con fecha D que llega en D+2, tras un cálculo hecho en D+1, sigue
+siendo posterior a prices_through.
+
+Los precios que se reescriben con fechas antiguas (backfill) no mueven la
+última fecha: para esos casos está `since` (o el recálculo completo).
+
+El cálculo va en streaming y con memoria acotada: un cursor con nombre
+(del lado del servidor) devuelve los precios ordenados por (isin, date),
+cada fondo se calcula en cuanto llegan todas sus filas y los resultados se
+escriben por lotes en otra conexión. En memoria solo hay un fondo, el
+buffer del cursor (`itersize` filas) y el lote pendiente de escribir.
+
+En modo paralelo los ISINs se reparten en particiones entre procesos: cada
+proceso lee sus precios con su propia conexión (COPY binario, sin pasar
+DataFrames entre procesos) y devuelve solo las filas de métricas, que un
+único escritor en el proceso principal guarda por lotes.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+from src.config import HORIZONTE_OPCIONES
+from src.db_connector import db_connection
+from src.metrics import (
+    RISK_METRIC_KEYS, TAIL_RISK_KEYS, calcular_metricas_multihorizonte, calcular_riesgo_multihorizonte,
+)
+from src.navs import ffill_columns
+from src.price_reader import read_prices, days_to_date
+
+# Filas que el cursor con nombre trae del servidor en cada viaje
+METRICS_STREAM_ITERSIZE = int(os.getenv("METRICS_STREAM_ITERSIZE", "20000"))
+# Filas de fund_metrics por lote (un INSERT ... ON CONFLICT y un commit por lote)
+METRICS_BATCH_ROWS = int(os.getenv("METRICS_BATCH_ROWS", "2000"))
+# ISINs por tarea en modo paralelo: reparte la carga y acota la memoria de cada proceso
+METRICS_PARTITION_SIZE = int(os.getenv("METRICS_PARTITION_SIZE", "100"))
+
+_FRESHNESS_SQL = """
+    SELECT f.isin,
+           (SELECT MAX(p.date) FROM historical_prices p WHERE p.isin = f.isin),
+           (SELECT MIN(m.prices_through) FROM fund_metrics m WHERE m.isin = f.isin)
+    FROM funds f
+    ORDER BY f.isin
+"""
+
+_STREAM_PRICES_SQL = """
+    SELECT isin, date, COALESCE(nav::float8, 'NaN'::float8)
+    FROM historical_prices
+    WHERE isin = ANY(%(isins)s::text[])
+    ORDER BY isin, date
+"""
+
+# Columnas de fund_metrics que escribe el worker, en el orden de fund_metric_rows
+METRIC_ROW_COLUMNS = [
+    "isin", "horizon", "annualized_return_pct", "cumulative_return_pct", "volatility_pct", "sharpe_ratio",
+    "sortino_ratio", "max_drawdown_pct", "calmar_ratio",
+    "var_hist_pct", "cvar_hist_pct", "var_param_pct", "cvar_param_pct",
+    "ulcer_index", "max_drawdown_days", "recovery_days", "prices_through",
+]
+
+_UPSERT_METRICS_SQL = f"""
+    INSERT INTO fund_metrics ({", ".join(METRIC_ROW_COLUMNS)})
+    VALUES %s
+    ON CONFLICT (isin, horizon) DO UPDATE SET
+        {", ".join(f"{column} = EXCLUDED.{column}" for column in METRIC_ROW_COLUMNS[2:])},
+        last_calculated = NOW();
+"""
+
+
+def read_metrics_freshness(conn) -> list:
+    """(isin, última fecha con precio, último precio usado en sus métricas) de cada fondo del catálogo."""
+    with conn.cursor() as cursor:
+        cursor.execute(_FRESHNESS_SQL)
+        return cursor.fetchall()
+
+
+def select_dirty_isins(freshness, since: date | None = None, full: bool = False) -> tuple[list, int]:
+    """
+    Devuelve (ISINs a recalcular, nº de fondos omitidos) a partir de las
+    filas de read_metrics_freshness. Los fondos sin precios se omiten siempre.
+      - full: todos los fondos con precios.
+      - since: los fondos con algún precio en esa fecha o posterior, sin
+        mirar prices_through.
+      - por defecto: sin métricas, o con precios posteriores al último que
+        entró en su cálculo.
+    """
+    dirty = []
+    for isin, latest_date, prices_through in freshness:
+        if latest_date is None:
+            continue
+        if full:
+            dirty.append(isin)
+        elif since is not None:
+            if latest_date >= since:
+                dirty.append(isin)
+        elif prices_through is None or latest_date > prices_through:
+            dirty.append(isin)
+    return dirty, len(freshness) - len(dirty)
+
+
+def stream_fund_prices(conn, isins, itersize: int = METRICS_STREAM_ITERSIZE):
+    """
+    Genera (isin, fechas en días desde 1970-01-01 int32, navs float64) fondo
+    a fondo, leyendo con un cursor con nombre para no traer toda la tabla.
+    Mismo formato que PriceArrays.fund_slices().
+    """
+    with conn.cursor(name="metrics_price_stream") as cursor:
+        cursor.itersize = itersize
+        cursor.execute(_STREAM_PRICES_SQL, {'isins': sorted(set(isins))})
+        for isin, rows in groupby(cursor, key=itemgetter(0)):
+            rows = list(rows)
+            dates = np.array([row[1] for row in rows], dtype='datetime64[D]').astype(np.int32)
+            navs = np.array([row[2] for row in rows], dtype=np.float64)
+            yield isin, dates, navs
+
+
+def daily_navs(dates: np.ndarray, navs: np.ndarray) -> pd.Series:
+    """Remuestrea a diario (forward-fill) los NAVs de un fondo, como el comparador."""
+    offsets = dates - dates[0]
+    daily = np.full(int(offsets[-1]) + 1, np.nan)
+    daily[offsets] = navs
+    index = pd.date_range(start=pd.Timestamp(int(dates[0]), unit='D'), periods=len(daily), freq='D')
+    return pd.Series(ffill_columns(daily[:, None])[:, 0], index=index)
+
+
+def fund_metric_rows(isin: str, dates: np.ndarray, navs: np.ndarray) -> list:
+    """
+    Filas (isin, horizonte, métricas..., prices_through) de fund_metrics de un
+    fondo, para todos los horizontes. prices_through es la fecha del último
+    precio usado.
+    """
+    if len(navs) < 2:
+        return []
+    prices_through = days_to_date(dates[-1])
+    series = daily_navs(dates, navs)
+    # Asumimos una tasa libre de riesgo de 0.0 para el cálculo de métricas
+    metrics_by_horizon = calcular_metricas_multihorizonte(series, HORIZONTE_OPCIONES, risk_free_rate=0.0)
+    risk_by_horizon = calcular_riesgo_multihorizonte(series, HORIZONTE_OPCIONES)
+    # VaR y CVaR sobre los precios publicados; la serie diaria solo para caídas y duraciones
+    published = pd.Series(navs, index=dates.astype('datetime64[D]'))
+    tail_by_horizon = calcular_riesgo_multihorizonte(published, HORIZONTE_OPCIONES)
+    for horizonte, risk in risk_by_horizon.items():
+        tail = tail_by_horizon.get(horizonte, {})
+        risk.update({key: tail.get(key, np.nan) for key in TAIL_RISK_KEYS})
+    return [
+        (
+            isin,
+            horizonte,
+            metrics.get('annualized_return_%'),
+            metrics.get('cumulative_return_%'),
+            metrics.get('volatility_ann_%'),
+            metrics.get('sharpe_ann'),
+            metrics.get('sortino_ann'),
+            metrics.get('max_drawdown_%'),
+            metrics.get('calmar_ratio'),
+            *(risk_by_horizon[horizonte].get(key) for key in RISK_METRIC_KEYS),
+            prices_through,
+        )
+        for horizonte, metrics in metrics_by_horizon.items()
+    ]
+
+
+def clean_metric_row(row: tuple) -> tuple:
+    """
+    Convierte los valores de NumPy a float o int de Python y los NaN a None
+    (NULL); las fechas se mantienen.
+    """
+    return row[:2] + tuple(
+        val if isinstance(val, date) else None if pd.isna(val)
+        else int(val) if isinstance(val, (int, np.integer)) else float(val)
+        for val in row[2:]
+    )
+
+
+class MetricsWriter:
+    """
+    Acumula filas de fund_metrics y las guarda (upsert) por lotes de
+    `batch_size` filas, con un commit por lote. Debe usar una conexión
+    distinta de la del cursor de lectura: el commit cerraría el cursor.
+    """
+    def __init__(self, conn, batch_size: int = METRICS_BATCH_ROWS):
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+        self.written = 0
+
+    def add(self, rows):
+        self.pending.extend(rows)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with self.conn.cursor() as cursor:
+            execute_values(cursor, _UPSERT_METRICS_SQL, [clean_metric_row(row) for row in self.pending],
+                           page_size=len(self.pending))
+        self.conn.commit()
+        self.written += len(self.pending)
+        self.pending = []
+
+
+def compute_metrics_streaming(conn, isins, writer: MetricsWriter) -> int:
+    """Calcula en este proceso, fondo a fondo, las métricas de `isins`. Devuelve los fondos procesados."""
+    processed = 0
+    for isin, dates, navs in stream_fund_prices(conn, isins):
+        writer.add(fund_metric_rows(isin, dates, navs))
+        processed += 1
+    writer.flush()
+    return processed
+
+
+def compute_partition_metrics(isins) -> tuple[list, int]:
+    """
+    Tarea de un proceso del pool: lee los precios de `isins` con su propia
+    conexión y devuelve (filas de fund_metrics, fondos procesados).
+    """
+    with db_connection() as conn:
+        if not conn:
+            raise ConnectionError("No se pudo conectar a la base de datos desde el proceso de cálculo.")
+        prices = read_prices(conn, isins)
+    rows = []
+    processed = 0
+    for isin, dates, navs in prices.fund_slices():
+        rows.extend(fund_metric_rows(isin, dates, navs))
+        processed += 1
+    return rows, processed
+
+
+def compute_metrics_parallel(isins, writer: MetricsWriter, jobs: int,
+                             partition_size: int = METRICS_PARTITION_SIZE) -> int:
+    """
+    Reparte `isins` en particiones entre `jobs` procesos; el proceso actual
+    es el único escritor. Devuelve los fondos procesados.
+    """
+    isins = sorted(set(isins))
+    partition_size = max(1, partition_size)
+    partitions = [isins[i:i + partition_size] for i in range(0, len(isins), partition_size)]
+    processed = 0
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as executor:
+        futures = [executor.submit(compute_partition_metrics, partition) for partition in partitions]
+        for future in as_completed(futures):
+            rows, partition_processed = future.result()
+            writer.add(rows)
+            processed += partition_processed
+    writer.flush()
+    return processed
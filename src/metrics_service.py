@@ -0,0 +1,103 @@
+# src/metrics_service.py
+"""
+Métricas por fondo para las páginas: se sirven desde fund_metrics (las que
+precalcula tools/metrics_worker.py) cuando están al día y solo se calculan
+en vivo, con calcular_metricas_batch, las que faltan o están desfasadas.
+Así en cada rerun de Streamlit solo se calculan las métricas de la cartera.
+
+Una fila de fund_metrics está al día si su cálculo ya incluía el último
+precio del fondo (prices_through, el mismo criterio que usa el worker para
+no recalcularla) y si es del mismo horizonte. Solo se guardan con tasa libre de riesgo 0.
+
+El worker calcula cada fondo sobre su propio histórico, anclado en su
+último precio: filtrar_por_horizonte(navs, h).pct_change().dropna(). El
+cálculo en vivo usa la misma definición sobre la matriz alineada (sin
+rellenar con 0 los días anteriores al inicio de cada fondo), así que ambas
+coinciden siempre que el ancla sea la misma; por eso una fila guardada solo
+se sirve si su prices_through es la última fecha de la matriz.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.db_connector import db_connection
+from src.metrics import METRIC_KEYS, calcular_metricas_batch
+
+# Columnas de fund_metrics en el orden de METRIC_KEYS
+STORED_METRIC_COLUMNS = [
+    "annualized_return_pct", "cumulative_return_pct", "volatility_pct", "sharpe_ratio",
+    "sortino_ratio", "max_drawdown_pct", "calmar_ratio",
+]
+
+_FRESH_METRICS_SQL = f"""
+    SELECT m.isin, {", ".join(f"m.{column}" for column in STORED_METRIC_COLUMNS)}, m.prices_through
+    FROM fund_metrics m
+    WHERE m.horizon = %(horizon)s
+      AND m.isin = ANY(%(isins)s::text[])
+      AND m.prices_through >= (SELECT MAX(p.date) FROM historical_prices p WHERE p.isin = m.isin)
+"""
+
+
+def _empty_stored() -> pd.DataFrame:
+    stored = pd.DataFrame(columns=METRIC_KEYS, dtype=np.float64)
+    stored["prices_through"] = pd.Series(dtype='datetime64[s]')
+    return stored
+
+
+def read_fresh_metrics(conn, isins, horizonte: str) -> pd.DataFrame:
+    """
+    Métricas al día de `isins` para `horizonte` (índice ISIN, columnas
+    METRIC_KEYS y prices_through, la fecha del último precio usado).
+    """
+    isins = sorted(set(isins))
+    if not isins:
+        return _empty_stored()
+    with conn.cursor() as cursor:
+        cursor.execute(_FRESH_METRICS_SQL, {'horizon': horizonte, 'isins': isins})
+        rows = cursor.fetchall()
+    index = [row[0] for row in rows]
+    stored = pd.DataFrame([row[1:-1] for row in rows], index=index, columns=METRIC_KEYS, dtype=np.float64)
+    stored["prices_through"] = pd.to_datetime(pd.Series([row[-1] for row in rows], index=index, dtype=object))
+    return stored
+
+
+def load_fresh_metrics(isins, horizonte: str) -> pd.DataFrame:
+    """read_fresh_metrics con una conexión del pool; vacío si la base de datos no responde."""
+    try:
+        with db_connection() as conn:
+            if conn:
+                return read_fresh_metrics(conn, isins, horizonte)
+    except Exception as e:
+        print(f"⚠️ No se pudieron leer las métricas precalculadas: {e}")
+    return _empty_stored()
+
+
+def get_fund_metrics(navs: pd.DataFrame, horizonte: str, risk_free_rate: float = 0.0,
+                     stored: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Métricas (fondos x METRIC_KEYS) de las columnas de `navs`, la matriz
+    alineada ya filtrada por `horizonte` (filtrar_por_horizonte): las de
+    `stored` (por defecto, load_fresh_metrics) cuyo último precio es la
+    última fecha de `navs` y el resto con calcular_metricas_batch sobre
+    navs.pct_change(), que deja fuera los días anteriores a cada fondo. El
+    número de fondos servidos desde la tabla queda en `.attrs["from_store"]`.
+    """
+    isins = list(navs.columns)
+    if risk_free_rate != 0.0 or not isins or navs.empty:
+        stored = _empty_stored()
+    elif stored is None:
+        stored = load_fresh_metrics(isins, horizonte)
+
+    # Con otra ancla las ventanas del worker y de la matriz no son las mismas
+    if len(stored):
+        stored = stored[stored["prices_through"] == navs.index.max()]
+    from_store = stored.index.intersection(pd.Index(isins))
+    missing = [isin for isin in isins if isin not in from_store]
+    result = pd.DataFrame(np.nan, index=pd.Index(isins), columns=METRIC_KEYS)
+    if len(from_store):
+        result.loc[from_store] = stored.loc[from_store, METRIC_KEYS].to_numpy()
+    if missing:
+        returns = navs[missing].pct_change()
+        result.loc[missing] = calcular_metricas_batch(returns, risk_free_rate=risk_free_rate).to_numpy()
+    result.attrs["from_store"] = len(from_store)
+    return result
@@ -0,0 +1,184 @@
+# src/montecarlo.py
+"""
+Proyección Monte Carlo de una cartera por bootstrap de bloques: cada
+trayectoria futura se construye encadenando bloques de `block_days` días
+consecutivos de la historia (circular, los bloques pueden dar la vuelta al
+final), así que se conservan la volatilidad agrupada y la autocorrelación
+de corto plazo que se perderían sorteando días sueltos.
+
+Los bloques se sortean sobre las filas de la matriz de rentabilidades
+alineadas, con los pesos fijos cada día como Portfolio por defecto; eso
+equivale a sortear la rentabilidad diaria de la cartera, que es lo que se
+hace (una serie en lugar de una matriz).
+
+Las rentabilidades pueden venir de un calendario diario con forward-fill
+(align_navs), con rentabilidades 0 en fines de semana y festivos: el
+horizonte se mide en filas de esa misma historia (sus filas por año
+natural observadas), no en 252 sesiones, para que `years` sean años de
+calendario y no solo de sesiones de mercado.
+
+Las trayectorias se generan por bloques de `chunk_size` con índices
+vectorizados (sin bucles por trayectoria) y solo se guarda de cada una el
+valor en los puntos de control (cada CHECKPOINT_DAYS días) y su caída
+máxima, así que la memoria no crece con los días x trayectorias. Cada
+bloque tiene su propio generador derivado de `seed` (SeedSequence.spawn):
+el resultado es el mismo en serie o repartido entre procesos.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from .metrics import ANNUALIZATION_FACTOR
+from .portfolio import portfolio_returns_batch
+
+MONTECARLO_PATHS = 5000
+# Un mes de mercado: conserva la dependencia de corto plazo sin repetir demasiada historia
+MONTECARLO_BLOCK_DAYS = 21
+MONTECARLO_CHUNK_PATHS = 1000
+CHECKPOINT_DAYS = 21
+FAN_PERCENTILES = [5, 25, 50, 75, 95]
+DEFAULT_DRAWDOWN_THRESHOLD = 0.20
+# Por debajo de estas trayectorias no compensa arrancar procesos
+MONTECARLO_POOL_MIN_PATHS = 20000
+DAYS_PER_YEAR = 365.25
+
+
+class MonteCarloResult(NamedTuple):
+    """
+    `bands` son los percentiles FAN_PERCENTILES del valor (columnas) en cada
+    punto de control, en años desde hoy (índice, empieza en 0 con el valor
+    inicial). `final_values` y `max_drawdowns` (en tanto por uno, negativas)
+    van por trayectoria y `summary` resume probabilidades y medianas.
+    """
+    bands: pd.DataFrame
+    final_values: np.ndarray
+    max_drawdowns: np.ndarray
+    summary: dict
+
+
+def checkpoint_days(horizon_days: int) -> np.ndarray:
+    """Días (1..horizon_days) en los que se guarda el valor de cada trayectoria; siempre incluye el último."""
+    return np.union1d(np.arange(CHECKPOINT_DAYS, horizon_days + 1, CHECKPOINT_DAYS), [horizon_days])
+
+
+def bootstrap_indices(rng: np.random.Generator, n_history: int, n_paths: int, horizon_days: int,
+                      block_days: int = MONTECARLO_BLOCK_DAYS) -> np.ndarray:
+    """Índices (trayectorias x días) de la historia, por bloques circulares de `block_days` días."""
+    block_days = max(1, min(block_days, n_history))
+    n_blocks = -(-horizon_days // block_days)
+    starts = rng.integers(0, n_history, size=(n_paths, n_blocks, 1))
+    indices = (starts + np.arange(block_days)) % n_history
+    return indices.reshape(n_paths, n_blocks * block_days)[:, :horizon_days]
+
+
+def simulate_chunk(returns: np.ndarray, n_paths: int, horizon_days: int, block_days: int,
+                   seed: np.random.SeedSequence) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Un bloque de trayectorias sobre las rentabilidades diarias históricas
+    `returns`. Devuelve (valor relativo en cada checkpoint_days, caída
+    máxima de cada trayectoria).
+    """
+    rng = np.random.default_rng(seed)
+    paths = np.cumprod(1 + returns[bootstrap_indices(rng, len(returns), n_paths, horizon_days, block_days)], axis=1)
+    # El valor inicial (1) también cuenta como máximo previo
+    peaks = np.maximum(np.maximum.accumulate(paths, axis=1), 1.0)
+    max_drawdowns = (paths / peaks - 1).min(axis=1)
+    return paths[:, checkpoint_days(horizon_days) - 1], max_drawdowns
+
+
+def _simulate_chunk_args(args):
+    return simulate_chunk(*args)
+
+
+def simulate_paths(returns: np.ndarray, n_paths: int, horizon_days: int,
+                   block_days: int = MONTECARLO_BLOCK_DAYS, seed: int | None = None,
+                   chunk_size: int = MONTECARLO_CHUNK_PATHS, workers: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    `n_paths` trayectorias de `horizon_days` días por bloques de `chunk_size`.
+    Con `workers` > 1 y al menos MONTECARLO_POOL_MIN_PATHS trayectorias, los
+    bloques se reparten en un ProcessPoolExecutor. Mismo resultado que
+    simulate_chunk concatenado.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    chunk_size = max(1, chunk_size)
+    sizes = [min(chunk_size, n_paths - start) for start in range(0, n_paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(returns, size, horizon_days, block_days, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if workers > 1 and n_paths >= MONTECARLO_POOL_MIN_PATHS:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_simulate_chunk_args, tasks))
+    else:
+        chunks = [simulate_chunk(*task) for task in tasks]
+    if not chunks:
+        return np.empty((0, len(checkpoint_days(horizon_days)))), np.empty(0)
+    return np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks])
+
+
+def history_rows_per_year(index: pd.Index) -> float:
+    """
+    Filas de rentabilidad por año natural de una historia con fechas
+    `index` (la primera fila no cuenta): ~365 con el calendario diario de
+    align_navs, ~252-261 con días hábiles. ANNUALIZATION_FACTOR si el
+    índice no son fechas o no abarca al menos un día.
+    """
+    if not isinstance(index, pd.DatetimeIndex) or len(index) < 2:
+        return float(ANNUALIZATION_FACTOR)
+    span_days = (index.max() - index.min()) / pd.Timedelta(days=1)
+    if span_days <= 0:
+        return float(ANNUALIZATION_FACTOR)
+    return (len(index) - 1) * DAYS_PER_YEAR / span_days
+
+
+def run_montecarlo(returns: pd.DataFrame, weights: dict, years: float = 10, initial: float = 10000,
+                   target: float | None = None, drawdown_threshold: float = DEFAULT_DRAWDOWN_THRESHOLD,
+                   n_paths: int = MONTECARLO_PATHS, block_days: int = MONTECARLO_BLOCK_DAYS,
+                   seed: int | None = None, chunk_size: int = MONTECARLO_CHUNK_PATHS,
+                   workers: int = 1) -> MonteCarloResult | None:
+    """
+    Proyecta `initial` invertido hoy en la cartera `weights` (activo -> peso,
+    se normalizan) a `years` años con las rentabilidades diarias históricas
+    `returns` (fechas x activos; la primera fila no cuenta y los NaN cuentan
+    como 0, como en Portfolio). `target` es el valor final objetivo (por
+    defecto, `initial`: probabilidad de perder dinero) y `drawdown_threshold`
+    la caída (en tanto por uno) cuya probabilidad se calcula. None si no hay
+    datos.
+    Cada año proyectado son tantas filas como filas por año natural tenga
+    la historia (ver history_rows_per_year).
+    """
+    weights = pd.DataFrame([weights], dtype=float)
+    if returns.empty or len(returns) < 2 or weights.reindex(columns=returns.columns).fillna(0).to_numpy().sum() == 0:
+        return None
+    history = portfolio_returns_batch(returns, weights).iloc[1:, 0].to_numpy()
+    rows_per_year = history_rows_per_year(returns.index)
+    horizon_days = max(1, int(round(years * rows_per_year)))
+    values, max_drawdowns = simulate_paths(history, n_paths, horizon_days, block_days, seed, chunk_size, workers)
+
+    values = values * initial
+    final_values = values[:, -1]
+    target = initial if target is None else target
+    days = np.concatenate([[0], checkpoint_days(horizon_days)])
+    bands = pd.DataFrame(
+        np.vstack([np.full(len(FAN_PERCENTILES), float(initial)), np.percentile(values, FAN_PERCENTILES, axis=0).T]),
+        index=pd.Index(days * years / horizon_days, name="years"),
+        columns=FAN_PERCENTILES,
+    )
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cagr = (final_values / initial) ** (1 / years) - 1
+    summary = {
+        "median_final": float(np.median(final_values)),
+        "median_cagr_%": float(np.median(cagr) * 100),
+        "target": float(target),
+        "prob_shortfall_%": float((final_values < target).mean() * 100),
+        "drawdown_threshold_%": drawdown_threshold * 100,
+        "prob_drawdown_%": float((max_drawdowns <= -drawdown_threshold).mean() * 100),
+        "median_max_drawdown_%": float(np.median(max_drawdowns) * 100),
+        "history_days": len(history),
+        "history_years": len(history) / rows_per_year,
+        "rows_per_year": rows_per_year,
+        "horizon_days": horizon_days,
+    }
+    return MonteCarloResult(bands=bands, final_values=final_values, max_drawdowns=max_drawdowns, summary=summary)
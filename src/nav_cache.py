@@ -0,0 +1,139 @@
+# src/nav_cache.py
+"""
+Caché LRU en memoria, compartida por todo el proceso, de los precios de cada
+ISIN. Cualquier conjunto de fondos se monta a partir de las entradas ya
+cacheadas y solo se piden al loader los ISIN que faltan. Cada entrada
+recuerda desde qué fecha tiene datos, de modo que una vista de horizonte corto
+reutiliza lo cargado para uno largo pero no al revés.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from src.price_reader import PriceArrays, date_to_days
+
+NAV_CACHE_MAX_MB = float(os.getenv("NAV_CACHE_MAX_MB", "512"))
+NAV_CACHE_TTL_SECONDS = float(os.getenv("NAV_CACHE_TTL_SECONDS", "900"))
+
+
+class NavCache:
+    """
+    LRU por ISIN con presupuesto de memoria (bytes de los arrays), caducidad
+    y contadores de aciertos/fallos.
+    """
+    def __init__(self, max_bytes: int = int(NAV_CACHE_MAX_MB * 1024 ** 2),
+                 ttl_seconds: float = NAV_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # isin -> (dates, navs, loaded_at, start)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, isin: str, now: float, start: int | None):
+        entry = self._entries.get(isin)
+        if entry is None:
+            return None
+        if now - entry[2] >= self.ttl_seconds:
+            self._remove(isin)
+            return None
+        if entry[3] is not None and (start is None or entry[3] > start):
+            return None  # La entrada empieza después de lo pedido
+        self._entries.move_to_end(isin)
+        return entry
+
+    def _remove(self, isin: str):
+        dates, navs, _, _ = self._entries.pop(isin)
+        self._bytes -= dates.nbytes + navs.nbytes
+
+    def _store(self, isin: str, dates: np.ndarray, navs: np.ndarray, now: float, start: int | None):
+        size = dates.nbytes + navs.nbytes
+        if size > self.max_bytes:
+            return  # Nunca cabría: se devuelve pero no se cachea
+        if isin in self._entries:
+            self._remove(isin)
+        dates.flags.writeable = False
+        navs.flags.writeable = False
+        self._entries[isin] = (dates, navs, now, start)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def get_many(self, isins, loader, start_date=None) -> PriceArrays:
+        """
+        Devuelve los precios de `isins` desde `start_date` (todo el histórico
+        si es None). `loader(isins_faltantes)` debe devolver un PriceArrays
+        que cubra ese mismo inicio y solo se llama con los ISIN no cacheados
+        (o cacheados con un inicio posterior).
+        """
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        start = None if start_date is None else date_to_days(start_date)
+        now = time.time()
+        found = {}
+        with self._lock:
+            for isin in isins:
+                entry = self._lookup(isin, now, start)
+                if entry is not None:
+                    found[isin] = entry
+            missing = [isin for isin in isins if isin not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            loaded = {isin: (np.array([], dtype=np.int32), np.array([], dtype=np.float64))
+                      for isin in missing}
+            for isin, dates, navs in loader(missing).fund_slices():
+                loaded[isin] = (np.array(dates, dtype=np.int32), np.array(navs, dtype=np.float64))
+            with self._lock:
+                for isin, (dates, navs) in loaded.items():
+                    self._store(isin, dates, navs, now, start)
+                    found[isin] = (dates, navs, now, start)
+
+        codes, dates, navs = [], [], []
+        for code, isin in enumerate(isins):
+            fund_dates, fund_navs, _, _ = found[isin]
+            if start is not None:
+                first = np.searchsorted(fund_dates, start)
+                fund_dates, fund_navs = fund_dates[first:], fund_navs[first:]
+            if len(fund_dates):
+                codes.append(np.full(len(fund_dates), code, dtype=np.int32))
+                dates.append(fund_dates)
+                navs.append(fund_navs)
+        if not codes:
+            return PriceArrays(isins, np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+                               np.array([], dtype=np.float64))
+        return PriceArrays(isins, np.concatenate(codes), np.concatenate(dates), np.concatenate(navs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+_nav_cache = NavCache()
+
+
+def get_nav_cache() -> NavCache:
+    """Caché de NAVs compartida por todas las sesiones del proceso."""
+    return _nav_cache
@@ -0,0 +1,279 @@
+# src/nav_store.py
+"""
+Caché local en disco de los NAV históricos: un array de NumPy por ISIN
+(fecha int32 + nav float64) leído con memory-map y sincronizado de forma
+incremental desde PostgreSQL a partir de una marca de agua por ISIN. En
+cada sincronización se vuelven a leer los últimos `revision_days` días
+antes de la marca (la ventana en la que la ingesta reescribe NAV revisados)
+y se sustituyen en el fichero si han cambiado. Cada ISIN puede guardar
+solo el histórico desde una fecha de inicio (horizontes cortos); si se pide
+un horizonte más largo se vuelve a descargar desde ahí.
+"""
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from src.db_connector import db_connection
+from src.price_reader import PriceArrays, read_prices, days_to_date
+from src.async_price_loader import read_prices_concurrent, PRICE_LOADER_MIN_ISINS
+from src.price_ingestion import PRICE_REVISION_LOOKBACK_DAYS
+
+# Segundos durante los que un ISIN sincronizado no vuelve a consultar la BD
+SYNC_INTERVAL_SECONDS = float(os.getenv("NAV_STORE_SYNC_SECONDS", "900"))
+# Días antes de la marca de agua que se releen en cada sincronización: al
+# menos la ventana en la que price_ingestion reescribe precios revisados
+NAV_STORE_REVISION_DAYS = max(int(os.getenv("NAV_STORE_REVISION_DAYS", "0")), PRICE_REVISION_LOOKBACK_DAYS)
+
+NAV_RECORD_DTYPE = np.dtype([('date', '<i4'), ('nav', '<f8')])
+
+
+class NavStore:
+    """
+    Almacén columnar de NAVs por ISIN con sincronización incremental.
+    Usa NavStore.for_path() para compartir una instancia (y su manifiesto)
+    entre todas las ejecuciones del proceso.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, root: Path, sync_interval_seconds: float = SYNC_INTERVAL_SECONDS,
+                 revision_days: int = NAV_STORE_REVISION_DAYS):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.sync_interval_seconds = sync_interval_seconds
+        self.revision_days = revision_days
+        self.manifest_path = self.root / "manifest.json"
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+
+    @classmethod
+    def for_path(cls, root: Path) -> "NavStore":
+        key = str(Path(root).resolve())
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(root)
+            return cls._instances[key]
+
+    # --- Manifiesto (marca de agua, inicio y última sincronización por ISIN) ---
+
+    def _read_manifest(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _path(self, isin: str) -> Path:
+        return self.root / f"{isin}.npy"
+
+    def watermark(self, isin: str) -> int | None:
+        """Última fecha almacenada (días desde 1970-01-01) o None."""
+        entry = self._manifest.get(isin)
+        return entry.get("watermark") if entry else None
+
+    def covers(self, isin: str, start: int | None = None) -> bool:
+        """
+        True si el fichero del ISIN contiene todo lo posterior a `start` (días
+        desde 1970-01-01; None = histórico completo).
+        """
+        entry = self._manifest.get(isin)
+        if entry is None or not self._path(isin).exists():
+            return False
+        stored_start = entry.get("start")
+        return stored_start is None or (start is not None and stored_start <= start)
+
+    def latest_dates(self, isins, until: int) -> dict | None:
+        """
+        {isin: última fecha almacenada en `until` o antes (None si no hay)},
+        en días desde 1970-01-01, sin consultar la BD. Devuelve None si algún
+        ISIN no está al día o su fichero empieza después de esa fecha (la
+        respuesta podría estar en el tramo que no se ha descargado).
+        """
+        result = {}
+        for isin in dict.fromkeys(isins):
+            entry = self._manifest.get(isin)
+            path = self._path(isin)
+            if entry is None or self.needs_sync(isin) or not path.exists():
+                return None
+            dates = np.load(path, mmap_mode='r')['date']
+            position = int(np.searchsorted(dates, until, side='right'))
+            if position == 0 and entry.get("start") is not None:
+                return None
+            result[isin] = int(dates[position - 1]) if position else None
+        return result
+
+    def needs_sync(self, isin: str, now: float | None = None) -> bool:
+        entry = self._manifest.get(isin)
+        if entry is None:
+            return True
+        now = time.time() if now is None else now
+        return now - entry.get("synced_at", 0) >= self.sync_interval_seconds
+
+    # --- Sincronización y lectura ---
+
+    def sync(self, conn, isins, force: bool = False, start: int | None = None) -> dict:
+        """
+        Descarga las filas posteriores a la marca de agua de cada ISIN menos
+        `revision_days` días y sustituye con ellas ese tramo de su fichero
+        (filas nuevas y NAV revisados). Los ISIN que no cubren `start` (días
+        desde 1970-01-01; None = histórico completo) se descargan de nuevo
+        desde esa fecha. Devuelve {isin: filas nuevas o revisadas}.
+        `conn` es opcional: sin ella se toma una conexión del pool solo
+        mientras dura la lectura. Las cargas grandes nunca la usan (cada
+        bloque toma la suya), así que quien llama no debe retener una
+        conexión del pool mientras tanto o podría agotarlo.
+        """
+        now = time.time()
+        isins = list(dict.fromkeys(isins))
+        refetch = {isin for isin in isins if not self.covers(isin, start)}
+        pending = [isin for isin in isins if isin in refetch or force or self.needs_sync(isin, now)]
+        if not pending:
+            return {}
+
+        watermarks, lowers = {}, {}
+        for isin in pending:
+            if isin in refetch:
+                lower = None if start is None else start - 1
+            else:
+                wm = self.watermark(isin)
+                stored_start = self._manifest[isin].get("start")
+                lower = None if wm is None else wm - self.revision_days
+                if stored_start is not None:
+                    lower = stored_start - 1 if lower is None else max(lower, stored_start - 1)
+            lowers[isin] = lower
+            if lower is not None:
+                watermarks[isin] = days_to_date(lower)
+
+        new_prices = self._read(conn, pending, watermarks)
+        fetched = {isin: (dates, navs) for isin, dates, navs in new_prices.fund_slices()}
+        empty = (np.array([], dtype=np.int32), np.array([], dtype=np.float64))
+
+        written = {}
+        with self._lock:
+            for isin in pending:
+                dates, navs = fetched.get(isin, empty)
+                # Otro hilo pudo sincronizar (o ampliar) este ISIN mientras leíamos
+                replace = isin in refetch and not self.covers(isin, start)
+                entry = self._manifest.setdefault(isin, {"watermark": None})
+                entry["synced_at"] = now
+                if replace:
+                    self._append(isin, dates, navs, replace=True)
+                    entry["start"] = start
+                    entry["watermark"] = int(dates[-1]) if len(dates) else None
+                    if len(dates):
+                        written[isin] = len(dates)
+                    continue
+
+                lower = lowers[isin]
+                if lower is not None:
+                    keep = dates > lower
+                    dates, navs = dates[keep], navs[keep]
+                changed, last_date = self._merge(isin, dates, navs, lower)
+                if changed:
+                    written[isin] = changed
+                entry["watermark"] = last_date
+            self._write_manifest()
+        return written
+
+    def _read(self, conn, isins, watermarks: dict) -> PriceArrays:
+        if len(isins) >= PRICE_LOADER_MIN_ISINS:
+            # Cargas de todo el catálogo: bloques en paralelo por varias conexiones
+            return read_prices_concurrent(isins, watermarks=watermarks)
+        if conn is not None:
+            return read_prices(conn, isins, watermarks=watermarks)
+        with db_connection() as own_conn:
+            if not own_conn:
+                raise ConnectionError("No se pudo obtener una conexión del pool para sincronizar NAVs.")
+            return read_prices(own_conn, isins, watermarks=watermarks)
+
+    def _merge(self, isin: str, dates: np.ndarray, navs: np.ndarray, since: int | None) -> tuple[int, int | None]:
+        """
+        Sustituye las filas del fichero posteriores a `since` por las
+        descargadas. Solo reescribe el fichero si algo cambia. Devuelve
+        (filas nuevas o con otro NAV, última fecha almacenada).
+        """
+        path = self._path(isin)
+        stored = np.load(path) if path.exists() else np.empty(0, dtype=NAV_RECORD_DTYPE)
+        split = 0 if since is None else int(np.searchsorted(stored['date'], since, side='right'))
+        head, tail = stored[:split], stored[split:]
+
+        # Filas descargadas que no estaban o cuyo NAV ha cambiado (NaN = NaN)
+        positions = np.minimum(np.searchsorted(tail['date'], dates), max(len(tail) - 1, 0))
+        same = np.zeros(len(dates), dtype=bool)
+        if len(tail):
+            old_navs = tail['nav'][positions]
+            same = (tail['date'][positions] == dates) & ((old_navs == navs) | (np.isnan(old_navs) & np.isnan(navs)))
+        changed = int((~same).sum())
+
+        if changed or len(tail) != len(dates):
+            new_records = np.empty(len(dates), dtype=NAV_RECORD_DTYPE)
+            new_records['date'] = dates
+            new_records['nav'] = navs
+            stored = np.concatenate([head, new_records])
+            self._write(path, stored)
+        return changed, int(stored['date'][-1]) if len(stored) else None
+
+    def _append(self, isin: str, dates: np.ndarray, navs: np.ndarray, replace: bool) -> int:
+        new_records = np.empty(len(dates), dtype=NAV_RECORD_DTYPE)
+        new_records['date'] = dates
+        new_records['nav'] = navs
+
+        path = self._path(isin)
+        if not replace and path.exists():
+            new_records = np.concatenate([np.load(path, mmap_mode='r'), new_records])
+        self._write(path, new_records)
+        return len(dates)
+
+    def _write(self, path: Path, new_records: np.ndarray):
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, new_records)
+        os.replace(tmp_path, path)
+
+    def load(self, isins, start: int | None = None) -> PriceArrays:
+        """
+        Lee del disco (memory-map) los precios de los ISIN disponibles, desde
+        `start` (días desde 1970-01-01) si se indica.
+        """
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        codes, dates, navs = [], [], []
+        for code, isin in enumerate(isins):
+            path = self._path(isin)
+            if not path.exists():
+                continue
+            records = np.load(path, mmap_mode='r')
+            if start is not None:
+                records = records[np.searchsorted(records['date'], start):]
+            codes.append(np.full(len(records), code, dtype=np.int32))
+            dates.append(records['date'])
+            navs.append(records['nav'])
+
+        if not codes:
+            return PriceArrays(isins, np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+                               np.array([], dtype=np.float64))
+        return PriceArrays(isins, np.concatenate(codes), np.concatenate(dates), np.concatenate(navs))
+
+    def invalidate(self, isins=None):
+        """
+        Elimina ISINs del almacén (todos si isins es None) para forzar una
+        descarga completa, p. ej. tras corregir precios antiguos en la BD.
+        """
+        with self._lock:
+            targets = list(self._manifest) if isins is None else list(isins)
+            for isin in targets:
+                self._manifest.pop(isin, None)
+                self._path(isin).unlink(missing_ok=True)
+            self._write_manifest()
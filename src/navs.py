@@ -0,0 +1,87 @@
+# src/navs.py
+"""
+Transformaciones puras sobre series de NAV (sin Streamlit ni base de datos).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def ffill_columns(matrix: np.ndarray) -> np.ndarray:
+    """
+    Forward-fill por columnas de una matriz fechas x fondos. Los NaN
+    anteriores al primer valor de cada columna se mantienen, de modo que
+    cada fondo conserva su propia fecha de inicio.
+    """
+    n_rows = matrix.shape[0]
+    if n_rows == 0:
+        return matrix
+    valid = ~np.isnan(matrix)
+    last_valid = np.where(valid, np.arange(n_rows)[:, None], 0)
+    np.maximum.accumulate(last_valid, axis=0, out=last_valid)
+    return np.take_along_axis(matrix, last_valid, axis=0)
+
+
+def align_navs(prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convierte precios en formato largo (date, isin, nav) en una matriz diaria
+    fechas x ISIN en una sola pasada: un calendario común desde la primera
+    fecha hasta la máxima global y forward-fill por columna desde el inicio
+    de cada fondo. Las columnas salen ordenadas por ISIN.
+    """
+    if prices is None or prices.empty:
+        return pd.DataFrame()
+
+    date_series = pd.to_datetime(prices['date'])
+    dates = date_series.to_numpy(dtype='datetime64[D]')
+    isin_codes, isins = pd.factorize(prices['isin'], sort=True)
+    navs = prices['nav'].to_numpy(dtype=float)
+
+    start = dates.min()
+    day_offsets = (dates - start).astype(np.int64)
+    n_days = int(day_offsets.max()) + 1
+
+    matrix = np.full((n_days, len(isins)), np.nan)
+    matrix[day_offsets, isin_codes] = navs
+
+    calendar = pd.date_range(start=pd.Timestamp(start), periods=n_days, freq='D', name='date')
+    calendar = calendar.as_unit(date_series.dt.unit)
+    return pd.DataFrame(ffill_columns(matrix), index=calendar, columns=pd.Index(np.asarray(isins)))
+
+
+# Días de margen que se leen antes del inicio de un horizonte cuando no se
+# puede consultar el último precio previo de cada fondo (ver
+# horizon_read_start): cubren fines de semana y festivos, no fondos con
+# precios semanales o mensuales ni suspensiones.
+HORIZON_MARGIN_DAYS = 10
+
+
+def horizon_read_start(cutoff, prior_dates):
+    """
+    Primera fecha que hay que leer para que el forward-fill del primer día de
+    un horizonte que empieza en `cutoff` sea el mismo que con el histórico
+    completo: la más antigua de `prior_dates` (último precio de cada fondo en
+    `cutoff` o antes; None si no tiene) o `cutoff` si ninguno tiene precio previo.
+    """
+    return min((d for d in prior_dates if d is not None), default=cutoff)
+
+
+def horizon_start(horizonte: str, anchor: pd.Timestamp) -> pd.Timestamp | None:
+    """
+    Fecha de inicio de `horizonte` ('1m', '6m', '1y', 'YTD', 'max'...) contando
+    hacia atrás desde `anchor`. Devuelve None si abarca todo el histórico y
+    lanza ValueError si el horizonte no se reconoce.
+    """
+    if horizonte.endswith("m"):
+        try:
+            months = int(horizonte[:-1])
+        except (ValueError, TypeError):
+            return None
+        return anchor - pd.DateOffset(months=months)
+    if horizonte in ("1y", "2y", "3y", "5y"):
+        return anchor - pd.DateOffset(years=int(horizonte[:-1]))
+    if horizonte.lower() == "ytd":
+        return pd.Timestamp(year=anchor.year, month=1, day=1)
+    if horizonte.lower() == "max":
+        return None
+    raise ValueError(f"Horizonte no reconocido: {horizonte}")
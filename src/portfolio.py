@@ -1,58 +1,248 @@
 # src/portfolio.py
 
+from functools import cached_property
+
+import numpy as np
 import pandas as pd
-from .metrics import calcular_metricas_desde_rentabilidades
+from .backtest import DEFAULT_REBALANCE_BAND, simulate_rebalancing
+from .cashflows import CashflowResult, run_cashflows
+from .metrics import ANNUALIZATION_FACTOR, METRIC_KEYS, calcular_metricas_batch, calcular_metricas_desde_rentabilidades
+
+
+def _read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
 
 class Portfolio:
     """
     Representa una cartera de activos con pesos específicos.
     Espera un DataFrame de NAVs y un diccionario de pesos.
+
+    `rebalance` es la política de rebalanceo de src/backtest.py ("daily",
+    pesos fijos cada día, por defecto; "none", "monthly", "quarterly",
+    "yearly" o "threshold" con la banda `band`).
+
+    Es inmutable y perezosa: los datos se guardan como arrays de NumPy de
+    solo lectura y rentabilidades, NAV, métricas y contribuciones se
+    calculan la primera vez que se piden y se reutilizan. Las Series y
+    DataFrames que devuelve son vistas sobre esos arrays (no se pueden
+    modificar en sitio).
     """
-    def __init__(self, nav_data: pd.DataFrame, weights: dict):
-        # Normalizar pesos para que sumen 1
+    def __init__(self, nav_data: pd.DataFrame, weights: dict, rebalance: str = "daily",
+                 band: float = DEFAULT_REBALANCE_BAND):
+        # Normalizar pesos para que sumen 1 (llegan en %, p. ej. 50/50 -> 0.5/0.5)
         total_weight = sum(weights.values())
         if total_weight == 0:
-            self.weights = pd.Series(dtype=float)
+            weights = pd.Series(dtype=float)
+        else:
+            weights = pd.Series({k: v / total_weight for k, v in weights.items()}, dtype=float)
+
+        common_assets = weights.index.intersection(nav_data.columns)
+        self._index = nav_data.index
+        self._assets = common_assets
+        self._navs = _read_only(nav_data[common_assets].to_numpy(dtype=np.float64))
+        self._weights = _read_only(weights[common_assets].to_numpy(dtype=np.float64))
+        self._rebalance = rebalance
+        self._band = band
+        self._metrics_cache = {}
+
+    def __setattr__(self, name, value):
+        if name.startswith("_") and name not in self.__dict__:
+            super().__setattr__(name, value)
         else:
-            # Dividimos por el total (que es 100) para obtener pesos normalizados (0.5, 0.5)
-            self.weights = pd.Series({k: v / total_weight for k, v in weights.items()})
+            raise AttributeError(f"Portfolio es inmutable: no se puede asignar '{name}'.")
+
+    @property
+    def is_empty(self) -> bool:
+        return self._weights.size == 0 or self._navs.size == 0
 
-        common_assets = self.weights.index.intersection(nav_data.columns)
-        self.navs = nav_data[common_assets]
-        self.weights = self.weights[common_assets]
+    # --- Vistas de pandas (solo en los bordes) ---
+
+    @property
+    def weights(self) -> pd.Series:
+        return pd.Series(self._weights, index=self._assets, copy=False)
+
+    @property
+    def navs(self) -> pd.DataFrame:
+        return pd.DataFrame(self._navs, index=self._index, columns=self._assets, copy=False)
 
     @property
     def daily_returns(self) -> pd.Series | None:
-        """Calcula los retornos diarios ponderados de la cartera."""
-        if self.weights.empty or self.navs.empty:
+        """Retornos diarios ponderados de la cartera."""
+        if self._returns is None:
             return None
-        
-        asset_returns = self.navs.pct_change() # No usamos .dropna() aquí
-        
-        aligned_weights = self.weights.reindex(asset_returns.columns).fillna(0)
-        
-        portfolio_returns = asset_returns.mul(aligned_weights, axis=1).sum(axis=1)
-        return portfolio_returns
+        return pd.Series(self._returns, index=self._index, copy=False)
 
     @property
     def nav(self) -> pd.Series | None:
-        """Reconstruye el Valor Liquidativo (NAV) de la cartera."""
-        returns = self.daily_returns
-        if returns is None:
+        """Valor Liquidativo (NAV) de la cartera, empezando en 100."""
+        if self._nav is None:
+            return None
+        return pd.Series(self._nav, index=self._index, copy=False)
+
+    # --- Cálculos en NumPy, una sola vez ---
+
+    @cached_property
+    def _asset_returns(self) -> np.ndarray | None:
+        """Rentabilidades por activo como navs.pct_change(): NaN el primer día y junto a huecos."""
+        if self.is_empty:
+            return None
+        returns = np.full(self._navs.shape, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns[1:] = self._navs[1:] / self._navs[:-1] - 1
+        return _read_only(returns)
+
+    @cached_property
+    def _rebalancing(self) -> tuple[np.ndarray, np.ndarray, float] | None:
+        """(pesos al cierre de cada día, posiciones de rebalanceo, turnover) según la política."""
+        if self._asset_returns is None:
             return None
-        
-        # --- LÓGICA CORREGIDA ---
-        # 1. Reemplazamos el primer NaN por 0, para que el valor inicial no cambie.
-        returns.iloc[0] = 0
-        
-        # 2. Reconstruimos el NAV empezando desde 100.
-        return (1 + returns).cumprod() * 100
+        returns = np.where(np.isnan(self._asset_returns), 0.0, self._asset_returns)
+        return simulate_rebalancing(returns, self._weights, self._index, self._rebalance, self._band)
+
+    @cached_property
+    def _weighted_returns(self) -> np.ndarray | None:
+        """Contribución diaria de cada activo (peso al cierre anterior x rentabilidad, NaN como 0)."""
+        if self._asset_returns is None:
+            return None
+        returns = np.where(np.isnan(self._asset_returns), 0.0, self._asset_returns)
+        if self._rebalance == "daily":
+            return _read_only(returns * self._weights)
+        drifted = self._rebalancing[0]
+        return _read_only(returns * np.vstack([self._weights, drifted[:-1]]))
+
+    @property
+    def rebalance_dates(self) -> pd.Index:
+        """Días de rebalanceo de la política."""
+        if self._rebalancing is None:
+            return self._index[:0]
+        return self._index[self._rebalancing[1]]
+
+    @property
+    def turnover(self) -> float:
+        """Suma de lo negociado en los rebalanceos, en tanto por uno del valor de la cartera."""
+        return 0.0 if self._rebalancing is None else self._rebalancing[2]
+
+    @cached_property
+    def _returns(self) -> np.ndarray | None:
+        # Los NaN cuentan como rentabilidad 0 (también el primer día)
+        if self._weighted_returns is None:
+            return None
+        return _read_only(self._weighted_returns.sum(axis=1))
+
+    @cached_property
+    def _nav(self) -> np.ndarray | None:
+        if self._returns is None:
+            return None
+        # La primera rentabilidad es 0, así que el NAV empieza en 100
+        return _read_only(np.cumprod(1 + self._returns) * 100)
 
     def calculate_metrics(self, risk_free_rate: float = 0.0) -> dict:
-        """Calcula las métricas de la cartera usando el módulo de métricas."""
-        # Nos aseguramos de no incluir el primer NaN/0 en el cálculo de métricas
-        returns_for_metrics = self.daily_returns.dropna()
-        metrics = calcular_metricas_desde_rentabilidades(returns_for_metrics, risk_free_rate=risk_free_rate)
-        # El nombre ahora viene de fuera
-        # metrics["nombre"] = "💼 Mi Cartera"
-        return metrics
+        """Métricas de la cartera (una vez por tasa libre de riesgo). Vacío si no hay datos."""
+        if risk_free_rate not in self._metrics_cache:
+            returns = self.daily_returns
+            metrics = {} if returns is None else calcular_metricas_desde_rentabilidades(returns, risk_free_rate=risk_free_rate)
+            self._metrics_cache[risk_free_rate] = metrics
+        return dict(self._metrics_cache[risk_free_rate])
+
+    @property
+    def metrics(self) -> dict:
+        """Métricas con tasa libre de riesgo 0."""
+        return self.calculate_metrics(0.0)
+
+    @cached_property
+    def _contributions(self) -> pd.DataFrame:
+        if self._weighted_returns is None:
+            return pd.DataFrame(columns=["weight_%", "return_contribution_%", "risk_contribution_%"], dtype=float)
+        weighted = self._weighted_returns
+        # Rentabilidad: la media anualizada de la cartera es la suma de las de cada activo
+        return_contribution = weighted.mean(axis=0) * ANNUALIZATION_FACTOR * 100
+        # Riesgo: cov(activo ponderado, cartera) / var(cartera), suma 100%
+        centered = weighted - weighted.mean(axis=0)
+        portfolio_centered = centered.sum(axis=1)
+        portfolio_var = portfolio_centered @ portfolio_centered
+        with np.errstate(invalid='ignore', divide='ignore'):
+            risk_contribution = centered.T @ portfolio_centered / portfolio_var * 100
+        return pd.DataFrame({
+            "weight_%": self._weights * 100,
+            "return_contribution_%": return_contribution,
+            "risk_contribution_%": risk_contribution,
+        }, index=self._assets)
+
+    @property
+    def contributions(self) -> pd.DataFrame:
+        """
+        Por activo: peso (%), contribución a la rentabilidad anualizada (puntos
+        porcentuales, suman annualized_return_%) y a la varianza de la cartera
+        (%, suman 100).
+        """
+        return self._contributions.copy()
+
+    def simulate_cashflows(self, plans, names=None) -> CashflowResult | None:
+        """
+        Aportaciones y reintegros (lista de CashflowPlan de src/cashflows.py)
+        sobre las rentabilidades de la cartera, todos los planes a la vez.
+        None si no hay datos.
+        """
+        returns = self.daily_returns
+        return None if returns is None else run_cashflows(returns, plans, names)
+
+
+# --- Evaluación de muchas carteras a la vez ---
+
+# Carteras por bloque: acota los temporales (fechas x carteras) de cada pasada
+PORTFOLIO_BATCH_CHUNK = 512
+
+
+def _align_batch(returns, weights) -> tuple[np.ndarray, np.ndarray, pd.Index, pd.Index]:
+    """Rentabilidades (NaN como 0) y pesos normalizados (K x N) con las columnas alineadas."""
+    if isinstance(returns, pd.DataFrame):
+        assets, dates = returns.columns, returns.index
+        values = returns.to_numpy(dtype=np.float64)
+    else:
+        values = np.asarray(returns, dtype=np.float64)
+        assets, dates = pd.RangeIndex(values.shape[1]), pd.RangeIndex(values.shape[0])
+
+    if isinstance(weights, pd.DataFrame):
+        portfolios = weights.index
+        weights = weights.reindex(columns=assets, fill_value=0.0).to_numpy(dtype=np.float64)
+    else:
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        portfolios = pd.RangeIndex(weights.shape[0])
+    if weights.shape[1] != values.shape[1]:
+        raise ValueError(f"Hay {weights.shape[1]} pesos por cartera para {values.shape[1]} activos.")
+
+    # Como Portfolio: pesos normalizados a suma 1 y NaN como rentabilidad 0
+    totals = weights.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weights = np.where(totals != 0, weights / totals, np.nan)
+    return np.where(np.isnan(values), 0.0, values), weights, dates, portfolios
+
+
+def portfolio_returns_batch(returns, weights) -> pd.DataFrame:
+    """
+    Rentabilidades diarias (fechas x carteras) de las K carteras de `weights`
+    (K x N, o DataFrame con los activos como columnas) sobre la matriz
+    `returns` (fechas x N) en un único producto de matrices. Equivale a
+    Portfolio(navs, pesos).daily_returns para cada fila de pesos.
+    """
+    values, weights, dates, portfolios = _align_batch(returns, weights)
+    return pd.DataFrame(values @ weights.T, index=dates, columns=portfolios)
+
+
+def evaluate_weights_batch(returns, weights, risk_free_rate: float = 0.0,
+                           chunk_size: int = PORTFOLIO_BATCH_CHUNK) -> pd.DataFrame:
+    """
+    Métricas (carteras x METRIC_KEYS) de las K carteras de `weights`, las
+    mismas que Portfolio.calculate_metrics para cada una. Por cada bloque de
+    `chunk_size` carteras hace un producto de matrices y una pasada de
+    calcular_metricas_batch, así que la memoria no crece con K.
+    """
+    values, weights, _, portfolios = _align_batch(returns, weights)
+    chunk_size = max(1, chunk_size)
+    out = np.full((weights.shape[0], len(METRIC_KEYS)), np.nan)
+    for start in range(0, weights.shape[0], chunk_size):
+        block = weights[start:start + chunk_size]
+        out[start:start + len(block)] = calcular_metricas_batch(values @ block.T, risk_free_rate=risk_free_rate).to_numpy()
+    return pd.DataFrame(out, index=portfolios, columns=METRIC_KEYS)
@@ -0,0 +1,119 @@
+# src/price_ingestion.py
+"""
+Ingesta incremental de precios en historical_prices: solo se escriben las
+filas nuevas (posteriores a la marca de agua MAX(date) del ISIN) o revisadas
+dentro de una ventana reciente, cargadas con COPY en una tabla temporal y
+fusionadas con un único INSERT ... ON CONFLICT.
+"""
+
+import io
+import os
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+# Días antes de la marca de agua en los que se comprueban revisiones de NAV
+PRICE_REVISION_LOOKBACK_DAYS = int(os.getenv("PRICE_REVISION_LOOKBACK_DAYS", "10"))
+
+_CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS staging_prices (
+        isin TEXT NOT NULL,
+        date DATE NOT NULL,
+        nav DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+"""
+
+_MERGE_STAGING_SQL = """
+    INSERT INTO historical_prices (isin, date, nav)
+    SELECT isin, date, nav FROM staging_prices
+    ON CONFLICT (isin, date) DO UPDATE SET nav = EXCLUDED.nav
+    WHERE historical_prices.nav IS DISTINCT FROM EXCLUDED.nav
+"""
+
+
+def normalize_prices(prices_df: pd.DataFrame) -> pd.DataFrame:
+    """Columnas date (datetime64) y nav (float), una fila por fecha, ordenadas."""
+    df = pd.DataFrame({
+        'date': pd.to_datetime(prices_df['date']).dt.normalize(),
+        'nav': pd.to_numeric(prices_df['nav'], errors='coerce'),
+    })
+    return df.drop_duplicates(subset='date', keep='last').sort_values('date').reset_index(drop=True)
+
+
+def select_rows_to_write(prices_df: pd.DataFrame, watermark, stored: pd.DataFrame | None = None,
+                         lookback_days: int = PRICE_REVISION_LOOKBACK_DAYS) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Separa las filas descargadas en (nuevas, revisadas). Nuevas: fecha posterior
+    a `watermark`. Revisadas: dentro de la ventana de `lookback_days` previa a
+    la marca de agua, ausentes en `stored` (date, nav) o con un NAV distinto.
+    """
+    df = normalize_prices(prices_df)
+    if watermark is None:
+        return df, df.iloc[0:0]
+
+    watermark = pd.Timestamp(watermark)
+    new_rows = df[df['date'] > watermark]
+
+    window = df[(df['date'] > watermark - timedelta(days=lookback_days)) & (df['date'] <= watermark)]
+    if window.empty:
+        return new_rows, window
+
+    stored = stored if stored is not None else pd.DataFrame({'date': [], 'nav': []})
+    stored_navs = pd.Series(
+        pd.to_numeric(stored['nav'], errors='coerce').to_numpy(dtype=float),
+        index=pd.to_datetime(stored['date']).dt.normalize(),
+    )
+    previous = stored_navs.reindex(window['date']).to_numpy()
+    current = window['nav'].to_numpy(dtype=float)
+    both_nan = np.isnan(previous) & np.isnan(current)
+    changed = ~both_nan & ~np.isclose(previous, current, rtol=0, atol=1e-9)
+    return new_rows, window[changed]
+
+
+def ingest_prices(conn, isin: str, prices_df: pd.DataFrame) -> dict:
+    """
+    Escribe en historical_prices solo las filas nuevas o revisadas de `isin`.
+    No hace commit: la transacción es del llamador. Devuelve estadísticas
+    (recibidas, nuevas, revisadas, escritas y segundos empleados).
+    """
+    start_time = time.perf_counter()
+    stats = {'isin': isin, 'received': 0, 'new': 0, 'revised': 0, 'written': 0, 'seconds': 0.0}
+    if prices_df is None or prices_df.empty:
+        return stats
+    stats['received'] = len(prices_df)
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT MAX(date) FROM historical_prices WHERE isin = %s", (isin,))
+        watermark = cursor.fetchone()[0]
+
+        stored = None
+        if watermark is not None:
+            cursor.execute(
+                "SELECT date, nav FROM historical_prices WHERE isin = %s AND date > %s",
+                (isin, watermark - timedelta(days=PRICE_REVISION_LOOKBACK_DAYS)),
+            )
+            stored = pd.DataFrame(cursor.fetchall(), columns=['date', 'nav'])
+
+        new_rows, revised_rows = select_rows_to_write(prices_df, watermark, stored)
+        stats['new'], stats['revised'] = len(new_rows), len(revised_rows)
+
+        to_write = pd.concat([revised_rows, new_rows])
+        if not to_write.empty:
+            buffer = io.StringIO()
+            pd.DataFrame({
+                'isin': isin,
+                'date': to_write['date'].dt.strftime('%Y-%m-%d'),
+                'nav': to_write['nav'],
+            }).to_csv(buffer, index=False, header=False, na_rep='')
+            buffer.seek(0)
+
+            cursor.execute(_CREATE_STAGING_SQL)
+            cursor.execute("TRUNCATE staging_prices")
+            cursor.copy_expert("COPY staging_prices (isin, date, nav) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(_MERGE_STAGING_SQL)
+            stats['written'] = cursor.rowcount
+
+    stats['seconds'] = time.perf_counter() - start_time
+    return stats
@@ -0,0 +1,196 @@
+# src/price_reader.py
+"""
+Lectura masiva de historical_prices mediante COPY ... TO STDOUT en formato
+binario de PostgreSQL, decodificado directamente a arrays de NumPy sin crear
+un objeto Python por fila. encode_copy_binary hace lo inverso para
+escribir precios con COPY ... FROM STDIN.
+"""
+
+import io
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# Días entre 1970-01-01 (época Unix) y 2000-01-01 (época de PostgreSQL)
+PG_EPOCH_OFFSET_DAYS = 10957
+_UNIX_EPOCH = date(1970, 1, 1)
+
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+_COPY_TRAILER = b"\xff\xff"
+
+# Cada fila: nº de campos (int16) y, por campo, longitud (int32) + valor.
+# Todos los campos son de ancho fijo, así que el buffer es un array de registros.
+_ROW_DTYPE = np.dtype([
+    ('n_fields', '>i2'),
+    ('code_len', '>i4'), ('code', '>i4'),
+    ('date_len', '>i4'), ('date', '>i4'),
+    ('nav_len', '>i4'), ('nav', '>f8'),
+])
+
+_COPY_PRICES_SQL = """
+    COPY (
+        SELECT (k.code - 1)::int4, p.date, COALESCE(p.nav::float8, 'NaN'::float8)
+        FROM historical_prices p
+        JOIN unnest(%(isins)s::text[], %(watermarks)s::date[]) WITH ORDINALITY AS k(isin, watermark, code)
+          ON p.isin = k.isin AND (k.watermark IS NULL OR p.date > k.watermark)
+        WHERE %(start_date)s::date IS NULL OR p.date >= %(start_date)s::date
+        ORDER BY k.code, p.date
+    ) TO STDOUT (FORMAT binary)
+"""
+
+# Última fecha por ISIN (hasta `until` si se indica); con el índice (isin,
+# date) cada subconsulta es una sola lectura del índice en lugar de recorrer
+# el histórico.
+_LATEST_DATES_SQL = """
+    SELECT k.isin, (
+        SELECT MAX(p.date) FROM historical_prices p
+        WHERE p.isin = k.isin AND (%(until)s::date IS NULL OR p.date <= %(until)s::date)
+    )
+    FROM unnest(%(isins)s::text[]) AS k(isin)
+"""
+
+
+class PriceArrays(NamedTuple):
+    """
+    Precios en columnas: `codes` indexa `isins` (categórico, ISINs ordenados),
+    `dates` son días desde 1970-01-01 (int32) y `navs` float64. Filas
+    ordenadas por ISIN y fecha.
+    """
+    isins: np.ndarray
+    codes: np.ndarray
+    dates: np.ndarray
+    navs: np.ndarray
+
+    def __len__(self):
+        return len(self.navs)
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame (date, isin, nav) equivalente al de pd.read_sql."""
+        return pd.DataFrame({
+            'date': self.dates.astype('datetime64[D]').astype('datetime64[s]'),
+            'isin': pd.Categorical.from_codes(self.codes, categories=self.isins),
+            'nav': self.navs,
+        })
+
+    def fund_slices(self):
+        """Itera (isin, fechas, navs) por fondo aprovechando que vienen ordenados."""
+        if len(self.codes) == 0:
+            return
+        bounds = np.flatnonzero(np.diff(self.codes)) + 1
+        starts = np.concatenate(([0], bounds))
+        ends = np.concatenate((bounds, [len(self.codes)]))
+        for start, end in zip(starts, ends):
+            yield self.isins[self.codes[start]], self.dates[start:end], self.navs[start:end]
+
+
+def decode_copy_binary(payload) -> np.ndarray:
+    """
+    Decodifica la salida de COPY (FORMAT binary) de la consulta de precios
+    a un array estructurado de NumPy (vista sin copia sobre `payload`).
+    """
+    view = memoryview(payload)
+    if bytes(view[:len(_COPY_SIGNATURE)]) != _COPY_SIGNATURE:
+        raise ValueError("La salida de COPY no tiene la cabecera binaria esperada.")
+    ext_len = int.from_bytes(view[15:19], 'big')
+    offset = 19 + ext_len
+    if bytes(view[-2:]) != _COPY_TRAILER:
+        raise ValueError("La salida de COPY está truncada (falta el trailer).")
+
+    body_len = len(view) - offset - len(_COPY_TRAILER)
+    if body_len % _ROW_DTYPE.itemsize:
+        raise ValueError("Tamaño de fila inesperado en la salida de COPY.")
+
+    rows = np.frombuffer(view, dtype=_ROW_DTYPE, count=body_len // _ROW_DTYPE.itemsize, offset=offset)
+    if rows.size and not (
+        np.all(rows['n_fields'] == 3)
+        and np.all(rows['code_len'] == 4)
+        and np.all(rows['date_len'] == 4)
+        and np.all(rows['nav_len'] == 8)
+    ):
+        raise ValueError("La salida de COPY contiene campos nulos o de tipo inesperado.")
+    return rows
+
+
+def _encode_fund_rows(isin: str, dates: np.ndarray, navs: np.ndarray) -> bytes:
+    """Filas binarias (isin, date, nav) de un fondo, sin cabecera ni trailer."""
+    isin_bytes = isin.encode()
+    row_dtype = np.dtype([
+        ('n_fields', '>i2'),
+        ('isin_len', '>i4'), ('isin', f'S{len(isin_bytes)}'),
+        ('date_len', '>i4'), ('date', '>i4'),
+        ('nav_len', '>i4'), ('nav', '>f8'),
+    ])
+    rows = np.empty(len(dates), dtype=row_dtype)
+    rows['n_fields'] = 3
+    rows['isin_len'] = len(isin_bytes)
+    rows['isin'] = isin_bytes
+    rows['date_len'] = 4
+    rows['date'] = np.asarray(dates, dtype=np.int64) - PG_EPOCH_OFFSET_DAYS
+    rows['nav_len'] = 8
+    rows['nav'] = navs
+    return rows.tobytes()
+
+
+def encode_copy_binary(funds) -> bytes:
+    """
+    Codifica (isin, fechas en días desde 1970-01-01, navs) de cada fondo de
+    `funds` como entrada de COPY historical_prices (isin, date, nav) FROM
+    STDIN (FORMAT binary). Es la operación inversa de decode_copy_binary.
+    """
+    header = _COPY_SIGNATURE + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+    body = b"".join(_encode_fund_rows(isin, dates, navs) for isin, dates, navs in funds)
+    return header + body + _COPY_TRAILER
+
+
+def days_to_date(days: int) -> date:
+    """Convierte días desde 1970-01-01 a datetime.date."""
+    return _UNIX_EPOCH + timedelta(days=int(days))
+
+
+def date_to_days(value) -> int:
+    """Convierte una fecha (date, datetime o Timestamp) a días desde 1970-01-01."""
+    return (pd.Timestamp(value).date() - _UNIX_EPOCH).days
+
+
+def read_prices(conn, isins, watermarks: dict | None = None, start_date: date | None = None) -> PriceArrays:
+    """
+    Lee los precios de `isins` con un único COPY binario. Sustituye a
+    pd.read_sql sobre historical_prices.
+    `watermarks` (isin -> datetime.date) limita cada ISIN a las filas con
+    fecha estrictamente posterior a su marca (sincronización incremental).
+    `start_date` descarta en el servidor todas las filas anteriores a esa fecha.
+    """
+    isins = np.asarray(sorted(set(isins)), dtype=object)
+    watermarks = watermarks or {}
+    if len(isins) == 0:
+        empty = np.array([], dtype=np.int32)
+        return PriceArrays(isins, empty, empty.copy(), np.array([], dtype=np.float64))
+
+    buffer = io.BytesIO()
+    with conn.cursor() as cursor:
+        query = cursor.mogrify(_COPY_PRICES_SQL, {
+            'isins': list(isins),
+            'watermarks': [watermarks.get(isin) for isin in isins],
+            'start_date': start_date,
+        })
+        cursor.copy_expert(query.decode(), buffer)
+
+    rows = decode_copy_binary(buffer.getbuffer())
+    return PriceArrays(
+        isins=isins,
+        codes=rows['code'].astype(np.int32),
+        dates=(rows['date'] + PG_EPOCH_OFFSET_DAYS).astype(np.int32),
+        navs=rows['nav'].astype(np.float64),
+    )
+
+
+def read_latest_dates(conn, isins, until: date | None = None) -> dict:
+    """Última fecha con precio (datetime.date o None) de cada ISIN, en `until` o antes si se indica."""
+    isins = sorted(set(isins))
+    if not isins:
+        return {}
+    with conn.cursor() as cursor:
+        cursor.execute(_LATEST_DATES_SQL, {'isins': isins, 'until': until})
+        return dict(cursor.fetchall())
@@ -0,0 +1,186 @@
+# src/rolling_metrics.py
+"""
+Métricas móviles (rolling) vectorizadas sobre todas las columnas de una
+matriz de rentabilidades diarias, con coste O(n) por serie sea cual sea la
+longitud de la ventana:
+
+  - Volatilidad, Sharpe, Sortino y beta salen de sumas acumuladas: la suma de
+    cualquier ventana es la diferencia de dos sumas acumuladas.
+  - El máximo de la ventana (para la caída desde el máximo) usa el algoritmo
+    de van Herk / Gil-Werman: máximos acumulados hacia delante y hacia atrás
+    en bloques del tamaño de la ventana. Es el equivalente vectorizado de la
+    cola monótona, sin un bucle de Python por fila.
+
+Igual que pandas con min_periods=window, una ventana con algún NaN da NaN.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.metrics import ANNUALIZATION_FACTOR
+
+ROLLING_WINDOW_DEFAULT = 63
+
+
+def _as_matrix(returns: pd.DataFrame) -> np.ndarray:
+    return returns.to_numpy(dtype=np.float64, copy=True)
+
+
+def _window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Suma móvil de `window` filas por columna (filas sin ventana completa: NaN)."""
+    n_rows = values.shape[0]
+    out = np.full(values.shape, np.nan)
+    if n_rows < window:
+        return out
+    prefix = np.zeros((n_rows + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=prefix[1:])
+    out[window - 1:] = prefix[window:] - prefix[:n_rows - window + 1]
+    return out
+
+
+def _window_moments(values: np.ndarray, window: int):
+    """
+    (nº de valores válidos, media, varianza muestral) de cada ventana. Se
+    resta la media de cada columna antes de acumular para no perder precisión
+    al restar sumas grandes.
+    """
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        shift = np.nanmean(np.where(valid, values, np.nan), axis=0) if values.size else 0.0
+    shift = np.nan_to_num(shift)
+    centered = np.where(valid, values - shift, 0.0)
+    count = _window_sums(valid.astype(np.float64), window)
+    total = _window_sums(centered, window)
+    total_sq = _window_sums(centered ** 2, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        var = np.maximum(total_sq - count * mean ** 2, 0.0) / (count - 1)
+    return count, mean + shift, var
+
+
+def _full_windows(count: np.ndarray, window: int) -> np.ndarray:
+    return count == window
+
+
+def _rolling_max(values: np.ndarray, window: int) -> np.ndarray:
+    """Máximo móvil por columnas (van Herk / Gil-Werman): unas 3 comparaciones por elemento."""
+    n_rows, n_cols = values.shape
+    out = np.full(values.shape, np.nan)
+    if n_rows < window:
+        return out
+    n_blocks = -(-n_rows // window)
+    padded = np.full((n_blocks * window, n_cols), -np.inf)
+    padded[:n_rows] = values
+    blocks = padded.reshape(n_blocks, window, n_cols)
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(-1, n_cols)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(-1, n_cols)
+    # La ventana que termina en t empieza en s = t - window + 1: o están en el
+    # mismo bloque o en dos consecutivos, y el máximo es max(suffix[s], prefix[t])
+    out[window - 1:] = np.maximum(suffix[:n_rows - window + 1], prefix[window - 1:n_rows])
+    return out
+
+
+def _to_frame(values: np.ndarray, like: pd.DataFrame) -> pd.DataFrame:
+    return pd.DataFrame(values, index=like.index, columns=like.columns)
+
+
+def rolling_volatility(returns: pd.DataFrame, window: int = ROLLING_WINDOW_DEFAULT) -> pd.DataFrame:
+    """Volatilidad anualizada (%) de cada ventana de `window` días."""
+    count, _, var = _window_moments(_as_matrix(returns), window)
+    vol = np.sqrt(var) * np.sqrt(ANNUALIZATION_FACTOR) * 100
+    return _to_frame(np.where(_full_windows(count, window), vol, np.nan), returns)
+
+
+def rolling_sharpe(returns: pd.DataFrame, window: int = ROLLING_WINDOW_DEFAULT,
+                   risk_free_rate: float = 0.0) -> pd.DataFrame:
+    """Ratio de Sharpe anualizado de cada ventana (NaN si la volatilidad es 0)."""
+    count, mean, var = _window_moments(_as_matrix(returns), window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vol_ann = np.sqrt(var) * np.sqrt(ANNUALIZATION_FACTOR)
+        sharpe = (mean * ANNUALIZATION_FACTOR - risk_free_rate) / vol_ann
+    sharpe[~(vol_ann > 0)] = np.nan
+    return _to_frame(np.where(_full_windows(count, window), sharpe, np.nan), returns)
+
+
+def rolling_sortino(returns: pd.DataFrame, window: int = ROLLING_WINDOW_DEFAULT,
+                    risk_free_rate: float = 0.0) -> pd.DataFrame:
+    """
+    Ratio de Sortino anualizado de cada ventana, con la misma desviación a la
+    baja que calcular_metricas_desde_rentabilidades (desviación típica de las
+    rentabilidades en exceso negativas). Con menos de dos días negativos en
+    la ventana devuelve NaN en lugar de 1e9, para poder dibujarlo.
+    """
+    values = _as_matrix(returns)
+    valid = ~np.isnan(values)
+    count = _window_sums(valid.astype(np.float64), window)
+    mean = _window_sums(np.where(valid, values, 0.0), window) / window
+
+    excess = values - risk_free_rate / ANNUALIZATION_FACTOR
+    with np.errstate(invalid='ignore'):
+        negative = valid & (excess < 0)
+    negative_excess = np.where(negative, excess, 0.0)
+    n_negative = _window_sums(negative.astype(np.float64), window)
+    neg_sum = _window_sums(negative_excess, window)
+    neg_sq = _window_sums(negative_excess ** 2, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        neg_mean = neg_sum / n_negative
+        downside = np.sqrt(np.maximum(neg_sq - n_negative * neg_mean ** 2, 0.0) / (n_negative - 1))
+        downside *= np.sqrt(ANNUALIZATION_FACTOR)
+        sortino = (mean * ANNUALIZATION_FACTOR - risk_free_rate) / downside
+    sortino[~((n_negative > 1) & (downside > 0))] = np.nan
+    return _to_frame(np.where(_full_windows(count, window), sortino, np.nan), returns)
+
+
+def rolling_drawdown(returns: pd.DataFrame, window: int = ROLLING_WINDOW_DEFAULT) -> pd.DataFrame:
+    """
+    Caída (%) del NAV de cada día respecto al máximo de los últimos `window`
+    días (NAV reconstruido con las rentabilidades, los NaN no mueven el NAV).
+    """
+    values = _as_matrix(returns)
+    valid = ~np.isnan(values)
+    nav = np.cumprod(np.where(valid, 1 + values, 1.0), axis=0)
+    with np.errstate(invalid='ignore'):
+        drawdown = (nav / _rolling_max(nav, window) - 1) * 100
+    count = _window_sums(valid.astype(np.float64), window)
+    return _to_frame(np.where(_full_windows(count, window), drawdown, np.nan), returns)
+
+
+def rolling_beta(returns: pd.DataFrame, benchmark: pd.Series,
+                 window: int = ROLLING_WINDOW_DEFAULT) -> pd.DataFrame:
+    """Beta de cada columna frente a `benchmark` (p. ej. la cartera) en cada ventana."""
+    values = _as_matrix(returns)
+    bench = benchmark.reindex(returns.index).to_numpy(dtype=np.float64)[:, None]
+    valid = ~np.isnan(values) & ~np.isnan(bench)
+
+    # Se centran ambas series para que cov y var no pierdan precisión
+    with np.errstate(invalid='ignore'):
+        x = np.where(valid, values - np.nan_to_num(np.nanmean(np.where(valid, values, np.nan), axis=0)), 0.0)
+        y = np.where(valid, bench - np.nan_to_num(np.nanmean(bench)), 0.0)
+    count = _window_sums(valid.astype(np.float64), window)
+    sum_x = _window_sums(x, window)
+    sum_y = _window_sums(y, window)
+    sum_xy = _window_sums(x * y, window)
+    sum_yy = _window_sums(y * y, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sum_xy - sum_x * sum_y / count
+        var = sum_yy - sum_y ** 2 / count
+        beta = cov / var
+    beta[~(var > 0)] = np.nan
+    return _to_frame(np.where(_full_windows(count, window), beta, np.nan), returns)
+
+
+def calcular_metricas_rolling(returns: pd.DataFrame, window: int = ROLLING_WINDOW_DEFAULT,
+                              benchmark: pd.Series | None = None, risk_free_rate: float = 0.0) -> dict:
+    """
+    Todas las métricas móviles de `returns` (fechas x series). Con
+    `benchmark` incluye también la beta de cada serie frente a él.
+    """
+    metrics = {
+        "volatility_ann_%": rolling_volatility(returns, window),
+        "sharpe_ann": rolling_sharpe(returns, window, risk_free_rate),
+        "sortino_ann": rolling_sortino(returns, window, risk_free_rate),
+        "drawdown_%": rolling_drawdown(returns, window),
+    }
+    if benchmark is not None:
+        metrics["beta"] = rolling_beta(returns, benchmark, window)
+    return metrics
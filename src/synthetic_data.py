@@ -0,0 +1,116 @@
+# src/synthetic_data.py
+"""
+Catálogos y NAVs sintéticos, deterministas (con semilla), para benchmarks y
+pruebas de carga sin red ni base de datos. Las historias imitan las reales:
+  - fechas de inicio escalonadas (una parte del catálogo con todo el
+    histórico, el resto empezando más tarde) y algunos fondos liquidados,
+  - calendario hábil con festivos comunes, días sueltos sin precio y algún
+    hueco de varias semanas por fondo,
+  - rentabilidades con deriva y volatilidad propias de cada fondo (de
+    monetarios a renta variable) y colas gruesas (t de Student).
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.price_reader import PriceArrays
+
+SYNTHETIC_END_DATE = "2025-06-30"
+SYNTHETIC_ISIN_PREFIX = "SY"
+
+_GESTORAS = ["Amundi", "BlackRock", "Vanguard", "Fidelity", "Pictet", "Robeco", "DWS", "Nordea", "Bestinver", "Cobas"]
+_CATEGORIAS = [
+    "RV Global Cap. Grande Blend", "RV Europa Cap. Grande Value", "RV USA Cap. Grande Growth",
+    "RF Diversificada EUR", "RF Corto Plazo EUR", "Mixtos Moderados EUR", "Monetarios EUR",
+]
+_DOMICILIOS = ["Luxemburgo", "Irlanda", "España", "Francia"]
+
+
+def synthetic_isin(code: int) -> str:
+    """ISIN sintético de 12 caracteres (prefijo SY para no confundirlo con uno real)."""
+    return f"{SYNTHETIC_ISIN_PREFIX}{code:010d}"
+
+
+def synthetic_isins(n_funds: int) -> np.ndarray:
+    """ISINs sintéticos ordenados de los códigos 0 .. n_funds - 1."""
+    return np.array([synthetic_isin(i) for i in range(n_funds)], dtype=object)
+
+
+def synthetic_calendar(years: int, seed: int = 42, end: str = SYNTHETIC_END_DATE) -> np.ndarray:
+    """Días hábiles (días desde 1970-01-01, int32) de `years` años sin ~8 festivos comunes al año."""
+    rng = np.random.default_rng(seed)
+    calendar = pd.bdate_range(end=end, periods=years * 261).values.astype('datetime64[D]').astype(np.int32)
+    holidays = rng.random(len(calendar)) < 8 / 261
+    return calendar[~holidays]
+
+
+def synthetic_fund_histories(n_funds: int, years: int = 10, seed: int = 42, end: str = SYNTHETIC_END_DATE,
+                             gap_rate: float = 0.01, delisted_rate: float = 0.05, first_code: int = 0):
+    """
+    Genera (código, fechas en días desde 1970-01-01 int32, navs) de los
+    fondos `first_code` .. `first_code + n_funds - 1`. Cada fondo tiene su
+    propio generador aleatorio (semilla, código), así que un fondo sale igual
+    se genere solo, por bloques o con el catálogo completo.
+    `gap_rate` es la probabilidad de que falte el precio de un día suelto y
+    `delisted_rate` la proporción de fondos que dejan de cotizar.
+    """
+    calendar = synthetic_calendar(years, seed=seed, end=end)
+    n_days = len(calendar)
+
+    for code in range(first_code, first_code + n_funds):
+        rng = np.random.default_rng([seed, code])
+        start = 0 if rng.random() < 0.3 else int(rng.integers(0, int(n_days * 0.9)))
+        stop = n_days
+        if rng.random() < delisted_rate and n_days - start > 40:
+            stop = int(rng.integers(start + 20, n_days))
+
+        keep = rng.random(stop - start) >= gap_rate
+        if rng.random() < 0.1:
+            gap_start = int(rng.integers(0, len(keep)))
+            keep[gap_start:gap_start + int(rng.integers(5, 20))] = False
+        keep[0] = True
+        fund_dates = calendar[start:stop][keep]
+
+        drift = rng.normal(0.0003, 0.0002)
+        volatility = rng.uniform(0.001, 0.02)
+        # t de Student con 4 grados de libertad: varianza 2, de ahí el sqrt(2)
+        returns = drift + rng.standard_t(4, len(fund_dates)) * volatility / np.sqrt(2)
+        np.clip(returns, -0.5, 0.5, out=returns)
+        returns[0] = 0.0
+
+        yield code, fund_dates, rng.uniform(5, 500) * np.cumprod(1 + returns)
+
+
+def synthetic_price_arrays(n_funds: int, years: int = 10, seed: int = 42, end: str = SYNTHETIC_END_DATE,
+                           gap_rate: float = 0.01, delisted_rate: float = 0.05) -> PriceArrays:
+    """Precios de `n_funds` fondos sintéticos en el formato de read_prices (ordenados por ISIN y fecha)."""
+    codes, dates, navs = [], [], []
+    for code, fund_dates, fund_navs in synthetic_fund_histories(n_funds, years, seed, end, gap_rate, delisted_rate):
+        codes.append(np.full(len(fund_dates), code, dtype=np.int32))
+        dates.append(fund_dates)
+        navs.append(fund_navs)
+
+    if not codes:
+        empty = np.array([], dtype=np.int32)
+        return PriceArrays(synthetic_isins(0), empty, empty.copy(), np.array([], dtype=np.float64))
+    return PriceArrays(synthetic_isins(n_funds), np.concatenate(codes), np.concatenate(dates), np.concatenate(navs))
+
+
+def synthetic_catalog(n_funds: int, seed: int = 42) -> pd.DataFrame:
+    """Catálogo con las columnas de la tabla funds para los ISINs de synthetic_isins."""
+    rng = np.random.default_rng(seed)
+    isins = synthetic_isins(n_funds)
+    gestoras = rng.choice(_GESTORAS, n_funds)
+    categorias = rng.choice(_CATEGORIAS, n_funds)
+    return pd.DataFrame({
+        'isin': isins,
+        'performance_id': [f"0P{i:08d}" for i in range(n_funds)],
+        'security_id': [f"F{i:09d}" for i in range(n_funds)],
+        'name': [f"{gestora} {categoria} {i}" for i, (gestora, categoria) in enumerate(zip(gestoras, categorias))],
+        'ter': np.round(rng.uniform(0.05, 2.2, n_funds), 2),
+        'morningstar_category': categorias,
+        'gestora': gestoras,
+        'domicilio': rng.choice(_DOMICILIOS, n_funds),
+        'srri': rng.integers(1, 8, n_funds),
+        'currency': rng.choice(["EUR", "USD"], n_funds, p=[0.85, 0.15]),
+    })
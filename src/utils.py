@@ -1,16 +1,21 @@
 # src/utils.py
 
+from functools import partial
 import streamlit as st
 import pandas as pd
-from src.db_connector import get_db_connection
+from src.db_connector import db_connection
+from src.navs import align_navs
+from src.nav_cache import get_nav_cache
+from src.compact_navs import build_compact_navs, slice_horizon
+from src.metrics_service import load_fresh_metrics
 
 @st.cache_data
-def load_single_fund_nav_cached(_data_manager, isin: str):
+def load_single_fund_nav_cached(_data_manager, isin: str, horizonte: str | None = None):
     """
     Obtiene el NAV de un único fondo desde el CSV y cachea el resultado.
     Ya no tiene el parámetro 'force_update'.
     """
-    return _data_manager.get_fund_nav(isin)
+    return _data_manager.get_fund_nav(isin, horizonte=horizonte)
 
 @st.cache_data
 def load_funds_from_db():
@@ -18,65 +23,69 @@ def load_funds_from_db():
     Carga el catálogo completo de fondos desde la base de datos PostgreSQL.
     Esta es ahora la única fuente de verdad para el catálogo.
     """
-    conn = get_db_connection()
-    if conn:
-        try:
-            df = pd.read_sql("SELECT * FROM funds", conn)
-            return df
-        finally:
-            conn.close()
+    with db_connection() as conn:
+        if conn:
+            return pd.read_sql("SELECT * FROM funds", conn)
     return pd.DataFrame()
 
-@st.cache_data
-def load_all_navs(_data_manager, isines: tuple):
+@st.cache_data(ttl=300)
+def load_fresh_fund_metrics(isines: tuple, horizonte: str):
+    """
+    Métricas precalculadas y al día de fund_metrics para los fondos y el
+    horizonte dados (ver src.metrics_service). Se cachean 5 minutos para no
+    consultar la tabla en cada rerun.
+    """
+    return load_fresh_metrics(isines, horizonte)
+
+def load_all_navs(_data_manager, isines: tuple, horizonte: str | None = None):
     """
-    Orquesta la carga de datos para un conjunto de ISINs LEYENDO DIRECTAMENTE
-    DESDE POSTGRESQL y aplicando un remuestreo diario individualizado para 
+    Orquesta la carga de datos para un conjunto de ISINs y los alinea en una
+    matriz diaria (ver align_navs): cada fondo empieza en su propia fecha para
     evitar contaminación de datos.
+    Los precios salen de la caché LRU por ISIN del proceso (compartida entre
+    sesiones y carteras que se solapan); solo los ISIN que faltan se piden a
+    la caché local del DataManager, sincronizada con PostgreSQL.
+    Con `horizonte` solo se leen las fechas de ese periodo (desde el último
+    precio previo de cada fondo), de modo que el resultado sigue siendo válido para
+    filtrar_por_horizonte con el mismo horizonte.
+    La matriz alineada no se cachea: se monta en cada llamada desde la caché
+    por ISIN, para no guardar una copia de los datos por cada conjunto de fondos.
     """
     if not isines:
         return pd.DataFrame()
 
-    conn = get_db_connection()
-    if not conn:
-        st.error("No se pudo conectar a la base de datos de precios.")
-        return pd.DataFrame()
-        
     try:
-        query = "SELECT date, isin, nav FROM historical_prices WHERE isin IN %s"
-        df = pd.read_sql(query, conn, params=(isines,))
+        start_date = _data_manager.horizon_start_date(isines, horizonte)
+        loader = partial(_data_manager.load_prices, start_date=start_date)
+        prices = get_nav_cache().get_many(isines, loader, start_date=start_date)
+
+        # Matriz fechas x ISIN con calendario diario común y forward-fill
+        # desde el inicio de cada fondo (sin bucle por ISIN)
+        return align_navs(prices.to_frame())
         
-        if df.empty:
-            return pd.DataFrame()
+    except Exception as e:
+        st.error(f"Error al procesar los precios desde la base de datos: {e}")
+        return pd.DataFrame()
 
-        df['date'] = pd.to_datetime(df['date'])
 
-        # Encontrar la fecha máxima global para alinear todos los fondos
-        max_date = df['date'].max()
+def load_compact_navs(_data_manager, isines: tuple, horizonte: str | None = None):
+    """
+    Como load_all_navs + filtrar_por_horizonte, pero devuelve la matriz
+    compacta (float32, días hábiles) de src.compact_navs para cargas de todo
+    el catálogo. None si no hay precios.
+    """
+    if not isines:
+        return None
 
-        all_navs_resampled = []
-        for isin, group in df.groupby('isin'):
-            fund_navs = group.set_index('date')[['nav']]
-            
-            # Usar la fecha máxima global para el índice de cada fondo
-            daily_index = pd.date_range(start=fund_navs.index.min(), end=max_date, freq='D')
-            
-            resampled = fund_navs.reindex(daily_index).ffill()
-            resampled.rename(columns={'nav': isin}, inplace=True)
-            all_navs_resampled.append(resampled)
+    try:
+        start_date = _data_manager.horizon_start_date(isines, horizonte)
+        loader = partial(_data_manager.load_prices, start_date=start_date)
+        prices = get_nav_cache().get_many(isines, loader, start_date=start_date)
+        if len(prices) == 0:
+            return None
+        matrix = build_compact_navs(prices)
+        return slice_horizon(matrix, horizonte) if horizonte else matrix
 
-        if not all_navs_resampled:
-            return pd.DataFrame()
-            
-        final_df = pd.concat(all_navs_resampled, axis=1)
-        final_df.index.name = 'date'
-        
-        # Un último ffill para alinear los puntos de inicio si algún fondo empieza antes que otro
-        return final_df.ffill()
-        
     except Exception as e:
         st.error(f"Error al procesar los precios desde la base de datos: {e}")
-        return pd.DataFrame()
-    finally:
-        if conn:
-            conn.close()
\ No newline at end of file
+        return None
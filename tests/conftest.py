@@ -0,0 +1,43 @@
+# tests/conftest.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def rentabilidades_sinteticas():
+    """
+    Fábrica de rentabilidades diarias normales con semilla (fechas x
+    columnas). Por defecto en días hábiles y con la primera fila NaN, como
+    las de un pct_change.
+    """
+    def fabrica(n_dias, columnas, seed, inicio="2015-01-01", calendario="B",
+                media=0.0003, volatilidad=0.01, primera_fila_nan=True):
+        rng = np.random.default_rng(seed)
+        fechas = pd.date_range(inicio, periods=n_dias, freq=calendario)
+        columnas = list(columnas)
+        rentabilidades = pd.DataFrame(rng.normal(media, volatilidad, (n_dias, len(columnas))),
+                                      index=fechas, columns=columnas)
+        if primera_fila_nan:
+            rentabilidades.iloc[0] = np.nan
+        return rentabilidades
+    return fabrica
+
+
+@pytest.fixture
+def simulacion_dia_a_dia():
+    """
+    Referencia con un bucle por día para las simulaciones vectorizadas:
+    `valores` crece cada día con su rentabilidad (NaN = 0) y
+    `al_cierre(t, valores)` devuelve los valores tras los movimientos de ese
+    día (rebalanceos, aportaciones...), también el día 0, que no tiene
+    rentabilidad. Devuelve los valores al cierre de cada día.
+    """
+    def simular(rentabilidades, valores, al_cierre):
+        r = rentabilidades.fillna(0).to_numpy()
+        cierres = [al_cierre(0, valores)]
+        for t in range(1, len(r)):
+            cierres.append(al_cierre(t, cierres[-1] * (1 + r[t])))
+        return cierres
+    return simular
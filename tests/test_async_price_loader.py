@@ -0,0 +1,39 @@
+# tests/test_async_price_loader.py
+
+import asyncio
+import numpy as np
+import src.async_price_loader as async_price_loader
+from src.price_reader import PriceArrays
+
+
+def test_bloques_concurrentes_equivalen_a_una_consulta(monkeypatch):
+    """
+    Leer por bloques en paralelo debe dar los mismos arrays que una sola
+    consulta: ISINs ordenados y códigos reindexados al unir los bloques.
+    """
+    n_dias = 5
+    en_vuelo, max_en_vuelo = [0], [0]
+
+    def leer_bloque_falso(isins, watermarks, start_date):
+        en_vuelo[0] += 1
+        max_en_vuelo[0] = max(max_en_vuelo[0], en_vuelo[0])
+        try:
+            isins = np.asarray(sorted(isins), dtype=object)
+            codes = np.repeat(np.arange(len(isins), dtype=np.int32), n_dias)
+            dates = np.tile(np.arange(20000, 20000 + n_dias, dtype=np.int32), len(isins))
+            navs = np.array([int(isin[1:]) + d / 10 for isin in isins for d in range(n_dias)])
+            return PriceArrays(isins, codes, dates, navs)
+        finally:
+            en_vuelo[0] -= 1
+
+    monkeypatch.setattr(async_price_loader, '_read_chunk', leer_bloque_falso)
+    isins = [f"F{i:03d}" for i in range(23)][::-1]
+
+    precios = asyncio.run(async_price_loader.read_prices_async(isins, chunk_size=5, concurrency=3))
+    completo = leer_bloque_falso(isins, {}, None)
+
+    assert list(precios.isins) == sorted(isins)
+    np.testing.assert_array_equal(precios.codes, completo.codes)
+    np.testing.assert_array_equal(precios.dates, completo.dates)
+    np.testing.assert_array_equal(precios.navs, completo.navs)
+    assert max_en_vuelo[0] <= 3
@@ -0,0 +1,82 @@
+# tests/test_backtest.py
+
+import numpy as np
+import pytest
+from src.backtest import run_backtest, DEFAULT_REBALANCE_BAND
+from src.portfolio import Portfolio
+
+
+@pytest.fixture
+def rentabilidades(rentabilidades_sinteticas):
+    return rentabilidades_sinteticas(600, ['RV', 'RV_EM', 'RF'], seed=23, inicio='2022-01-03',
+                                     media=0.0004, volatilidad=np.array([0.012, 0.024, 0.0036]))
+
+
+def _backtest_dia_a_dia(simular, rentabilidades, objetivo, politica, banda=DEFAULT_REBALANCE_BAND):
+    """Valores por activo día a día con rebalanceo al cierre (ver simulacion_dia_a_dia)."""
+    fechas = rentabilidades.index
+    rebalanceos = []
+
+    def al_cierre(t, valores):
+        if t in (0, len(fechas) - 1):
+            return valores
+        pesos = valores / valores.sum()
+        if politica == "monthly":
+            toca = fechas[t].month != fechas[t + 1].month
+        elif politica == "threshold":
+            toca = np.any(np.abs(pesos - objetivo) > banda)
+        else:
+            toca = False
+        if not toca:
+            return valores
+        rebalanceos.append(fechas[t])
+        return objetivo * valores.sum()
+
+    valores = simular(rentabilidades, objetivo.copy(), al_cierre)
+    return np.array([v.sum() for v in valores]) * 100, rebalanceos
+
+
+@pytest.mark.parametrize("politica", ["none", "monthly", "threshold"])
+def test_backtest_coincide_con_el_bucle_diario(politica, rentabilidades, simulacion_dia_a_dia):
+    """
+    Los tramos vectorizados entre rebalanceos deben dar el mismo NAV y los
+    mismos días de rebalanceo que simular la cartera día a día.
+    """
+    pesos = {'RV': 50, 'RV_EM': 30, 'RF': 20}
+    objetivo = np.array([0.5, 0.3, 0.2])
+
+    resultado = run_backtest(rentabilidades, pesos, politica)
+    nav_esperado, rebalanceos = _backtest_dia_a_dia(simulacion_dia_a_dia, rentabilidades, objetivo, politica)
+
+    np.testing.assert_allclose(resultado.nav.to_numpy(), nav_esperado, rtol=1e-10)
+    assert list(resultado.rebalance_dates) == rebalanceos
+    assert np.allclose(resultado.weights.sum(axis=1), 1)
+    if politica == "monthly":
+        assert len(rebalanceos) > 20 and resultado.turnover > 0
+    if politica == "threshold":
+        # Salvo el último día (sin rebalanceo posible), los pesos no salen de la banda
+        desviacion = resultado.weights.sub(objetivo).abs().max(axis=1)
+        assert rebalanceos and (desviacion.iloc[:-1] <= DEFAULT_REBALANCE_BAND + 1e-12).all()
+
+
+def test_portfolio_con_rebalanceo(rentabilidades):
+    """
+    Portfolio con rebalanceo diario mantiene el comportamiento de siempre y
+    con otra política usa el backtest (rentabilidades, NAV y contribuciones).
+    """
+    navs = (1 + rentabilidades.fillna(0)).cumprod() * 100
+    pesos = {'RV': 50, 'RV_EM': 30, 'RF': 20}
+
+    diario = Portfolio(navs, pesos)
+    np.testing.assert_allclose(diario.daily_returns.to_numpy(), run_backtest(rentabilidades, pesos).returns.to_numpy(),
+                               rtol=1e-12, atol=1e-15)
+
+    trimestral = Portfolio(navs, pesos, rebalance="quarterly")
+    esperado = run_backtest(rentabilidades, pesos, "quarterly")
+    np.testing.assert_allclose(trimestral.nav.to_numpy(), esperado.nav.to_numpy(), rtol=1e-10)
+    assert list(trimestral.rebalance_dates) == list(esperado.rebalance_dates)
+    assert trimestral.contributions['return_contribution_%'].sum() == pytest.approx(
+        trimestral.metrics['annualized_return_%'])
+
+    with pytest.raises(ValueError):
+        Portfolio(navs, pesos, rebalance="weekly").nav
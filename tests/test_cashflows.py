@@ -0,0 +1,77 @@
+# tests/test_cashflows.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.cashflows import CashflowPlan, run_cashflows, DAYS_PER_YEAR
+from src.portfolio import Portfolio
+
+
+@pytest.fixture
+def rentabilidades(rentabilidades_sinteticas):
+    return rentabilidades_sinteticas(1500, ["R"], seed=24, inicio='2018-01-01')["R"]
+
+
+def _valor_dia_a_dia(simular, rentabilidades, plan):
+    """Valor día a día: aportación del primer día de cada periodo y agotamiento (ver simulacion_dia_a_dia)."""
+    periodos = rentabilidades.index.to_period({"monthly": "M", "quarterly": "Q", "yearly": "Y"}.get(plan.frequency, "M"))
+
+    def al_cierre(t, valor):
+        flujo = plan.initial if t == 0 else 0.0
+        if t > 0 and plan.frequency != "none" and periodos[t] != periodos[t - 1]:
+            flujo += plan.periodic
+        return max(valor + flujo, 0.0) if valor > 0 or flujo > 0 else 0.0
+
+    return np.array(simular(rentabilidades, 0.0, al_cierre))
+
+
+def test_aportaciones_coinciden_con_el_bucle_diario(rentabilidades, simulacion_dia_a_dia):
+    """Aportaciones, reintegros que agotan el plan y solo inversión inicial, en un único lote."""
+    planes = [
+        CashflowPlan(10000, 300, "monthly"),
+        CashflowPlan(50000, -1500, "monthly"),
+        CashflowPlan(0, 2000, "quarterly"),
+        CashflowPlan(10000, 0, "none"),
+    ]
+    resultado = run_cashflows(rentabilidades, planes)
+
+    for columna, plan in enumerate(planes):
+        esperado = _valor_dia_a_dia(simulacion_dia_a_dia, rentabilidades, plan)
+        np.testing.assert_allclose(resultado.values[columna].to_numpy(), esperado, rtol=1e-10, atol=1e-8)
+
+    resumen = resultado.summary
+    assert resumen.loc[0, "invested"] == pytest.approx(resultado.flows[0].sum())
+    # El reintegro agota la cartera: lo retirado es menos que lo previsto y el valor final, 0
+    assert resumen.loc[1, "final_value"] == 0
+    assert pd.notna(resumen.loc[1, "depleted_on"])
+    assert resumen.loc[1, "withdrawn"] < 1500 * len(resultado.flows)
+    assert pd.isna(resumen.loc[0, "depleted_on"])
+
+
+def test_tir_de_los_flujos(rentabilidades):
+    """Con solo inversión inicial la TIR es la rentabilidad anualizada; con aportaciones anula el VAN."""
+    resultado = run_cashflows(rentabilidades, [CashflowPlan(10000, 0, "none"), CashflowPlan(1000, 250, "monthly")])
+    fechas = rentabilidades.index
+    anios = (fechas[-1] - fechas[0]).days / DAYS_PER_YEAR
+
+    crecimiento = (1 + rentabilidades.fillna(0)).prod()
+    assert resultado.summary.loc[0, "mwr_%"] == pytest.approx((crecimiento ** (1 / anios) - 1) * 100, rel=1e-8)
+    assert resultado.summary.loc[0, "twr_%"] == pytest.approx((crecimiento - 1) * 100)
+
+    tir = resultado.summary.loc[1, "mwr_%"] / 100
+    flujos = resultado.flows[1]
+    tiempos = (flujos.index - fechas[0]).days / DAYS_PER_YEAR
+    van = -(flujos / (1 + tir) ** tiempos).sum() + resultado.summary.loc[1, "final_value"] / (1 + tir) ** anios
+    assert van == pytest.approx(0, abs=1e-6)
+
+
+def test_portfolio_simula_aportaciones(rentabilidades):
+    """Portfolio.simulate_cashflows usa las rentabilidades de la cartera."""
+    rentabilidades = rentabilidades.fillna(0)
+    navs = pd.DataFrame({'A': (1 + rentabilidades).cumprod() * 10, 'B': (1 + rentabilidades * 0.5).cumprod() * 20})
+    cartera = Portfolio(navs, {'A': 60, 'B': 40})
+    planes = [CashflowPlan(5000, 100, "monthly")]
+    resultado = cartera.simulate_cashflows(planes, names=["plan"])
+    esperado = run_cashflows(cartera.daily_returns, planes, names=["plan"])
+    pd.testing.assert_frame_equal(resultado.values, esperado.values)
+    assert Portfolio(navs, {}).simulate_cashflows(planes) is None
@@ -0,0 +1,70 @@
+# tests/test_compact_navs.py
+
+import numpy as np
+import pandas as pd
+from src.compact_navs import build_compact_navs, returns_inplace, slice_horizon
+from src.navs import align_navs
+from src.price_reader import PriceArrays
+
+
+def _precios(n_fondos=4, n_dias=800, seed=3):
+    """PriceArrays sintéticos: días hábiles, inicios escalonados y algún sábado suelto."""
+    rng = np.random.default_rng(seed)
+    calendario = pd.bdate_range('2021-01-04', periods=n_dias)
+    codes, dates, navs = [], [], []
+    for code in range(n_fondos):
+        fechas = calendario[int(rng.integers(0, 100)):]
+        fechas = fechas.append(pd.DatetimeIndex(['2022-03-05'])).sort_values()  # sábado
+        navs.append(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(fechas))))
+        dates.append(fechas.values.astype('datetime64[D]').astype(np.int32))
+        codes.append(np.full(len(fechas), code, dtype=np.int32))
+    isins = np.array([f"ES{i:010d}" for i in range(n_fondos)], dtype=object)
+    return PriceArrays(isins, np.concatenate(codes), np.concatenate(dates), np.concatenate(navs))
+
+
+def test_matriz_compacta_coincide_con_la_diaria_en_dias_habiles():
+    """
+    Cada fila de la matriz compacta debe ser la fila de ese día en la matriz
+    diaria float64 (forward-fill), redondeada a float32; la de los viernes, la
+    del domingo siguiente (recoge los precios del fin de semana).
+    """
+    precios = _precios()
+    compacta = build_compact_navs(precios)
+    diaria = align_navs(precios.to_frame())
+
+    fechas = pd.DatetimeIndex(compacta.dates).as_unit(diaria.index.unit)
+    domingos = fechas + pd.to_timedelta(np.where(fechas.dayofweek == 4, 2, 0), unit='D')
+    esperado = diaria.reindex(domingos.where(domingos <= diaria.index.max(), diaria.index.max()))
+    assert compacta.values.dtype == np.float32
+    assert not np.any(np.isin(pd.DatetimeIndex(compacta.dates).dayofweek, [5, 6]))
+    np.testing.assert_array_equal(compacta.values, esperado.to_numpy().astype(np.float32))
+
+
+def test_rentabilidades_in_place_dentro_de_la_cota():
+    """
+    Las rentabilidades float32 calculadas sobre la propia matriz deben quedar
+    dentro de la cota documentada (3·eps diario, 252·3·eps anualizado).
+    """
+    precios = _precios()
+    compacta = slice_horizon(build_compact_navs(precios), '2y')
+    referencia = compacta.to_frame().pct_change()  # float64 sobre los mismos NAVs
+
+    rentabilidades = returns_inplace(compacta.values, chunk_rows=37)
+
+    eps = np.finfo(np.float32).eps / 2
+    error = np.abs(rentabilidades - referencia.to_numpy())
+    assert np.all(np.isnan(rentabilidades[0]))
+    assert np.nanmax(error) <= 3 * eps * 1.05
+    error_anual = np.abs(np.nanmean(rentabilidades.astype(float), axis=0) - referencia.mean().to_numpy()) * 252
+    assert error_anual.max() <= 252 * 3 * eps
+
+
+def test_ultimo_precio_en_fin_de_semana_no_crea_fechas_futuras():
+    """Un último precio en sábado va al viernes anterior, no al lunes siguiente."""
+    fechas = pd.DatetimeIndex(['2024-03-06', '2024-03-07', '2024-03-08', '2024-03-09']).values.astype('datetime64[D]')
+    precios = PriceArrays(np.array(['A'], dtype=object), np.zeros(4, dtype=np.int32),
+                          fechas.astype(np.int32), np.array([1.0, 2.0, 3.0, 4.0]))
+    compacta = build_compact_navs(precios)
+    assert pd.Timestamp(compacta.dates[-1]) == pd.Timestamp('2024-03-08')
+    assert compacta.values[:, 0].tolist() == [1.0, 2.0, 4.0]
+    assert slice_horizon(compacta, '1m').dates[-1] == compacta.dates[-1]
@@ -1,8 +1,9 @@
 # tests/test_metrics.py
 
+import numpy as np
 import pandas as pd
 import pytest
-from src.metrics import calcular_metricas_desde_rentabilidades
+from src.metrics import calcular_metricas_desde_rentabilidades, calcular_metricas_batch
 
 def test_calculo_metricas_basico():
     """
@@ -67,4 +68,122 @@ def test_metricas_con_datos_insuficientes():
     # Esta parte ya funcionaba y no necesita cambios
     assert pd.isna(metricas['volatility_ann_%'])
     assert pd.isna(metricas['sharpe_ann'])
-    assert pd.isna(metricas['max_drawdown_%'])
\ No newline at end of file
+    assert pd.isna(metricas['max_drawdown_%'])
+
+def _metricas_por_serie(daily_returns, risk_free_rate=0.0):
+    """Implementación original (pandas, una serie) de calcular_metricas_desde_rentabilidades."""
+    mean_daily_return = daily_returns.mean()
+    return_ann = mean_daily_return * 252
+    nav_series = (1 + daily_returns).cumprod()
+    vol_ann = daily_returns.std() * np.sqrt(252)
+    excess_returns = daily_returns - (risk_free_rate / 252)
+    negative = excess_returns[excess_returns < 0]
+    downside = negative.std() * np.sqrt(252) if len(negative) > 1 else 0
+    excess_ann = return_ann - risk_free_rate
+    max_dd = ((nav_series / nav_series.cummax() - 1) * 100).min()
+    return {
+        "annualized_return_%": return_ann * 100,
+        "cumulative_return_%": (nav_series.iloc[-1] / nav_series.iloc[0] - 1) * 100,
+        "volatility_ann_%": vol_ann * 100,
+        "sharpe_ann": excess_ann / vol_ann if vol_ann > 0 else np.nan,
+        "sortino_ann": excess_ann / downside if downside > 0 else (1e9 if excess_ann > 0 else 0),
+        "max_drawdown_%": max_dd,
+        "calmar_ratio": return_ann * 100 / abs(max_dd) if max_dd != 0 else np.nan,
+    }
+
+
+def test_metricas_batch_coinciden_con_la_serie():
+    """
+    La versión matricial, con inicios escalonados (NaN iniciales), debe
+    coincidir hasta 1e-12 con el cálculo serie a serie.
+    """
+    rng = np.random.default_rng(11)
+    rentabilidades = pd.DataFrame(rng.normal(0.0004, 0.012, (900, 7)))
+    for col, inicio in enumerate([0, 5, 100, 450, 897, 899, 0]):
+        rentabilidades.iloc[:inicio, col] = np.nan
+    rentabilidades.iloc[:, 6] = np.abs(rentabilidades.iloc[:, 6])  # sin caídas: Sortino = 1e9
+
+    batch = calcular_metricas_batch(rentabilidades, risk_free_rate=0.01, block_columns=3)
+
+    for col in rentabilidades.columns:
+        serie = rentabilidades[col].dropna()
+        unitaria = calcular_metricas_desde_rentabilidades(serie, risk_free_rate=0.01)
+        if len(serie) < 2:
+            assert batch.loc[col].isna().all()
+            continue
+        esperado = _metricas_por_serie(serie, risk_free_rate=0.01)
+        for clave, valor in esperado.items():
+            assert batch.loc[col, clave] == pytest.approx(valor, rel=1e-12, abs=1e-12, nan_ok=True)
+            assert unitaria[clave] == pytest.approx(valor, rel=1e-12, abs=1e-12, nan_ok=True)
+
+
+def test_metricas_multihorizonte_coinciden_con_el_filtrado():
+    """
+    Una sola pasada con sumas acumuladas debe dar lo mismo que filtrar la
+    serie por cada horizonte y calcular sus métricas por separado.
+    """
+    from src.metrics import calcular_metricas_multihorizonte
+    from src.navs import horizon_start
+
+    rng = np.random.default_rng(12)
+    fechas = pd.date_range('2019-03-15', '2025-06-30', freq='D')
+    navs = pd.Series(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, len(fechas))), index=fechas)
+    horizontes = ["1m", "3m", "6m", "YTD", "1y", "2y", "3y", "5y", "max", "18m"]
+
+    resultado = calcular_metricas_multihorizonte(navs, horizontes, risk_free_rate=0.01)
+
+    for horizonte in horizontes:
+        inicio = horizon_start(horizonte, fechas[-1])
+        filtrados = navs if inicio is None else navs.loc[inicio:]
+        esperado = _metricas_por_serie(filtrados.pct_change().dropna(), risk_free_rate=0.01)
+        for clave, valor in esperado.items():
+            assert resultado[horizonte][clave] == pytest.approx(valor, rel=1e-9, abs=1e-9)
+
+    # Con un solo NAV en la ventana el horizonte no se devuelve
+    corta = navs.iloc[:3]
+    assert calcular_metricas_multihorizonte(corta.iloc[:1], ["max"]) == {}
+    assert np.isnan(calcular_metricas_multihorizonte(corta.iloc[:2], ["max"])["max"]["sharpe_ann"])
+
+
+def test_riesgo_multihorizonte_coincide_con_la_definicion():
+    """
+    VaR/CVaR (con selección parcial), índice Ulcer y duraciones de caída
+    deben coincidir con su cálculo directo (np.quantile, bucles) por ventana.
+    """
+    from src.metrics import calcular_riesgo_multihorizonte
+    from src.navs import horizon_start
+    from statistics import NormalDist
+
+    rng = np.random.default_rng(20)
+    fechas = pd.date_range('2021-01-01', '2025-06-30', freq='D')
+    navs = pd.Series(100 * np.cumprod(1 + rng.normal(0.0002, 0.01, len(fechas))), index=fechas)
+
+    resultado = calcular_riesgo_multihorizonte(navs, ["3m", "1y", "max"])
+
+    for horizonte in ["3m", "1y", "max"]:
+        inicio = horizon_start(horizonte, fechas[-1])
+        ventana = navs if inicio is None else navs.loc[inicio:]
+        r = ventana.pct_change().dropna().to_numpy()
+        var = np.quantile(r, 0.05)
+        z = NormalDist().inv_cdf(0.05)
+        m = resultado[horizonte]
+        assert m["var_hist_%"] == pytest.approx(var * 100, rel=1e-12)
+        assert m["cvar_hist_%"] == pytest.approx(r[r <= var].mean() * 100, rel=1e-12)
+        assert m["var_param_%"] == pytest.approx((r.mean() + z * r.std(ddof=1)) * 100, rel=1e-12)
+
+        nav = ventana.iloc[1:]
+        caida = (nav / nav.cummax() - 1) * 100
+        assert m["ulcer_index"] == pytest.approx(np.sqrt((caida ** 2).mean()), rel=1e-12)
+        pico, mas_larga = nav.index[0], 0
+        for fecha, valor in caida.items():
+            if valor == 0:
+                pico = fecha
+            mas_larga = max(mas_larga, (fecha - pico).days)
+        assert m["max_drawdown_days"] == mas_larga
+
+    # Caída sin recuperar: recovery_days es NaN; recuperada: días del mínimo al máximo anterior
+    serie = pd.Series([100, 100, 90, 80, 95, 101, 99.0], index=pd.date_range('2025-01-01', periods=7, freq='D'))
+    recuperada = calcular_riesgo_multihorizonte(serie, ["max"])["max"]
+    assert recuperada["recovery_days"] == 2 and recuperada["max_drawdown_days"] == 3
+    sin_recuperar = calcular_riesgo_multihorizonte(serie.iloc[:5], ["max"])["max"]
+    assert np.isnan(sin_recuperar["recovery_days"])
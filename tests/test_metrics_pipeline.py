@@ -0,0 +1,131 @@
+# tests/test_metrics_pipeline.py
+
+from datetime import date, timedelta
+
+import pytest
+from src.metrics_pipeline import select_dirty_isins
+
+
+# (isin, último precio en la BD, último precio usado en sus métricas)
+FRESCURA = [
+    ("FONDO_NUEVO", date(2025, 6, 10), None),                        # sin métricas
+    ("FONDO_AL_DIA", date(2025, 6, 9), date(2025, 6, 9)),
+    ("FONDO_INGERIDO_TARDE", date(2025, 6, 10), date(2025, 6, 9)),   # NAV del 10 llegado tras el cálculo
+    ("FONDO_ATRASADO", date(2025, 6, 11), date(2025, 6, 6)),
+    ("FONDO_SIN_PRECIOS", None, None),
+]
+
+
+def test_solo_se_recalculan_los_fondos_con_precios_nuevos():
+    """
+    Un fondo está sucio si no tiene métricas o tiene precios posteriores al
+    último usado en su cálculo, aunque se ingirieran días después de él;
+    los fondos sin precios se omiten.
+    """
+    sucios, omitidos = select_dirty_isins(FRESCURA)
+
+    assert sucios == ["FONDO_NUEVO", "FONDO_INGERIDO_TARDE", "FONDO_ATRASADO"]
+    assert omitidos == 2
+
+
+def test_since_y_full_ignoran_last_calculated():
+    """
+    --since selecciona por fecha de precio y --full todo lo que tenga precios.
+    """
+    sucios, omitidos = select_dirty_isins(FRESCURA, since=date(2025, 6, 9))
+    assert sucios == ["FONDO_NUEVO", "FONDO_AL_DIA", "FONDO_INGERIDO_TARDE", "FONDO_ATRASADO"]
+    assert omitidos == 1
+
+    sucios, omitidos = select_dirty_isins(FRESCURA, since=date(2025, 6, 11))
+    assert sucios == ["FONDO_ATRASADO"]
+
+    sucios, omitidos = select_dirty_isins(FRESCURA, full=True)
+    assert len(sucios) == 4 and omitidos == 1
+
+
+class _CursorConNombre:
+    """Cursor falso: itera filas (isin, date, nav) ya ordenadas como las devolvería el servidor."""
+    def __init__(self, filas):
+        self.filas = filas
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.filas)
+
+
+class _Conexion:
+    def __init__(self, filas):
+        self.cursor_falso = _CursorConNombre(filas)
+
+    def cursor(self, name=None):
+        assert name, "la lectura debe usar un cursor con nombre (del lado del servidor)"
+        return self.cursor_falso
+
+
+def test_streaming_agrupa_por_fondo_y_calcula_como_en_bloque():
+    """
+    El streaming debe entregar un fondo cada vez, en el formato de
+    fund_slices(), y sus métricas deben coincidir con las de PriceArrays.
+    """
+    import numpy as np
+    from src.metrics_pipeline import stream_fund_prices, fund_metric_rows
+    from src.price_reader import PriceArrays, date_to_days
+    from src.config import HORIZONTE_OPCIONES
+
+    fechas = [date(2025, 1, 1) + timedelta(days=i) for i in range(60)]
+    filas = [("FONDO_A", d, 100 + i) for i, d in enumerate(fechas)]
+    filas += [("FONDO_B", d, 50 - 0.1 * i) for i, d in enumerate(fechas[:40])]
+    conn = _Conexion(filas)
+
+    fondos = list(stream_fund_prices(conn, ["FONDO_B", "FONDO_A", "FONDO_A"], itersize=7))
+
+    assert conn.cursor_falso.params == {'isins': ["FONDO_A", "FONDO_B"]}
+    assert conn.cursor_falso.itersize == 7
+    assert [isin for isin, _, _ in fondos] == ["FONDO_A", "FONDO_B"]
+    isin, dias, navs = fondos[1]
+    assert dias.dtype == np.int32 and dias[0] == date_to_days(date(2025, 1, 1)) and len(navs) == 40
+
+    precios = PriceArrays(
+        isins=np.array(["FONDO_A", "FONDO_B"], dtype=object),
+        codes=np.array([0] * 60 + [1] * 40, dtype=np.int32),
+        dates=np.concatenate([fondos[0][1], fondos[1][1]]),
+        navs=np.array([fila[2] for fila in filas], dtype=np.float64),
+    )
+    for (isin, dias, navs), (isin_b, dias_b, navs_b) in zip(fondos, precios.fund_slices()):
+        assert fund_metric_rows(isin, dias, navs) == fund_metric_rows(isin_b, dias_b, navs_b)
+    assert {fila[1] for fila in fund_metric_rows(*fondos[0])} == set(HORIZONTE_OPCIONES)
+    # prices_through: fecha del último precio que entró en el cálculo
+    assert {fila[-1] for fila in fund_metric_rows(*fondos[1])} == {fechas[39]}
+
+
+def test_var_y_cvar_sobre_los_precios_publicados():
+    """
+    Con precios de lunes a viernes, el VaR y el CVaR se calculan sobre las
+    rentabilidades entre precios publicados (sin los 0 del fin de semana que
+    añade el forward-fill diario); las duraciones siguen en días naturales.
+    """
+    import numpy as np
+    import pandas as pd
+    from src.metrics_pipeline import fund_metric_rows, METRIC_ROW_COLUMNS
+
+    fechas = pd.bdate_range("2024-01-01", "2025-06-30")
+    navs = 100 * np.cumprod(1 + np.random.default_rng(20).normal(0.0002, 0.01, len(fechas)))
+    dias = fechas.to_numpy(dtype='datetime64[D]').astype(np.int32)
+
+    fila = next(f for f in fund_metric_rows("FONDO", dias, navs) if f[1] == "max")
+    valores = dict(zip(METRIC_ROW_COLUMNS, fila))
+
+    rentabilidades = navs[1:] / navs[:-1] - 1
+    assert valores["var_hist_pct"] == pytest.approx(np.quantile(rentabilidades, 0.05) * 100)
+    assert valores["cvar_hist_pct"] == pytest.approx(
+        rentabilidades[rentabilidades <= np.quantile(rentabilidades, 0.05)].mean() * 100, rel=0.02)
+    assert valores["max_drawdown_days"] >= 0
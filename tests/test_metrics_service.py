@@ -0,0 +1,92 @@
+# tests/test_metrics_service.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.metrics import METRIC_KEYS, calcular_metricas_batch
+from src.metrics_service import get_fund_metrics
+from src.metrics_pipeline import fund_metric_rows
+from src.navs import align_navs, horizon_start
+
+ANCLA = pd.Timestamp("2025-06-30")
+
+
+def _navs():
+    rng = np.random.default_rng(17)
+    fechas = pd.date_range(end=ANCLA, periods=300, freq='D')
+    return pd.DataFrame(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, (300, 3)), axis=0),
+                        index=fechas, columns=["FONDO_A", "FONDO_B", "FONDO_C"])
+
+
+def _guardadas(isins, valor=1.0, prices_through=ANCLA):
+    guardadas = pd.DataFrame(valor, index=list(isins), columns=METRIC_KEYS)
+    guardadas["prices_through"] = prices_through
+    return guardadas
+
+
+def test_usa_las_metricas_guardadas_y_calcula_solo_las_que_faltan():
+    """
+    Los fondos con métricas al día salen de la tabla; el resto se calcula
+    con la versión matricial, en el orden de las columnas de entrada.
+    """
+    navs = _navs()
+    guardadas = _guardadas(["FONDO_B"])
+
+    resultado = get_fund_metrics(navs, "1y", stored=guardadas)
+
+    assert list(resultado.index) == ["FONDO_A", "FONDO_B", "FONDO_C"]
+    assert resultado.attrs["from_store"] == 1
+    assert (resultado.loc["FONDO_B"] == 1.0).all()
+    calculadas = calcular_metricas_batch(navs[["FONDO_A", "FONDO_C"]].pct_change())
+    np.testing.assert_allclose(resultado.loc[["FONDO_A", "FONDO_C"]].to_numpy(), calculadas.to_numpy())
+
+
+def test_con_tasa_libre_de_riesgo_no_se_usan_las_guardadas():
+    """
+    fund_metrics se calcula con tasa libre de riesgo 0: con otra tasa todo se calcula en vivo.
+    """
+    navs = _navs()
+    guardadas = _guardadas(navs.columns)
+
+    resultado = get_fund_metrics(navs, "1y", risk_free_rate=0.02, stored=guardadas)
+
+    assert resultado.attrs["from_store"] == 0
+    assert resultado.loc["FONDO_A", "sharpe_ann"] == pytest.approx(
+        calcular_metricas_batch(navs.pct_change(), risk_free_rate=0.02).loc["FONDO_A", "sharpe_ann"])
+
+
+def test_fila_guardada_coincide_con_el_calculo_en_vivo_con_inicio_escalonado():
+    """
+    Un fondo que empieza dentro del horizonte (y otro con todo el horizonte)
+    debe dar lo mismo desde fund_metrics que en vivo sobre la matriz alineada;
+    un fondo cuyo último precio no es el ancla de la matriz se calcula en vivo.
+    """
+    rng = np.random.default_rng(5)
+    filas = []
+    for isin, inicio, fin in [("FONDO_LARGO", "2023-01-02", "2025-06-30"),
+                              ("FONDO_NUEVO", "2025-01-15", "2025-06-30"),
+                              ("FONDO_PARADO", "2023-01-02", "2025-06-20")]:
+        fechas = pd.bdate_range(inicio, fin)
+        navs = 10 * np.cumprod(1 + rng.normal(0.0004, 0.01, len(fechas)))
+        filas.append(pd.DataFrame({"date": fechas, "isin": isin, "nav": navs}))
+    precios = pd.concat(filas, ignore_index=True)
+
+    guardadas = []
+    for isin, grupo in precios.groupby("isin"):
+        dias = grupo["date"].to_numpy(dtype='datetime64[D]').astype(np.int32)
+        fila = next(f for f in fund_metric_rows(isin, dias, grupo["nav"].to_numpy()) if f[1] == "1y")
+        guardadas.append(pd.DataFrame([fila[2:2 + len(METRIC_KEYS)]], index=[isin], columns=METRIC_KEYS)
+                         .assign(prices_through=pd.Timestamp(fila[-1])))
+    guardadas = pd.concat(guardadas)
+
+    alineados = align_navs(precios)
+    ancla = alineados.index.max()
+    alineados = alineados.loc[horizon_start("1y", ancla):ancla]  # filtrar_por_horizonte
+
+    servidas = get_fund_metrics(alineados, "1y", stored=guardadas)
+    en_vivo = get_fund_metrics(alineados, "1y", stored=guardadas.iloc[:0])
+
+    assert servidas.attrs["from_store"] == 2 and en_vivo.attrs["from_store"] == 0
+    np.testing.assert_allclose(servidas.loc[["FONDO_LARGO", "FONDO_NUEVO"]].to_numpy(),
+                               en_vivo.loc[["FONDO_LARGO", "FONDO_NUEVO"]].to_numpy(), rtol=1e-9)
+    assert servidas.loc["FONDO_PARADO"].equals(en_vivo.loc["FONDO_PARADO"])
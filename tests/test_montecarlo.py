@@ -0,0 +1,95 @@
+# tests/test_montecarlo.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.montecarlo import (
+    bootstrap_indices, checkpoint_days, history_rows_per_year, run_montecarlo, simulate_chunk, simulate_paths,
+)
+from src.navs import align_navs
+
+
+@pytest.fixture
+def rentabilidades(rentabilidades_sinteticas):
+    return rentabilidades_sinteticas(1000, ['A', 'B'], seed=25)
+
+
+def test_bloques_circulares_consecutivos():
+    """Cada bloque son días consecutivos de la historia, dando la vuelta al final."""
+    indices = bootstrap_indices(np.random.default_rng(0), n_history=50, n_paths=200, horizon_days=100, block_days=21)
+    assert indices.shape == (200, 100)
+    assert indices.min() >= 0 and indices.max() < 50
+    saltos = (np.diff(indices, axis=1) % 50)[:, [d for d in range(99) if (d + 1) % 21]]
+    assert np.all(saltos == 1)
+
+
+def test_trayectorias_coinciden_con_el_bucle(rentabilidades, simulacion_dia_a_dia):
+    """Valores en los puntos de control y caída máxima frente a un bucle por trayectoria."""
+    historia = rentabilidades['A'].to_numpy()[1:]
+    semilla = np.random.SeedSequence(3)
+    valores, caidas = simulate_chunk(historia, 20, 300, 10, semilla)
+
+    indices = bootstrap_indices(np.random.default_rng(semilla), len(historia), 20, 300, 10)
+    for camino in range(20):
+        # El día 0 es la inversión inicial; después, los días sorteados
+        sorteadas = pd.Series(np.concatenate([[np.nan], historia[indices[camino]]]))
+        maximo, caida = [1.0], [0.0]
+
+        def al_cierre(t, valor):
+            maximo[0] = max(maximo[0], valor)
+            caida[0] = min(caida[0], valor / maximo[0] - 1)
+            return valor
+
+        nav = np.array(simulacion_dia_a_dia(sorteadas, 1.0, al_cierre))[1:]
+        np.testing.assert_allclose(valores[camino], nav[checkpoint_days(300) - 1])
+        assert caidas[camino] == pytest.approx(caida[0])
+
+
+def test_montecarlo_reproducible_y_por_bloques(rentabilidades):
+    """Misma semilla, mismo resultado; el tamaño de bloque de trayectorias no cambia la forma."""
+    a = run_montecarlo(rentabilidades, {'A': 60, 'B': 40}, years=2, n_paths=700, seed=11, chunk_size=300)
+    b = run_montecarlo(rentabilidades, {'A': 60, 'B': 40}, years=2, n_paths=700, seed=11, chunk_size=300)
+    pd.testing.assert_frame_equal(a.bands, b.bands)
+    assert len(a.final_values) == 700
+    assert a.bands.iloc[0].eq(10000).all()
+    assert a.bands.index[-1] == pytest.approx(2)
+    # Percentiles ordenados en cada punto de control
+    assert np.all(np.diff(a.bands.to_numpy(), axis=1) >= 0)
+
+    valores, _ = simulate_paths(rentabilidades['A'].to_numpy()[1:], 700, 504, seed=11, chunk_size=300)
+    assert valores.shape == (700, len(checkpoint_days(504)))
+
+
+def test_montecarlo_con_rentabilidad_constante():
+    """Sin incertidumbre todas las trayectorias coinciden y las probabilidades son 0 o 100."""
+    fechas = pd.bdate_range('2020-01-01', periods=300)
+    rentabilidades = pd.DataFrame({'A': 0.001}, index=fechas)
+    resultado = run_montecarlo(rentabilidades, {'A': 100}, years=1, initial=1000, target=1300, n_paths=50, seed=0)
+    # Un año son las filas por año de la historia: días hábiles (~261)
+    assert resultado.summary["horizon_days"] == round(history_rows_per_year(fechas)) == 261
+    esperado = 1000 * 1.001 ** 261
+    np.testing.assert_allclose(resultado.final_values, esperado)
+    assert resultado.summary["prob_shortfall_%"] == 100
+    assert resultado.summary["prob_drawdown_%"] == 0
+    assert run_montecarlo(rentabilidades, {'Z': 100}) is None
+
+
+def test_horizonte_en_anios_naturales_con_la_matriz_de_align_navs():
+    """
+    Con el calendario diario de align_navs (fines de semana con rentabilidad
+    0) un año proyectado sigue siendo un año natural: el mismo crecimiento
+    que con la historia en días hábiles, no el de 252 filas.
+    """
+    fechas = pd.bdate_range('2020-01-01', '2023-12-29')
+    precios = pd.DataFrame({'date': fechas, 'isin': 'A', 'nav': 100 * 1.001 ** np.arange(len(fechas))})
+    navs = align_navs(precios)
+    assert len(navs) > len(fechas)
+
+    diario = run_montecarlo(navs.pct_change(), {'A': 100}, years=1, n_paths=400, seed=1)
+    habiles = run_montecarlo(precios.set_index('date')[['nav']].rename(columns={'nav': 'A'}).pct_change(),
+                             {'A': 100}, years=1, n_paths=400, seed=1)
+
+    assert diario.summary["rows_per_year"] == pytest.approx(365.25, rel=1e-3)
+    assert diario.summary["history_years"] == pytest.approx(4, rel=1e-2)
+    assert diario.summary["median_cagr_%"] == pytest.approx(habiles.summary["median_cagr_%"], rel=0.02)
+    assert diario.summary["median_cagr_%"] == pytest.approx((1.001 ** 261 - 1) * 100, rel=0.02)
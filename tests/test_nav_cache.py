@@ -0,0 +1,73 @@
+# tests/test_nav_cache.py
+
+import numpy as np
+from src.nav_cache import NavCache
+from src.price_reader import PriceArrays, days_to_date
+
+
+def _loader_sintetico(peticiones, n_dias=100):
+    """Loader que genera n_dias de precios por ISIN y registra qué se le pide."""
+    def loader(isins):
+        peticiones.append(sorted(isins))
+        isins = np.asarray(sorted(isins), dtype=object)
+        codes = np.repeat(np.arange(len(isins), dtype=np.int32), n_dias)
+        dates = np.tile(np.arange(20000, 20000 + n_dias, dtype=np.int32), len(isins))
+        navs = 100 + codes + np.tile(np.arange(n_dias) / 100, len(isins))
+        return PriceArrays(isins, codes, dates, navs)
+    return loader
+
+
+def test_solo_se_cargan_los_isin_que_faltan():
+    """
+    Una cartera que se solapa con otra ya cargada solo debe pedir los fondos nuevos.
+    """
+    peticiones = []
+    cache = NavCache()
+    loader = _loader_sintetico(peticiones)
+
+    cache.get_many(['A', 'B'], loader)
+    precios = cache.get_many(['B', 'C', 'A'], loader)
+
+    assert peticiones == [['A', 'B'], ['C']]
+    assert list(precios.isins) == ['A', 'B', 'C']
+    assert len(precios) == 300
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 3)
+
+
+def test_presupuesto_de_memoria_expulsa_el_menos_usado():
+    """
+    Al superar el presupuesto se expulsa la entrada usada hace más tiempo.
+    """
+    peticiones = []
+    # Cada ISIN ocupa 100 * (4 + 8) = 1200 bytes: caben dos
+    cache = NavCache(max_bytes=2500)
+    loader = _loader_sintetico(peticiones)
+
+    cache.get_many(['A'], loader)
+    cache.get_many(['B'], loader)
+    cache.get_many(['A'], loader)  # A pasa a ser la más reciente
+    cache.get_many(['C'], loader)  # expulsa B
+
+    cache.get_many(['A', 'C'], loader)
+    assert peticiones == [['A'], ['B'], ['C']]
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] <= 2500
+
+
+def test_horizonte_largo_cubre_uno_corto():
+    """
+    Lo cargado para un horizonte largo sirve para uno corto, pero no al revés.
+    """
+    peticiones = []
+    cache = NavCache()
+    loader = _loader_sintetico(peticiones)
+    inicio_corto = days_to_date(20090)
+
+    corto = cache.get_many(['A'], loader, start_date=inicio_corto)
+    cache.get_many(['A'], loader)
+    corto_desde_cache = cache.get_many(['A'], loader, start_date=inicio_corto)
+
+    assert peticiones == [['A'], ['A']]
+    assert corto_desde_cache.dates.tolist() == list(range(20090, 20100))
+    assert corto.dates.tolist() == corto_desde_cache.dates.tolist()
@@ -0,0 +1,205 @@
+# tests/test_nav_store.py
+
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from psycopg2 import extensions
+
+import src.async_price_loader as async_price_loader
+import src.db_connector as db_connector
+import src.nav_store as nav_store
+from src.db_connector import ConnectionPool
+from src.nav_store import NavStore
+from src.price_reader import PriceArrays, days_to_date
+
+# Los tests sustituyen read_prices: la conexión solo se pasa de largo
+CONEXION = object()
+
+
+def test_sincronizacion_incremental(tmp_path, monkeypatch):
+    """
+    La segunda sincronización solo debe pedir las filas posteriores a la marca
+    de agua menos la ventana de revisiones, añadir las nuevas y sustituir los
+    NAV revisados.
+    """
+    # "Base de datos": FONDO_A con 3 días de precios
+    bd = {'FONDO_A': ([20000, 20001, 20002], [10.0, 11.0, 12.0])}
+    peticiones = []
+
+    def read_prices_falso(conn, isins, watermarks=None):
+        watermarks = watermarks or {}
+        peticiones.append(dict(watermarks))
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        codes, dates, navs = [], [], []
+        for code, isin in enumerate(isins):
+            for d, nav in zip(*bd.get(isin, ([], []))):
+                wm = watermarks.get(isin)
+                if wm is None or days_to_date(d) > wm:
+                    codes.append(code); dates.append(d); navs.append(nav)
+        return PriceArrays(isins, np.array(codes, dtype=np.int32), np.array(dates, dtype=np.int32), np.array(navs))
+
+    monkeypatch.setattr(nav_store, 'read_prices', read_prices_falso)
+    store = NavStore(tmp_path, sync_interval_seconds=0, revision_days=2)
+
+    assert store.sync(CONEXION, ['FONDO_A']) == {'FONDO_A': 3}
+    assert store.watermark('FONDO_A') == 20002
+
+    # Llega un precio nuevo: se relee la ventana de revisiones y solo cambia esa fila
+    bd['FONDO_A'][0].append(20003); bd['FONDO_A'][1].append(13.0)
+    assert store.sync(CONEXION, ['FONDO_A']) == {'FONDO_A': 1}
+    assert peticiones[-1]['FONDO_A'] == days_to_date(20000)
+
+    # La ingesta revisa un NAV anterior a la marca de agua: se sustituye en disco
+    bd['FONDO_A'][1][2] = 12.5
+    assert store.sync(CONEXION, ['FONDO_A']) == {'FONDO_A': 1}
+    assert store.sync(CONEXION, ['FONDO_A']) == {}
+
+    precios = store.load(['FONDO_A', 'SIN_DATOS'])
+    assert precios.dates.tolist() == [20000, 20001, 20002, 20003]
+    assert precios.navs.tolist() == [10.0, 11.0, 12.5, 13.0]
+
+    # Una instancia nueva (otro proceso) recupera el estado desde el manifiesto
+    assert NavStore(tmp_path).watermark('FONDO_A') == 20003
+
+
+def test_horizonte_corto_solo_descarga_desde_el_inicio(tmp_path, monkeypatch):
+    """
+    Con un inicio solo se guardan las fechas desde él; un horizonte más largo
+    vuelve a descargar desde su propio inicio.
+    """
+    bd = {'FONDO_A': (list(range(20000, 20010)), [float(n) for n in range(10)])}
+
+    def read_prices_falso(conn, isins, watermarks=None):
+        watermarks = watermarks or {}
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        codes, dates, navs = [], [], []
+        for code, isin in enumerate(isins):
+            for d, nav in zip(*bd.get(isin, ([], []))):
+                wm = watermarks.get(isin)
+                if wm is None or days_to_date(d) > wm:
+                    codes.append(code); dates.append(d); navs.append(nav)
+        return PriceArrays(isins, np.array(codes, dtype=np.int32), np.array(dates, dtype=np.int32), np.array(navs))
+
+    monkeypatch.setattr(nav_store, 'read_prices', read_prices_falso)
+    store = NavStore(tmp_path, sync_interval_seconds=3600)
+
+    assert store.sync(CONEXION, ['FONDO_A'], start=20007) == {'FONDO_A': 3}
+    assert store.covers('FONDO_A', 20008) and not store.covers('FONDO_A', 20005)
+    assert store.sync(CONEXION, ['FONDO_A'], start=20008) == {}
+
+    assert store.sync(CONEXION, ['FONDO_A'], start=20005) == {'FONDO_A': 5}
+    assert store.load(['FONDO_A'], start=20006).dates.tolist() == [20006, 20007, 20008, 20009]
+    assert store.sync(CONEXION, ['FONDO_A']) == {'FONDO_A': 10}
+    assert store.covers('FONDO_A', None)
+
+
+def test_ultimas_fechas_locales_sin_consultar_la_bd(tmp_path, monkeypatch):
+    """
+    latest_dates responde desde disco si la caché está al día y cubre la
+    fecha; si algún ISIN está pendiente o su fichero empieza después, devuelve
+    None para que se consulte la BD.
+    """
+    bd = {'FONDO_A': [20000, 20003, 20010], 'FONDO_B': [20005, 20006]}
+
+    def read_prices_falso(conn, isins, watermarks=None):
+        watermarks = watermarks or {}
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        codes, dates = [], []
+        for code, isin in enumerate(isins):
+            wm = watermarks.get(isin)
+            nuevas = [d for d in bd.get(isin, []) if wm is None or days_to_date(d) > wm]
+            codes += [code] * len(nuevas); dates += nuevas
+        return PriceArrays(isins, np.array(codes, dtype=np.int32), np.array(dates, dtype=np.int32),
+                           np.ones(len(dates)))
+
+    monkeypatch.setattr(nav_store, 'read_prices', read_prices_falso)
+    store = NavStore(tmp_path, sync_interval_seconds=3600)
+
+    assert store.latest_dates(['FONDO_A'], 20004) is None  # nunca sincronizado
+    store.sync(CONEXION, ['FONDO_A', 'FONDO_B'])
+    assert store.latest_dates(['FONDO_A', 'FONDO_B'], 20004) == {'FONDO_A': 20003, 'FONDO_B': None}
+    assert store.latest_dates(['FONDO_A'], 20010) == {'FONDO_A': 20010}
+
+    # Fichero descargado solo desde 20003: lo anterior no se sabe sin la BD
+    store.invalidate(['FONDO_A'])
+    store.sync(CONEXION, ['FONDO_A'], start=20003)
+    assert store.latest_dates(['FONDO_A'], 20005) == {'FONDO_A': 20003}
+    assert store.latest_dates(['FONDO_A'], 20002) is None
+
+    store.sync_interval_seconds = 0  # caché caducada
+    assert store.latest_dates(['FONDO_B'], 20006) is None
+
+
+class _ConexionFalsa:
+    """Lo mínimo de una PooledConnection que usa ConnectionPool."""
+    closed = False
+    autocommit = False
+    _pool = None
+
+    def __init__(self):
+        self.last_used = time.monotonic()
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def close(self):
+        self._pool.putconn(self)
+
+    def discard(self):
+        self.closed = True
+
+
+def test_cargas_grandes_simultaneas_no_agotan_el_pool(tmp_path, monkeypatch):
+    """
+    Dos sesiones que cargan a la vez todo el catálogo con un pool de 2
+    conexiones: sync no retiene ninguna mientras reparte la lectura por
+    bloques, así que ambas terminan sin esperar al timeout del pool.
+    """
+    pool = ConnectionPool({}, minconn=0, maxconn=2, acquire_timeout=2)
+    monkeypatch.setattr(pool, '_connect', _ConexionFalsa)
+    monkeypatch.setattr(db_connector, '_pool', pool)
+    monkeypatch.setattr(nav_store, 'PRICE_LOADER_MIN_ISINS', 4)
+
+    en_uso, max_en_uso = [0], [0]
+    cerrojo = threading.Lock()
+
+    def read_prices_falso(conn, isins, watermarks=None, start_date=None):
+        assert isinstance(conn, _ConexionFalsa)
+        with cerrojo:
+            en_uso[0] += 1
+            max_en_uso[0] = max(max_en_uso[0], en_uso[0])
+        time.sleep(0.02)
+        with cerrojo:
+            en_uso[0] -= 1
+        isins = np.asarray(sorted(set(isins)), dtype=object)
+        codes = np.arange(len(isins), dtype=np.int32)
+        return PriceArrays(isins, codes, np.full(len(isins), 20000, dtype=np.int32), np.ones(len(isins)))
+
+    monkeypatch.setattr(async_price_loader, 'read_prices', read_prices_falso)
+    monkeypatch.setattr(nav_store, 'read_prices', read_prices_falso)
+    isins = [f"F{i:02d}" for i in range(8)]
+    errores, escritos = [], []
+    a_la_vez = threading.Barrier(2)
+
+    def sesion(raiz):
+        try:
+            a_la_vez.wait()
+            escritos.append(NavStore(raiz).sync(None, isins, force=True))
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=sesion, args=(tmp_path / nombre,)) for nombre in ("a", "b")]
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == []
+    assert [len(e) for e in escritos] == [8, 8]
+    assert time.monotonic() - inicio < pool.acquire_timeout
+    assert max_en_uso[0] <= pool.maxconn
+
+    # Cargas pequeñas sin conexión: una del pool solo durante la lectura
+    assert NavStore(tmp_path / "c").sync(None, isins[:2]) == {"F00": 1, "F01": 1}
+    assert pool._slots._value == pool.maxconn  # Todas devueltas al pool
@@ -0,0 +1,93 @@
+# tests/test_navs.py
+
+import numpy as np
+import pandas as pd
+from src.navs import align_navs, horizon_start, horizon_read_start, HORIZON_MARGIN_DAYS
+from tools.bench_align_navs import legacy_align_navs
+
+
+def test_align_navs_identico_al_bucle():
+    """
+    La alineación vectorizada debe producir exactamente lo mismo que el bucle
+    por ISIN, con inicios escalonados, huecos y NAVs nulos.
+    """
+    rng = np.random.default_rng(7)
+    rows = []
+    for i in range(6):
+        start = pd.Timestamp('2024-01-01') + pd.Timedelta(days=int(rng.integers(0, 60)))
+        for d in range(int(rng.integers(20, 120))):
+            if rng.random() < 0.3:
+                continue  # hueco (fin de semana, festivo...)
+            nav = np.nan if rng.random() < 0.05 else 100 + rng.normal()
+            rows.append((start + pd.Timedelta(days=d), f"ES{i:010d}", nav))
+    precios = pd.DataFrame(rows, columns=['date', 'isin', 'nav'])
+
+    pd.testing.assert_frame_equal(align_navs(precios), legacy_align_navs(precios), check_freq=False)
+
+
+def test_align_navs_respeta_inicio_de_cada_fondo():
+    """
+    Antes de su primera fecha un fondo debe quedar como NaN, no rellenado.
+    """
+    precios = pd.DataFrame({
+        'date': pd.to_datetime(['2025-01-01', '2025-01-03', '2025-01-02']),
+        'isin': ['FONDO_A', 'FONDO_A', 'FONDO_B'],
+        'nav': [10.0, 12.0, 50.0],
+    })
+
+    alineado = align_navs(precios)
+
+    assert list(alineado.columns) == ['FONDO_A', 'FONDO_B']
+    assert alineado['FONDO_A'].tolist() == [10.0, 10.0, 12.0]
+    assert pd.isna(alineado['FONDO_B'].iloc[0])
+    assert alineado['FONDO_B'].iloc[1:].tolist() == [50.0, 50.0]
+
+
+def test_inicio_de_horizonte_con_margen_conserva_el_filtrado():
+    """
+    Leer solo desde horizon_start - margen debe dar el mismo tramo que filtrar
+    el histórico completo (como hace filtrar_por_horizonte).
+    """
+
+    fechas = pd.bdate_range('2020-01-01', '2025-03-14')
+    df = pd.DataFrame({
+        'date': np.tile(fechas, 2),
+        'isin': np.repeat(['A', 'B'], len(fechas)),
+        'nav': np.arange(2 * len(fechas), dtype=float),
+    })
+    completo = align_navs(df)
+    anchor = completo.index.max()
+
+    for horizonte in ['1m', '6m', 'YTD', '1y', '3y']:
+        inicio = horizon_start(horizonte, anchor) - pd.Timedelta(days=HORIZON_MARGIN_DAYS)
+        parcial = align_navs(df[df['date'] >= inicio])
+        desde = horizon_start(horizonte, anchor)
+        pd.testing.assert_frame_equal(parcial.loc[desde:anchor], completo.loc[desde:anchor], check_freq=False)
+    assert horizon_start('max', anchor) is None
+
+
+def test_inicio_de_lectura_con_precios_mensuales():
+    """
+    Un fondo con NAV mensual (huecos de más de HORIZON_MARGIN_DAYS) se lee
+    desde su último precio previo al horizonte y el tramo filtrado coincide
+    con el del histórico completo.
+    """
+    diarias = pd.bdate_range('2023-01-02', '2025-03-14')
+    mensuales = pd.date_range('2023-01-31', '2025-02-28', freq='ME')
+    df = pd.DataFrame({
+        'date': np.concatenate([diarias, mensuales]),
+        'isin': ['A'] * len(diarias) + ['M'] * len(mensuales),
+        'nav': np.arange(len(diarias) + len(mensuales), dtype=float),
+    })
+    completo = align_navs(df)
+    anchor = completo.index.max()
+
+    # Horizontes que empiezan a mitad de mes: el último precio mensual queda a más de 10 días
+    for horizonte in ['1m', '6m', '1y']:
+        desde = horizon_start(horizonte, anchor)
+        previas = [df.loc[(df['isin'] == isin) & (df['date'] <= desde), 'date'].max() for isin in ['A', 'M']]
+        inicio = horizon_read_start(desde, [None if pd.isna(d) else d for d in previas])
+        assert inicio < desde - pd.Timedelta(days=HORIZON_MARGIN_DAYS)
+        parcial = align_navs(df[df['date'] >= inicio])
+        pd.testing.assert_frame_equal(parcial.loc[desde:anchor], completo.loc[desde:anchor], check_freq=False)
+    assert horizon_read_start(pd.Timestamp('2025-01-01'), [None, None]) == pd.Timestamp('2025-01-01')
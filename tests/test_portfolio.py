@@ -32,4 +32,80 @@ def test_calculo_nav_cartera_simple():
     
     # Día 3: Rentabilidad A: +9.09%, Rentabilidad B: -10%. La media es -0.455%.
     # NAV esperado = 105 * (1 - 0.004545...) = 104.5227
-    assert nav_cartera.iloc[2] == pytest.approx(104.52, abs=0.01)
\ No newline at end of file
+    assert nav_cartera.iloc[2] == pytest.approx(104.52, abs=0.01)
+
+def test_cartera_perezosa_equivale_a_pandas_y_no_recalcula():
+    """
+    Rentabilidades y NAV deben coincidir con el cálculo en pandas
+    (pct_change ponderado, NaN como 0), calcularse una sola vez y no poder
+    modificarse desde fuera. Las contribuciones suman la rentabilidad
+    anualizada y el 100% del riesgo.
+    """
+    import numpy as np
+    from src import portfolio as modulo
+
+    rng = np.random.default_rng(21)
+    fechas = pd.date_range('2024-01-01', periods=300, freq='D')
+    navs_df = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, (300, 3)), axis=0),
+                           index=fechas, columns=['A', 'B', 'C'])
+    navs_df.iloc[:40, 1] = np.nan   # fondo que empieza más tarde
+    navs_df.iloc[100, 2] = np.nan   # hueco aislado
+    pesos = {'A': 50, 'B': 30, 'C': 20, 'FUERA': 0}
+
+    cartera = Portfolio(navs_df, pesos)
+
+    esperadas = navs_df.pct_change().mul(pd.Series({'A': 0.5, 'B': 0.3, 'C': 0.2}), axis=1).sum(axis=1)
+    pd.testing.assert_series_equal(cartera.daily_returns, esperadas, check_names=False, rtol=1e-12)
+    pd.testing.assert_series_equal(cartera.nav, (1 + esperadas).cumprod() * 100, check_names=False, rtol=1e-12)
+
+    llamadas = []
+    original = modulo.calcular_metricas_desde_rentabilidades
+    modulo.calcular_metricas_desde_rentabilidades = lambda *a, **k: llamadas.append(1) or original(*a, **k)
+    try:
+        metricas = cartera.calculate_metrics()
+        assert cartera.metrics == metricas and len(llamadas) == 1
+    finally:
+        modulo.calcular_metricas_desde_rentabilidades = original
+    # Cada acceso es una vista sobre el mismo array calculado
+    assert np.shares_memory(cartera.daily_returns.to_numpy(), cartera.daily_returns.to_numpy())
+
+    nav = cartera.nav
+    with pytest.raises(ValueError):
+        nav.iloc[0] = 0
+    with pytest.raises(AttributeError):
+        cartera.metrics = {}
+
+    contribuciones = cartera.contributions
+    assert list(contribuciones.index) == ['A', 'B', 'C']
+    assert contribuciones['return_contribution_%'].sum() == pytest.approx(metricas['annualized_return_%'])
+    assert contribuciones['risk_contribution_%'].sum() == pytest.approx(100)
+
+    assert Portfolio(navs_df, {}).nav is None and Portfolio(navs_df, {}).metrics == {}
+
+
+def test_evaluacion_batch_coincide_con_portfolio():
+    """
+    Evaluar K vectores de pesos de una vez (por bloques) debe dar las
+    mismas rentabilidades y métricas que un Portfolio por cada vector.
+    """
+    import numpy as np
+    from src.portfolio import evaluate_weights_batch, portfolio_returns_batch
+
+    rng = np.random.default_rng(22)
+    fechas = pd.date_range('2023-01-01', periods=400, freq='D')
+    navs_df = pd.DataFrame(100 * np.cumprod(1 + rng.normal(0.0003, 0.01, (400, 4)), axis=0),
+                           index=fechas, columns=['A', 'B', 'C', 'D'])
+    navs_df.iloc[:50, 3] = np.nan
+    pesos = pd.DataFrame(rng.uniform(0, 100, (7, 4)), columns=['D', 'C', 'B', 'A'])
+    pesos.iloc[3] = 0.0  # cartera sin pesos
+
+    rentabilidades = portfolio_returns_batch(navs_df.pct_change(), pesos)
+    metricas = evaluate_weights_batch(navs_df.pct_change(), pesos, chunk_size=3)
+
+    for k in [0, 1, 6]:
+        cartera = Portfolio(navs_df, pesos.iloc[k].to_dict())
+        np.testing.assert_allclose(rentabilidades[k].to_numpy(), cartera.daily_returns.to_numpy(), rtol=1e-12)
+        for clave, valor in cartera.calculate_metrics().items():
+            assert metricas.loc[k, clave] == pytest.approx(valor, rel=1e-9)
+    assert metricas.loc[3].isna().all()
+    pd.testing.assert_frame_equal(metricas, evaluate_weights_batch(navs_df.pct_change(), pesos))
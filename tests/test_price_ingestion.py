@@ -0,0 +1,42 @@
+# tests/test_price_ingestion.py
+
+from datetime import date
+import pandas as pd
+from src.price_ingestion import select_rows_to_write
+
+
+def test_solo_filas_nuevas_o_revisadas():
+    """
+    De todo el histórico descargado solo deben escribirse las fechas posteriores
+    a la marca de agua y las revisadas dentro de la ventana reciente.
+    """
+    descargado = pd.DataFrame({
+        'date': pd.to_datetime(['2025-01-01', '2025-01-02', '2025-01-03', '2025-01-06', '2025-01-07']),
+        'nav': [100.0, 101.0, 102.5, 103.0, 104.0],
+    })
+    # En la BD: hasta el 2025-01-03, con el NAV del día 3 distinto (revisión)
+    guardado = pd.DataFrame({
+        'date': [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 3)],
+        'nav': [100.0, 101.0, 102.0],
+    })
+
+    nuevas, revisadas = select_rows_to_write(descargado, date(2025, 1, 3), guardado, lookback_days=10)
+
+    assert nuevas['date'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-06', '2025-01-07']
+    assert revisadas['date'].dt.strftime('%Y-%m-%d').tolist() == ['2025-01-03']
+    assert revisadas['nav'].tolist() == [102.5]
+
+
+def test_fondo_nuevo_se_escribe_completo():
+    """
+    Sin marca de agua (fondo sin precios en la BD) se escribe todo el histórico.
+    """
+    descargado = pd.DataFrame({
+        'date': pd.to_datetime(['2025-01-02', '2025-01-01', '2025-01-02']),
+        'nav': [101.0, 100.0, 101.5],
+    })
+
+    nuevas, revisadas = select_rows_to_write(descargado, None)
+
+    assert nuevas['nav'].tolist() == [100.0, 101.5]
+    assert revisadas.empty
@@ -0,0 +1,69 @@
+# tests/test_price_reader.py
+
+import struct
+import numpy as np
+import pandas as pd
+import pytest
+from src.price_reader import decode_copy_binary, PriceArrays, PG_EPOCH_OFFSET_DAYS
+
+
+def _copy_binario(filas):
+    """Construye la salida de COPY (FORMAT binary) para filas (code, días PG, nav)."""
+    payload = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+    for code, dias, nav in filas:
+        payload += struct.pack(">hiiiiid", 3, 4, code, 4, dias, 8, nav)
+    return payload + struct.pack(">h", -1)
+
+
+def test_decodificar_copy_binario():
+    """
+    Las filas binarias deben decodificarse a columnas de NumPy sin pérdidas.
+    """
+    # 2025-01-01 son 9132 días desde 2000-01-01
+    payload = _copy_binario([(0, 9132, 101.5), (0, 9133, 102.25), (1, 9132, float('nan'))])
+
+    filas = decode_copy_binary(payload)
+
+    assert filas['code'].tolist() == [0, 0, 1]
+    assert filas['date'].tolist() == [9132, 9133, 9132]
+    assert filas['nav'][:2].tolist() == [101.5, 102.25]
+    assert np.isnan(filas['nav'][2])
+
+    precios = PriceArrays(
+        isins=np.array(['FONDO_A', 'FONDO_B'], dtype=object),
+        codes=filas['code'].astype(np.int32),
+        dates=(filas['date'] + PG_EPOCH_OFFSET_DAYS).astype(np.int32),
+        navs=filas['nav'].astype(np.float64),
+    )
+    df = precios.to_frame()
+    assert df['date'].iloc[0] == pd.Timestamp('2025-01-01')
+    assert df['isin'].tolist() == ['FONDO_A', 'FONDO_A', 'FONDO_B']
+    assert [isin for isin, _, _ in precios.fund_slices()] == ['FONDO_A', 'FONDO_B']
+
+
+def test_decodificar_copy_truncado():
+    """
+    Una salida sin trailer indica un COPY incompleto y debe rechazarse.
+    """
+    payload = _copy_binario([(0, 9131, 101.5)])[:-2]
+    with pytest.raises(ValueError):
+        decode_copy_binary(payload)
+
+
+def test_codificar_copy_binario():
+    """
+    encode_copy_binary debe producir las filas que espera COPY FROM
+    (FORMAT binary): ISIN de texto, fecha en días desde 2000-01-01 y nav.
+    """
+    from src.price_reader import encode_copy_binary, date_to_days
+
+    dias = np.array([date_to_days('2025-01-01'), date_to_days('2025-01-02')], dtype=np.int32)
+    payload = encode_copy_binary([("FONDO_A", dias, np.array([101.5, 102.25]))])
+
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0))
+    assert payload.endswith(struct.pack(">h", -1))
+    fila = ">hi7siiid"
+    cuerpo = payload[19:-2]
+    assert len(cuerpo) == 2 * struct.calcsize(fila)
+    assert struct.unpack(fila, cuerpo[:struct.calcsize(fila)]) == (3, 7, b"FONDO_A", 4, 9132, 8, 101.5)
+    assert struct.unpack(fila, cuerpo[struct.calcsize(fila):])[4:] == (9133, 8, 102.25)
@@ -0,0 +1,60 @@
+# tests/test_rolling_metrics.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.rolling_metrics import (
+    rolling_volatility, rolling_sharpe, rolling_sortino, rolling_drawdown, rolling_beta,
+)
+
+
+@pytest.fixture
+def rentabilidades(rentabilidades_sinteticas):
+    rentabilidades = rentabilidades_sinteticas(400, "ABCD", seed=16, inicio='2020-01-01', calendario='D',
+                                               media=0.0004, primera_fila_nan=False)
+    rentabilidades.iloc[:30, 1] = np.nan   # fondo que empieza más tarde
+    rentabilidades.iloc[200, 2] = np.nan   # hueco aislado
+    return rentabilidades
+
+
+@pytest.mark.parametrize("ventana", [2, 21, 63, 400])
+def test_rolling_coincide_con_pandas(ventana, rentabilidades):
+    """
+    Volatilidad, Sharpe, beta y caída desde el máximo de la ventana deben
+    coincidir con pandas .rolling(), NaN incluidos, para cualquier ventana.
+    """
+    r = rentabilidades
+    cartera = r.mean(axis=1)
+    factor = np.sqrt(252)
+
+    vol = r.rolling(ventana).std() * factor * 100
+    pd.testing.assert_frame_equal(rolling_volatility(r, ventana), vol, rtol=1e-8, atol=1e-10)
+
+    sharpe = (r.rolling(ventana).mean() * 252 - 0.02) / (r.rolling(ventana).std() * factor)
+    pd.testing.assert_frame_equal(rolling_sharpe(r, ventana, risk_free_rate=0.02), sharpe, rtol=1e-8, atol=1e-10)
+
+    beta = r.rolling(ventana).cov(cartera).div(cartera.rolling(ventana).var(), axis=0)
+    beta = beta.where(r.rolling(ventana).count() == ventana)
+    pd.testing.assert_frame_equal(rolling_beta(r, cartera, ventana), beta, rtol=1e-7, atol=1e-10)
+
+    completas = r.dropna()
+    nav = (1 + completas).cumprod()
+    caida = (nav / nav.rolling(ventana).max() - 1) * 100
+    pd.testing.assert_frame_equal(rolling_drawdown(completas, ventana), caida, rtol=1e-10, atol=1e-10)
+
+
+def test_rolling_sortino_coincide_con_la_definicion(rentabilidades):
+    """
+    El Sortino móvil debe coincidir con la desviación a la baja de
+    calcular_metricas_desde_rentabilidades aplicada a cada ventana.
+    """
+    r = rentabilidades[["A"]]
+    ventana = 30
+    resultado = rolling_sortino(r, ventana)
+
+    for fin in [ventana - 1, 100, 399]:
+        tramo = r["A"].iloc[fin - ventana + 1:fin + 1]
+        negativas = tramo[tramo < 0]
+        esperado = tramo.mean() * 252 / (negativas.std() * np.sqrt(252))
+        assert resultado["A"].iloc[fin] == pytest.approx(esperado, rel=1e-9)
+    assert resultado["A"].iloc[:ventana - 1].isna().all()
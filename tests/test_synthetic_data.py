@@ -0,0 +1,30 @@
+# tests/test_synthetic_data.py
+
+import numpy as np
+from src.synthetic_data import synthetic_price_arrays, synthetic_catalog
+
+
+def test_generador_sintetico_reproducible_y_realista():
+    """
+    Con la misma semilla los precios son idénticos; los fondos empiezan en
+    fechas distintas, tienen huecos y vienen ordenados como read_prices.
+    """
+    precios = synthetic_price_arrays(50, years=3, seed=7)
+    otra_vez = synthetic_price_arrays(50, years=3, seed=7)
+    for campo in ("isins", "codes", "dates", "navs"):
+        np.testing.assert_array_equal(getattr(precios, campo), getattr(otra_vez, campo))
+    assert not np.array_equal(precios.navs[:100], synthetic_price_arrays(50, years=3, seed=8).navs[:100])
+
+    assert list(precios.isins) == sorted(precios.isins)
+    assert np.all(np.diff(precios.codes) >= 0)
+    inicios, huecos = set(), 0
+    for isin, fechas, navs in precios.fund_slices():
+        assert np.all(np.diff(fechas) > 0) and np.all(navs > 0)
+        inicios.add(int(fechas[0]))
+        huecos += int(np.sum(np.diff(fechas) > 4))  # más que un fin de semana largo
+    assert len(inicios) > 10
+    assert huecos > 0
+
+    catalogo = synthetic_catalog(50, seed=7)
+    assert list(catalogo['isin']) == list(precios.isins)
+    assert catalogo['srri'].between(1, 7).all()
@@ -0,0 +1,71 @@
+# tools/bench_align_navs.py
+"""
+Benchmark de la alineación de NAVs: bucle por ISIN (implementación previa de
+load_all_navs) frente a align_navs, sobre el catálogo sintético de
+src.synthetic_data. Comprueba además que ambas salidas son idénticas.
+legacy_align_navs es también la referencia de tests/test_navs.py.
+
+Uso:
+    python tools/bench_align_navs.py --funds 10 500 5000 --years 5
+"""
+
+import sys
+import os
+import time
+import argparse
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.navs import align_navs
+from src.synthetic_data import synthetic_price_arrays
+
+
+def legacy_align_navs(df: pd.DataFrame) -> pd.DataFrame:
+    """Implementación original con groupby + date_range + concat por ISIN."""
+    df = df.copy()
+    df['date'] = pd.to_datetime(df['date'])
+    max_date = df['date'].max()
+
+    all_navs_resampled = []
+    for isin, group in df.groupby('isin'):
+        fund_navs = group.set_index('date')[['nav']]
+        daily_index = pd.date_range(start=fund_navs.index.min(), end=max_date, freq='D')
+        resampled = fund_navs.reindex(daily_index).ffill()
+        resampled.rename(columns={'nav': isin}, inplace=True)
+        all_navs_resampled.append(resampled)
+
+    final_df = pd.concat(all_navs_resampled, axis=1, sort=True)
+    final_df.index.name = 'date'
+    return final_df.ffill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de align_navs frente al bucle por ISIN.")
+    parser.add_argument('--funds', type=int, nargs='+', default=[10, 500, 5000])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--skip-legacy-above', type=int, default=None,
+                        help="No ejecuta el bucle original por encima de este número de fondos.")
+    args = parser.parse_args()
+
+    print(f"{'fondos':>8} {'filas':>10} {'bucle (s)':>10} {'align (s)':>10} {'speedup':>8}")
+    for n_funds in args.funds:
+        prices = synthetic_price_arrays(n_funds, args.years).to_frame()
+
+        t0 = time.perf_counter()
+        aligned = align_navs(prices)
+        t_new = time.perf_counter() - t0
+
+        if args.skip_legacy_above is not None and n_funds > args.skip_legacy_above:
+            print(f"{n_funds:>8} {len(prices):>10} {'-':>10} {t_new:>10.3f} {'-':>8}")
+            continue
+
+        t0 = time.perf_counter()
+        legacy = legacy_align_navs(prices)
+        t_old = time.perf_counter() - t0
+
+        pd.testing.assert_frame_equal(legacy, aligned, check_freq=False)
+        print(f"{n_funds:>8} {len(prices):>10} {t_old:>10.3f} {t_new:>10.3f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# tools/bench_async_loader.py
+"""
+Benchmark de la carga de precios: una sola consulta COPY (read_prices) frente
+a la carga concurrente por bloques (read_prices_concurrent), sobre datos
+sintéticos en un esquema aparte (`bench`) de la base de datos configurada,
+cargados con tools/synthetic_loader.py (src.synthetic_data) como los del
+resto de benchmarks.
+Comprueba además que ambas lecturas devuelven exactamente los mismos arrays.
+
+Uso:
+    python tools/bench_async_loader.py --funds 5000 --years 10 --concurrency 2 4 8
+    python tools/bench_async_loader.py --drop   # elimina el esquema bench
+"""
+
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+BENCH_SCHEMA = "bench"
+# Todas las conexiones del pool (también las de los hilos) usan el esquema bench
+os.environ["PGOPTIONS"] = f"{os.environ.get('PGOPTIONS', '')} -c search_path={BENCH_SCHEMA}".strip()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db_connector import db_connection
+from src.price_reader import read_prices
+from src.async_price_loader import read_prices_concurrent
+from tools.synthetic_loader import prepare_schema, load_prices_and_metrics
+
+
+def seed(conn, funds: int, years: int, seed: int):
+    """Mismos datos que tools/synthetic_loader.py (solo precios) en el esquema bench."""
+    print(f"Generando {funds} fondos x {years} años de precios en el esquema '{BENCH_SCHEMA}'...")
+    prepare_schema(conn, BENCH_SCHEMA)
+    with conn.cursor() as cursor:
+        # Datos regenerables: no hace falta esperar al WAL en cada commit
+        cursor.execute("SET synchronous_commit = off")
+    load_prices_and_metrics(conn, funds, years, seed, chunk_funds=200, with_metrics=False)
+    with conn.cursor() as cursor:
+        cursor.execute("ANALYZE historical_prices")
+    conn.commit()
+
+
+def bench_isins(conn) -> list:
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT isin FROM {BENCH_SCHEMA}.historical_prices ORDER BY isin")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def best_of(repeat: int, fn):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de read_prices frente a read_prices_concurrent.")
+    parser.add_argument('--funds', type=int, default=5000)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--reseed', action='store_true', help="Regenera los datos aunque ya existan.")
+    parser.add_argument('--drop', action='store_true', help="Elimina el esquema de benchmark y termina.")
+    args = parser.parse_args()
+
+    with db_connection() as conn:
+        if not conn:
+            exit(1)
+        if args.drop:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+            conn.commit()
+            print(f"✅ Esquema '{BENCH_SCHEMA}' eliminado.")
+            return
+
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", (f"{BENCH_SCHEMA}.historical_prices",))
+            exists = cursor.fetchone()[0] is not None
+        if args.reseed or not exists:
+            seed(conn, args.funds, args.years, args.seed)
+        isins = bench_isins(conn)
+
+        t_single, single = best_of(args.repeat, lambda: read_prices(conn, isins))
+        conn.rollback()
+
+    print(f"\n{len(isins)} ISINs, {len(single)} filas, bloques de {args.chunk_size} ISINs")
+    print(f"{'modo':>18} {'tiempo (s)':>11} {'filas/s':>12} {'speedup':>8}")
+    print(f"{'una consulta':>18} {t_single:>11.3f} {len(single) / t_single:>12,.0f} {'1.0x':>8}")
+
+    for concurrency in args.concurrency:
+        t_conc, result = best_of(args.repeat, lambda: read_prices_concurrent(
+            isins, chunk_size=args.chunk_size, concurrency=concurrency))
+        for field in ("isins", "codes", "dates", "navs"):
+            np.testing.assert_array_equal(getattr(single, field), getattr(result, field))
+        label = f"concurrente x{concurrency}"
+        print(f"{label:>18} {t_conc:>11.3f} {len(result) / t_conc:>12,.0f} {t_single / t_conc:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# tools/bench_compact_navs.py
+"""
+Benchmark de memoria del modo compacto del constructor: matriz diaria float64
+(align_navs + filtrar + pct_change) frente a la matriz float32 de días
+hábiles con rentabilidades in place, sobre el catálogo sintético de
+src.synthetic_data. Mide el pico de memoria con tracemalloc y el error
+máximo de la rentabilidad anualizada entre ambos modos sobre el mismo
+calendario hábil.
+
+Uso:
+    python tools/bench_compact_navs.py --funds 1000 5000 --years 10 --horizon 5y
+"""
+
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.navs import align_navs, horizon_start
+from src.price_reader import PriceArrays
+from src.compact_navs import build_compact_navs, slice_horizon, returns_inplace
+from src.synthetic_data import synthetic_price_arrays
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 ** 2, seconds
+
+
+def float64_pipeline(prices: PriceArrays, horizonte: str) -> pd.DataFrame:
+    navs = align_navs(prices.to_frame())
+    start = horizon_start(horizonte, navs.index.max())
+    navs = navs.loc[start:] if start is not None else navs
+    return navs.pct_change()
+
+
+def compact_pipeline(prices: PriceArrays, horizonte: str) -> np.ndarray:
+    matrix = slice_horizon(build_compact_navs(prices), horizonte)
+    return matrix.dates, returns_inplace(matrix.values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria del modo compacto frente a float64 diario.")
+    parser.add_argument('--funds', type=int, nargs='+', default=[1000, 5000])
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--horizon', type=str, default="5y")
+    args = parser.parse_args()
+
+    print(f"{'fondos':>8} {'float64 MB':>11} {'compacto MB':>12} {'ratio':>6} {'t64 (s)':>8} {'t32 (s)':>8} {'err. anual':>11}")
+    for n_funds in args.funds:
+        prices = synthetic_price_arrays(n_funds, args.years)
+
+        returns64, peak64, t64 = _measure(lambda: float64_pipeline(prices, args.horizon))
+        (dates, returns32), peak32, t32 = _measure(lambda: compact_pipeline(prices, args.horizon))
+
+        # Error de precisión: mismo calendario hábil, float64 frente a float32
+        reference = returns64.reindex(pd.DatetimeIndex(dates).as_unit(returns64.index.unit))
+        reference.iloc[0] = np.nan
+        ann_error = np.nanmax(np.abs(
+            np.nanmean(returns32.astype(float), axis=0) - np.nanmean(reference.to_numpy(), axis=0)
+        )) * 252
+
+        print(f"{n_funds:>8} {peak64:>11.1f} {peak32:>12.1f} {peak32 / peak64:>6.2f} "
+              f"{t64:>8.2f} {t32:>8.2f} {ann_error:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# tools/benchmark_suite.py
+"""
+Suite de benchmarks de las rutas críticas (load_all_navs, filtrar_por_horizonte,
+métricas, Portfolio, carteras en lote, aportaciones en lote, Monte Carlo, optimize_portfolio) sobre catálogos sintéticos de
+src/synthetic_data.py. Funciona sin red ni base de datos: load_all_navs
+recibe un DataManager falso que sirve los precios sintéticos.
+
+Para cada caso y escala mide el mejor tiempo de `--repeat` ejecuciones y,
+en una ejecución aparte, el pico de memoria con tracemalloc. Compara con un
+baseline JSON (tools/benchmark_baseline.json, versionado) y termina con
+código 1 si algún caso empeora más de `--tolerance` o si no hay baseline. Los casos cuya dependencia no está instalada se omiten.
+
+Uso:
+    python tools/benchmark_suite.py --save-baseline            # guarda el baseline de esta máquina
+    python tools/benchmark_suite.py                            # compara con el baseline
+    python tools/benchmark_suite.py --scales 10 1000 --years 5 --only metricas_serie portfolio
+"""
+
+import sys
+import os
+import gc
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.price_reader import PriceArrays
+from src.synthetic_data import synthetic_price_arrays
+from src.navs import align_navs
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+PORTFOLIO_FUNDS = 20
+# Vectores de pesos evaluados a la vez en el caso portfolio_batch
+BATCH_PORTFOLIOS = 2000
+# Planes de aportación simulados a la vez en el caso cashflows_batch
+BATCH_CASHFLOW_PLANS = 500
+# Trayectorias a 10 años del caso montecarlo
+MONTECARLO_BENCH_PATHS = 5000
+# Diferencias de tiempo por debajo de esto son ruido, aunque el cociente sea grande
+MIN_TIME_DELTA_SECONDS = 0.005
+
+
+def subset_prices(prices: PriceArrays, isins) -> PriceArrays:
+    """Las filas de `isins` (ordenados) de unos PriceArrays, con los códigos renumerados."""
+    isins = np.asarray(sorted(set(isins)), dtype=object)
+    wanted = np.searchsorted(prices.isins, isins)
+    remap = np.full(len(prices.isins), -1, dtype=np.int32)
+    remap[wanted] = np.arange(len(wanted), dtype=np.int32)
+    codes = remap[prices.codes]
+    mask = codes >= 0
+    return PriceArrays(isins, codes[mask], prices.dates[mask], prices.navs[mask])
+
+
+class SyntheticDataManager:
+    """Lo mínimo de DataManager que usa load_all_navs, servido desde memoria."""
+    def __init__(self, prices: PriceArrays):
+        self.prices = prices
+
+    def horizon_start_date(self, isins, horizonte):
+        return None
+
+    def load_prices(self, isins, start_date=None) -> PriceArrays:
+        return subset_prices(self.prices, isins)
+
+
+# --- Casos: cada uno recibe el contexto de la escala y devuelve la función a medir ---
+
+def case_load_all_navs(ctx):
+    from src.utils import load_all_navs
+    from src.nav_cache import get_nav_cache
+    data_manager = SyntheticDataManager(ctx["prices"])
+    isins = tuple(ctx["prices"].isins)
+
+    def run():
+        get_nav_cache().clear()  # carga en frío
+        return load_all_navs(data_manager, isins)
+    return run
+
+
+def case_filtrar_por_horizonte(ctx):
+    from src.data_manager import filtrar_por_horizonte
+    return lambda: filtrar_por_horizonte(ctx["navs"], "3y")
+
+
+def case_metricas_serie(ctx):
+    from src.metrics import calcular_metricas_desde_rentabilidades
+    columns = [ctx["returns"][isin].dropna() for isin in ctx["returns"].columns]
+    return lambda: [calcular_metricas_desde_rentabilidades(series) for series in columns]
+
+
+def case_metricas_batch(ctx):
+    from src.metrics import calcular_metricas_batch
+    return lambda: calcular_metricas_batch(ctx["returns"])
+
+
+def case_portfolio(ctx):
+    from src.portfolio import Portfolio
+    navs = ctx["navs"].iloc[:, :PORTFOLIO_FUNDS]
+    weights = {isin: 100 / navs.shape[1] for isin in navs.columns}
+
+    def run():
+        portfolio = Portfolio(navs, weights)
+        return portfolio.nav, portfolio.calculate_metrics()
+    return run
+
+
+def case_portfolio_batch(ctx):
+    from src.portfolio import evaluate_weights_batch
+    returns = ctx["returns"].iloc[:, :PORTFOLIO_FUNDS]
+    weights = np.random.default_rng(0).dirichlet(np.ones(returns.shape[1]), BATCH_PORTFOLIOS)
+    return lambda: evaluate_weights_batch(returns, weights)
+
+
+def case_cashflows_batch(ctx):
+    from src.cashflows import CashflowPlan, CASHFLOW_FREQUENCIES, run_cashflows
+    returns = ctx["returns"].iloc[:, :PORTFOLIO_FUNDS].fillna(0).mean(axis=1)
+    rng = np.random.default_rng(0)
+    plans = [CashflowPlan(10000, float(amount), str(frequency)) for amount, frequency in
+             zip(rng.uniform(-300, 1000, BATCH_CASHFLOW_PLANS), rng.choice(CASHFLOW_FREQUENCIES, BATCH_CASHFLOW_PLANS))]
+    return lambda: run_cashflows(returns, plans)
+
+
+def case_montecarlo(ctx):
+    from src.montecarlo import run_montecarlo
+    returns = ctx["returns"].iloc[:, :PORTFOLIO_FUNDS]
+    weights = {isin: 100 / returns.shape[1] for isin in returns.columns}
+    return lambda: run_montecarlo(returns, weights, years=10, n_paths=MONTECARLO_BENCH_PATHS, seed=0)
+
+
+def case_optimize_portfolio(ctx):
+    from src.optimizer import optimize_portfolio
+    returns = ctx["returns"].iloc[-756:, :PORTFOLIO_FUNDS].dropna(axis=1).fillna(0)
+    return lambda: optimize_portfolio(returns, model="MV")
+
+
+CASES = {
+    "load_all_navs": case_load_all_navs,
+    "filtrar_por_horizonte": case_filtrar_por_horizonte,
+    "metricas_serie": case_metricas_serie,
+    "metricas_batch": case_metricas_batch,
+    "portfolio": case_portfolio,
+    "portfolio_batch": case_portfolio_batch,
+    "cashflows_batch": case_cashflows_batch,
+    "montecarlo": case_montecarlo,
+    "optimize_portfolio": case_optimize_portfolio,
+}
+
+
+def measure(fn, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 1024 ** 2}
+
+
+def run_suite(scales, years: int, repeat: int, only=None, seed: int = 42) -> dict:
+    results = {}
+    for n_funds in scales:
+        print(f"\n📦 Generando {n_funds} fondos x {years} años (semilla {seed})...")
+        prices = synthetic_price_arrays(n_funds, years=years, seed=seed)
+        navs = align_navs(prices.to_frame())
+        ctx = {"prices": prices, "navs": navs, "returns": navs.pct_change()}
+        print(f"   {len(prices):,} precios, matriz {navs.shape[0]} días x {navs.shape[1]} fondos")
+
+        for name, build in CASES.items():
+            if only and name not in only:
+                continue
+            key = f"{name}@{n_funds}"
+            try:
+                fn = build(ctx)
+            except ImportError as e:
+                print(f"   ⏭️ {key:<28} omitido (falta dependencia: {e.name})")
+                continue
+            results[key] = measure(fn, repeat)
+            print(f"   ⏱️ {key:<28} {results[key]['seconds']:>9.4f}s {results[key]['peak_mb']:>9.1f} MB")
+        del ctx, navs, prices
+        gc.collect()
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Devuelve los casos que empeoran más de `tolerance` (en tiempo o memoria) frente al baseline."""
+    regressions = []
+    print(f"\n{'caso':<30} {'tiempo':>9} {'vs base':>8} {'memoria':>9} {'vs base':>8}")
+    for key, current in results.items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            print(f"{key:<30} {current['seconds']:>8.4f}s {'nuevo':>8} {current['peak_mb']:>7.1f}MB {'nuevo':>8}")
+            continue
+        time_ratio = current["seconds"] / base["seconds"] if base["seconds"] else np.nan
+        mem_ratio = current["peak_mb"] / base["peak_mb"] if base["peak_mb"] else np.nan
+        flag = ""
+        slower = time_ratio > 1 + tolerance and current["seconds"] - base["seconds"] > MIN_TIME_DELTA_SECONDS
+        if slower or mem_ratio > 1 + tolerance:
+            regressions.append(key)
+            flag = " ⚠️"
+        print(f"{key:<30} {current['seconds']:>8.4f}s {time_ratio:>7.2f}x "
+              f"{current['peak_mb']:>7.1f}MB {mem_ratio:>7.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de las rutas críticas con datos sintéticos.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='+', choices=list(CASES), help="Ejecuta solo estos casos.")
+    parser.add_argument('--baseline', type=str, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Guarda los resultados como nuevo baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Empeoramiento permitido (0.25 = +25%%).")
+    args = parser.parse_args()
+
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        # Sin baseline no hay nada con qué comparar: se falla antes de medir
+        sys.exit(f"❌ No hay baseline en {args.baseline}. Ejecuta con --save-baseline para crearlo.")
+
+    results = run_suite(args.scales, args.years, args.repeat, only=args.only, seed=args.seed)
+    machine = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+    if args.save_baseline:
+        payload = {"machine": machine, "years": args.years, "seed": args.seed, "results": results}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        print(f"\n✅ Baseline guardado en {args.baseline}")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine or baseline.get("years") != args.years or baseline.get("seed") != args.seed:
+        print("\n⚠️ El baseline se generó en otra máquina o con otros parámetros: la comparación es orientativa.")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ {len(regressions)} caso(s) empeoran más de un {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\n✅ Sin regresiones frente al baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ import json
 import argparse
 from datetime import datetime, date, timedelta, timezone
 from playwright.sync_api import sync_playwright
+import numpy as np
 import pandas as pd
 import time
 import random
@@ -14,11 +15,9 @@ import random
 # Añadimos las herramientas necesarias para el cálculo de métricas
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from src.catalog_operations import scrape_fund_data
-from src.db_connector import get_db_connection
-from psycopg2.extras import execute_values
-from src.metrics import calcular_metricas_desde_rentabilidades
-from src.data_manager import filtrar_por_horizonte
-from src.config import HORIZONTE_OPCIONES
+from src.db_connector import get_db_connection, db_connection
+from src.price_ingestion import ingest_prices
+from src.metrics_pipeline import MetricsWriter, compute_metrics_parallel, fund_metric_rows
 
 METADATA_REFRESH_DAYS = int(os.getenv("CATALOG_METADATA_REFRESH_DAYS", "7"))
 PRICE_REFRESH_DAYS = int(os.getenv("CATALOG_PRICE_REFRESH_DAYS", "2"))
@@ -74,14 +73,17 @@ def save_fund_data(conn, metadata, prices_df):
                 metadata.get('currency')
             )
             cursor.execute(sql_query, data_tuple)
-            if prices_df is not None and not prices_df.empty:
-                data_to_insert = [(metadata['isin'], row['date'].date(), row['nav']) for _, row in prices_df.iterrows()]
-                execute_values(cursor, "INSERT INTO historical_prices (isin, date, nav) VALUES %s ON CONFLICT (isin, date) DO NOTHING", data_to_insert)
-            conn.commit()
-            print(f"  -> ✅ Metadatos y precios de {metadata['isin']} guardados en la base de datos.")
+        # Solo filas nuevas (posteriores a MAX(date)) o revisadas, vía COPY + merge
+        stats = ingest_prices(conn, metadata['isin'], prices_df)
+        conn.commit()
+        print(f"  -> ✅ Metadatos y precios de {metadata['isin']} guardados en la base de datos.")
+        print(f"  -> 📈 Precios: {stats['received']} recibidos, {stats['new']} nuevos, "
+              f"{stats['revised']} revisados, {stats['written']} escritos en {stats['seconds']:.2f}s.")
+        return stats
     except Exception as e:
         print(f"  -> ❌ ERROR DE BASE DE DATOS al guardar metadatos/precios: {e}")
         conn.rollback()
+        return None
 
 
 def _normalize_datetime(value):
@@ -165,53 +167,21 @@ def calculate_and_save_metrics(conn, isin: str, prices_df: pd.DataFrame):
         return
 
     print("  -> Calculando métricas para los diferentes horizontes...")
-    
-    # Preparamos los datos para el cálculo
-    # Hacemos una copia para no modificar el DataFrame original
-    prices_df_copy = prices_df.copy()
-    prices_df_copy.set_index('date', inplace=True)
-    daily_returns = prices_df_copy['nav'].pct_change().dropna()
-    
-    metrics_to_insert = []
-    for horizonte in HORIZONTE_OPCIONES:
-        filtered_returns = filtrar_por_horizonte(pd.DataFrame(daily_returns), horizonte)['nav']
-        if len(filtered_returns) < 2: continue
-
-        metrics = calcular_metricas_desde_rentabilidades(filtered_returns)
-        metrics_to_insert.append((
-            isin, horizonte,
-            metrics.get('annualized_return_%'), metrics.get('cumulative_return_%'),
-            metrics.get('volatility_ann_%'), metrics.get('sharpe_ann'),
-            metrics.get('sortino_ann'), metrics.get('max_drawdown_%')
-        ))
-
-    # Limpiamos los datos para la BBDD (convierte NaN a None, etc.)
-    cleaned_metrics = []
-    for m in metrics_to_insert:
-        cleaned_tuple = tuple(float(v) if pd.notna(v) else None for v in m[2:])
-        cleaned_metrics.append((m[0], m[1]) + cleaned_tuple)
-
-    if not cleaned_metrics:
+
+    # Mismo cálculo que el worker de métricas (todas las columnas de fund_metrics)
+    prices = prices_df.dropna(subset=['nav']).sort_values('date')
+    dates = pd.to_datetime(prices['date']).values.astype('datetime64[D]').astype(np.int32)
+    metric_rows = fund_metric_rows(isin, dates, prices['nav'].to_numpy(dtype=np.float64))
+
+    if not metric_rows:
         print("  -> No se generaron métricas para guardar.")
         return
 
     try:
-        with conn.cursor() as cursor:
-            execute_values(
-                cursor,
-                """
-                INSERT INTO fund_metrics (isin, horizon, annualized_return_pct, cumulative_return_pct, volatility_pct, sharpe_ratio, sortino_ratio, max_drawdown_pct)
-                VALUES %s
-                ON CONFLICT (isin, horizon) DO UPDATE SET
-                    annualized_return_pct = EXCLUDED.annualized_return_pct, cumulative_return_pct = EXCLUDED.cumulative_return_pct,
-                    volatility_pct = EXCLUDED.volatility_pct, sharpe_ratio = EXcluded.sharpe_ratio,
-                    sortino_ratio = EXCLUDED.sortino_ratio, max_drawdown_pct = EXCLUDED.max_drawdown_pct,
-                    last_calculated = NOW();
-                """,
-                cleaned_metrics
-            )
-            conn.commit()
-            print(f"  -> ✅ {cursor.rowcount} registros de métricas guardados en la base de datos.")
+        writer = MetricsWriter(conn)
+        writer.add(metric_rows)
+        writer.flush()
+        print(f"  -> ✅ {writer.written} registros de métricas guardados en la base de datos.")
     except Exception as e:
         print(f"  -> ❌ ERROR DE BASE DE DATOS al guardar métricas: {e}")
         conn.rollback()
@@ -224,6 +194,8 @@ def main():
     parser.add_argument('--update-existing', action='store_true', help="Refresca los datos de todos los fondos existentes en el catálogo.")
     # NUEVO ARGUMENTO
     parser.add_argument('--update-isin', type=str, help="Actualiza los datos de un único fondo especificado por su ISIN.")
+    parser.add_argument('--metrics-jobs', type=int, default=0,
+                        help="Calcula las métricas al final, en paralelo con N procesos, en lugar de fondo a fondo durante el scraping.")
     args = parser.parse_args()
 
     isins_to_process = []
@@ -263,23 +235,22 @@ def main():
     print(f"Se encontraron {len(isins_to_process)} ISINs para analizar.")
 
     filtered_isins = []
-    for isin in isins_to_process:
-        conn = get_db_connection()
-        if not conn:
-            print(f"  -> ⚠️ No se pudo conectar a la base de datos para verificar {isin}. Se procederá con el scraping.")
-            filtered_isins.append(isin)
-            continue
-
-        skip, message = should_skip_fund(conn, isin)
-        print(message)
+    # Una única conexión del pool para todas las comprobaciones de frescura
+    with db_connection() as conn:
+        for isin in isins_to_process:
+            if not conn:
+                print(f"  -> ⚠️ No se pudo conectar a la base de datos para verificar {isin}. Se procederá con el scraping.")
+                filtered_isins.append(isin)
+                continue
 
-        if skip:
-            if isin in request_map:
-                update_request_status(conn, request_map[isin], 'processed')
-        else:
-            filtered_isins.append(isin)
+            skip, message = should_skip_fund(conn, isin)
+            print(message)
 
-        conn.close()
+            if skip:
+                if isin in request_map:
+                    update_request_status(conn, request_map[isin], 'processed')
+            else:
+                filtered_isins.append(isin)
 
     isins_to_process = filtered_isins
 
@@ -290,6 +261,8 @@ def main():
     print(f"Se procesarán {len(isins_to_process)} ISINs tras filtrar los que ya estaban al día.")
 
 
+    ingestion_stats = []
+    deferred_metrics_isins = []
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
@@ -301,10 +274,15 @@ def main():
             conn = get_db_connection()
             if conn and fund_data:
                 # 1. Guardar metadatos y precios
-                save_fund_data(conn, fund_data['metadata'], fund_data['prices'])
+                stats = save_fund_data(conn, fund_data['metadata'], fund_data['prices'])
+                if stats:
+                    ingestion_stats.append(stats)
 
                 # 2. CALCULAR Y GUARDAR MÉTRICAS (NUEVO PASO)
-                calculate_and_save_metrics(conn, isin, fund_data['prices'])
+                if args.metrics_jobs > 0:
+                    deferred_metrics_isins.append(isin)
+                else:
+                    calculate_and_save_metrics(conn, isin, fund_data['prices'])
 
                 # 3. Actualizar estado de la petición (si aplica)
                 if isin in request_map:
@@ -322,6 +300,30 @@ def main():
 
         browser.close()
 
+    if ingestion_stats:
+        total_written = sum(s['written'] for s in ingestion_stats)
+        total_received = sum(s['received'] for s in ingestion_stats)
+        total_seconds = sum(s['seconds'] for s in ingestion_stats)
+        print(f"\n📊 Ingesta de precios: {total_written} filas escritas de {total_received} recibidas "
+              f"en {len(ingestion_stats)} fondos ({total_seconds:.1f}s en base de datos).")
+
+    if deferred_metrics_isins:
+        print(f"\nCalculando métricas de {len(deferred_metrics_isins)} fondos con {args.metrics_jobs} procesos...")
+        conn = get_db_connection()
+        if conn:
+            t0 = time.perf_counter()
+            try:
+                writer = MetricsWriter(conn)
+                processed = compute_metrics_parallel(deferred_metrics_isins, writer, args.metrics_jobs)
+                elapsed = time.perf_counter() - t0
+                print(f"  -> ✅ {writer.written} registros de métricas de {processed} fondos guardados "
+                      f"en {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} fondos/s).")
+            except Exception as e:
+                print(f"  -> ❌ ERROR al calcular las métricas en paralelo: {e}")
+                conn.rollback()
+            finally:
+                conn.close()
+
     print("\n--- Worker finalizado ---")
 
 if __name__ == "__main__":
@@ -1,128 +1,88 @@
 # tools/metrics_worker.py
+"""
+Calcula las métricas de fund_metrics. Por defecto solo recalcula los fondos
+con precios posteriores al último usado en su cálculo, leyendo los precios en streaming
+(un fondo en memoria cada vez) y guardando por lotes (ver src/metrics_pipeline.py).
+
+Uso:
+    python tools/metrics_worker.py                     # solo fondos con precios nuevos
+    python tools/metrics_worker.py --since 2025-01-01  # fondos con precios desde esa fecha
+    python tools/metrics_worker.py --full              # recalcula todo el catálogo
+    python tools/metrics_worker.py --full --jobs 8     # en paralelo con 8 procesos
+"""
 
 import sys
 import os
-import pandas as pd
-import numpy as np # <-- Importamos numpy para el manejo de tipos
+import time
+import argparse
+from datetime import date
 
 # Añadimos el directorio raíz al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.db_connector import get_db_connection
-from src.metrics import calcular_metricas_desde_rentabilidades
-from src.data_manager import filtrar_por_horizonte
-from src.config import HORIZONTE_OPCIONES
-from psycopg2.extras import execute_values
+from src.db_connector import get_db_connection, db_connection
+from src.metrics_pipeline import (
+    read_metrics_freshness, select_dirty_isins, compute_metrics_streaming, compute_metrics_parallel, MetricsWriter,
+)
 
-print("--- Iniciando Worker de Cálculo de Métricas ---")
 
-# --- 1. CONECTAR A LA BASE DE DATOS Y OBTENER DATOS ---
-conn = get_db_connection()
-if not conn:
-    exit()
+def main():
+    parser = argparse.ArgumentParser(description="Calcula las métricas de fund_metrics para los fondos con precios nuevos.")
+    parser.add_argument('--since', type=date.fromisoformat, help="Recalcula los fondos con precios en esta fecha (AAAA-MM-DD) o posteriores.")
+    parser.add_argument('--full', action='store_true', help="Recalcula las métricas de todo el catálogo.")
+    parser.add_argument('--jobs', type=int, default=1, help="Procesos de cálculo en paralelo (1 = streaming en este proceso).")
+    args = parser.parse_args()
 
-try:
-    print("Leyendo catálogo de fondos y precios históricos...")
-    funds_df = pd.read_sql("SELECT isin FROM funds", conn)
-    prices_df = pd.read_sql("SELECT isin, date, nav FROM historical_prices", conn, index_col='date', parse_dates=['date'])
-    
-    if funds_df.empty or prices_df.empty:
-        print("No hay fondos o precios para calcular métricas. Finalizando.")
-        exit()
-
-    print(f"✅ Se procesarán métricas para {len(funds_df)} fondos.")
-
-except Exception as e:
-    print(f"❌ Error al leer datos de la base de datos: {e}")
-    exit()
-finally:
-    if conn:
-        conn.close()
-
-# --- 2. CALCULAR MÉTRICAS ---
-all_metrics_to_insert = []
-for isin in funds_df['isin']:
-    fund_prices = prices_df[prices_df['isin'] == isin]['nav']
-    if fund_prices.empty or len(fund_prices) < 2:
-        continue
-
-    fund_prices_df = pd.DataFrame(fund_prices)
-
-    # --- Remuestrear a diario para consistencia con el comparador ---
-    daily_index = pd.date_range(start=fund_prices_df.index.min(), end=fund_prices_df.index.max(), freq='D')
-    resampled_prices = fund_prices_df.reindex(daily_index).ffill()
-
-    for horizonte in HORIZONTE_OPCIONES:
-        # 1. Filtrar los precios REMUESTREADOS por el horizonte temporal
-        filtered_prices = filtrar_por_horizonte(resampled_prices, horizonte)['nav']
-        if len(filtered_prices) < 2:
-            continue
-
-        # 2. Calcular los retornos sobre los precios ya filtrados y remuestreados
-        filtered_returns = filtered_prices.pct_change().dropna()
-
-        # Asumimos una tasa libre de riesgo de 0.0 para el cálculo de métricas
-        metrics = calcular_metricas_desde_rentabilidades(filtered_returns, risk_free_rate=0.0)
-
-        
-        all_metrics_to_insert.append((
-            isin,
-            horizonte,
-            metrics.get('annualized_return_%'),
-            metrics.get('cumulative_return_%'),
-            metrics.get('volatility_ann_%'),
-            metrics.get('sharpe_ann'),
-            metrics.get('sortino_ann'),
-            metrics.get('max_drawdown_%'),
-            metrics.get('calmar_ratio')
-        ))
-
-print(f"Se han calculado un total de {len(all_metrics_to_insert)} conjuntos de métricas.")
+    print("--- Iniciando Worker de Cálculo de Métricas ---")
 
-# --- 3. LIMPIAR E INSERTAR MÉTRICAS ---
-if all_metrics_to_insert:
-    
-    # --- SOLUCIÓN CLAVE: LIMPIEZA DE DATOS ---
-    # Convertimos los tipos de numpy a tipos nativos de Python que la BD entiende.
-    cleaned_metrics = []
-    for metric_tuple in all_metrics_to_insert:
-        cleaned_tuple = tuple(
-            # Si es un número de numpy, lo convierte a float de Python.
-            # Si es NaN, lo convierte a None (que en SQL es NULL).
-            float(val) if pd.notna(val) else None
-            for val in metric_tuple[2:] # Solo aplicamos a las columnas numéricas
-        )
-        # Reconstruimos la tupla con el isin y el horizonte
-        cleaned_metrics.append( (metric_tuple[0], metric_tuple[1]) + cleaned_tuple )
-    
+    # --- 1. CONECTAR A LA BASE DE DATOS Y OBTENER DATOS ---
     conn = get_db_connection()
     if not conn:
         exit()
+
     try:
-        with conn.cursor() as cursor:
-            execute_values(
-                cursor,
-                """
-                INSERT INTO fund_metrics (isin, horizon, annualized_return_pct, cumulative_return_pct, volatility_pct, sharpe_ratio, sortino_ratio, max_drawdown_pct, calmar_ratio)
-                VALUES %s
-                ON CONFLICT (isin, horizon) DO UPDATE SET
-                    annualized_return_pct = EXCLUDED.annualized_return_pct,
-                    cumulative_return_pct = EXCLUDED.cumulative_return_pct,
-                    volatility_pct = EXCLUDED.volatility_pct,
-                    sharpe_ratio = EXCLUDED.sharpe_ratio,
-                    sortino_ratio = EXCLUDED.sortino_ratio,
-                    max_drawdown_pct = EXCLUDED.max_drawdown_pct,
-                    calmar_ratio = EXCLUDED.calmar_ratio,
-                    last_calculated = NOW();
-                """,
-                cleaned_metrics # <-- Usamos la lista de datos limpios
-            )
-            conn.commit()
-            print(f"✅ ¡Éxito! Se han guardado {cursor.rowcount} registros de métricas en la base de datos.")
+        print("Buscando fondos con precios posteriores a los de sus métricas...")
+        dirty_isins, skipped = select_dirty_isins(read_metrics_freshness(conn), since=args.since, full=args.full)
+        print(f"Fondos a recalcular: {len(dirty_isins)} | omitidos (sin cambios o sin precios): {skipped}")
+        if not dirty_isins:
+            print("No hay fondos pendientes de recalcular. Finalizando.")
+            return
     except Exception as e:
-        print(f"❌ Error al guardar las métricas en la base de datos: {e}")
+        print(f"❌ Error al leer datos de la base de datos: {e}")
+        exit()
     finally:
         if conn:
             conn.close()
 
-print("\n--- Worker de Métricas finalizado ---")
\ No newline at end of file
+    # --- 2. CALCULAR Y GUARDAR MÉTRICAS ---
+    # Un único escritor por lotes en su propia conexión; la lectura va por otras conexiones
+    write_conn = get_db_connection()
+    if not write_conn:
+        exit()
+
+    t0 = time.perf_counter()
+    try:
+        writer = MetricsWriter(write_conn)
+        if args.jobs > 1:
+            print(f"Calculando en paralelo con {args.jobs} procesos...")
+            processed = compute_metrics_parallel(dirty_isins, writer, args.jobs)
+        else:
+            # Cursor con nombre: un fondo en memoria cada vez
+            with db_connection() as read_conn:
+                if not read_conn:
+                    exit()
+                processed = compute_metrics_streaming(read_conn, dirty_isins, writer)
+        elapsed = time.perf_counter() - t0
+        print(f"✅ ¡Éxito! {processed} fondos procesados y {writer.written} registros de métricas guardados "
+              f"en {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} fondos/s).")
+    except Exception as e:
+        print(f"❌ Error al calcular o guardar las métricas: {e}")
+        write_conn.rollback()
+    finally:
+        write_conn.close()
+
+    print("\n--- Worker de Métricas finalizado ---")
+
+
+if __name__ == "__main__":
+    main()
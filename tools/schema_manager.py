@@ -0,0 +1,350 @@
+# tools/schema_manager.py
+"""
+Crea y migra el esquema de PostgreSQL (funds, historical_prices, fund_metrics
+y asset_requests) y sus índices. Cada migración se aplica una sola vez en su
+propia transacción y queda registrada en la tabla schema_migrations, así que
+el script se puede ejecutar tantas veces como se quiera.
+
+Uso:
+    python tools/schema_manager.py                     # aplica las migraciones pendientes
+    python tools/schema_manager.py --status            # muestra qué migraciones faltan
+    python tools/schema_manager.py --cluster           # reordena físicamente historical_prices por (isin, date)
+    python tools/schema_manager.py --partition-by-year # convierte historical_prices en tabla particionada por año
+"""
+
+import sys
+import os
+import argparse
+from datetime import date
+
+# Añadimos el directorio raíz al path para poder importar desde 'src'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db_connector import db_connection
+
+METRIC_COLUMNS = [
+    "annualized_return_pct", "cumulative_return_pct", "volatility_pct", "sharpe_ratio",
+    "sortino_ratio", "max_drawdown_pct", "calmar_ratio",
+]
+
+# Años hacia delante para los que se crean particiones vacías de antemano
+PARTITION_YEARS_AHEAD = 1
+
+PARTITION_MIGRATION = "partition_historical_prices_by_year"
+
+_CREATE_MIGRATIONS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version TEXT PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+# --- Migraciones (versión, descripción, SQL). Solo se añaden al final. ---
+MIGRATIONS = [
+    ("001_base_tables", "Tablas base del catálogo, precios, métricas y peticiones", """
+        CREATE TABLE IF NOT EXISTS funds (
+            isin TEXT PRIMARY KEY,
+            performance_id TEXT,
+            security_id TEXT,
+            name TEXT,
+            ter DOUBLE PRECISION,
+            morningstar_category TEXT,
+            gestora TEXT,
+            domicilio TEXT,
+            srri INTEGER,
+            currency TEXT,
+            last_updated_metadata TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE TABLE IF NOT EXISTS historical_prices (
+            isin TEXT NOT NULL,
+            date DATE NOT NULL,
+            nav DOUBLE PRECISION,
+            PRIMARY KEY (isin, date)
+        );
+        CREATE TABLE IF NOT EXISTS fund_metrics (
+            isin TEXT NOT NULL,
+            horizon TEXT NOT NULL,
+            annualized_return_pct DOUBLE PRECISION,
+            cumulative_return_pct DOUBLE PRECISION,
+            volatility_pct DOUBLE PRECISION,
+            sharpe_ratio DOUBLE PRECISION,
+            sortino_ratio DOUBLE PRECISION,
+            max_drawdown_pct DOUBLE PRECISION,
+            calmar_ratio DOUBLE PRECISION,
+            last_calculated TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (isin, horizon)
+        );
+        CREATE TABLE IF NOT EXISTS asset_requests (
+            id SERIAL PRIMARY KEY,
+            isin TEXT NOT NULL,
+            requested_by_uid TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            processed_at TIMESTAMPTZ
+        );
+    """),
+    ("002_existing_tables_keys", "Clave (isin, date) y columnas recientes de fund_metrics en bases de datos anteriores", """
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'historical_prices'::regclass AND contype = 'p'
+            ) THEN
+                ALTER TABLE historical_prices ADD PRIMARY KEY (isin, date);
+            END IF;
+        END $$;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS calmar_ratio DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS last_calculated TIMESTAMPTZ NOT NULL DEFAULT NOW();
+        CREATE INDEX IF NOT EXISTS asset_requests_pending_idx ON asset_requests (isin) WHERE status = 'pending';
+    """),
+    ("003_historical_prices_date_brin", "Índice BRIN sobre historical_prices(date)", """
+        CREATE INDEX IF NOT EXISTS historical_prices_date_brin
+            ON historical_prices USING brin (date) WITH (pages_per_range = 32);
+    """),
+    ("004_historical_prices_cluster_on_pk", "Marca la clave (isin, date) como índice de CLUSTER", """
+        DO $$
+        DECLARE
+            pk_index TEXT;
+        BEGIN
+            SELECT c.relname INTO pk_index
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = 'historical_prices'::regclass AND i.indisprimary;
+            IF pk_index IS NOT NULL
+               AND (SELECT relkind FROM pg_class WHERE oid = 'historical_prices'::regclass) = 'r' THEN
+                EXECUTE format('ALTER TABLE historical_prices CLUSTER ON %I', pk_index);
+            END IF;
+        END $$;
+    """),
+    ("005_fund_metrics_horizon_covering", "Índice cubriente de fund_metrics por (horizon, isin)", f"""
+        CREATE INDEX IF NOT EXISTS fund_metrics_horizon_isin_covering
+            ON fund_metrics (horizon, isin) INCLUDE ({', '.join(METRIC_COLUMNS)}, last_calculated);
+    """),
+    ("006_fund_metrics_risk_columns", "VaR, CVaR, índice Ulcer y duración de caídas en fund_metrics", """
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS var_hist_pct DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS cvar_hist_pct DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS var_param_pct DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS cvar_param_pct DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS ulcer_index DOUBLE PRECISION;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS max_drawdown_days INTEGER;
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS recovery_days INTEGER;
+    """),
+    ("007_fund_metrics_prices_through", "Fecha del último precio usado en cada cálculo de fund_metrics", f"""
+        ALTER TABLE fund_metrics ADD COLUMN IF NOT EXISTS prices_through DATE;
+        DROP INDEX IF EXISTS fund_metrics_horizon_isin_covering;
+        CREATE INDEX fund_metrics_horizon_isin_covering
+            ON fund_metrics (horizon, isin) INCLUDE ({', '.join(METRIC_COLUMNS)}, last_calculated, prices_through);
+    """),
+]
+
+
+def applied_migrations(conn) -> set:
+    with conn.cursor() as cursor:
+        cursor.execute(_CREATE_MIGRATIONS_TABLE_SQL)
+        cursor.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+    return versions
+
+
+def _record_migration(cursor, version: str, description: str):
+    cursor.execute(
+        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s) ON CONFLICT (version) DO NOTHING",
+        (version, description),
+    )
+
+
+def migrate(conn) -> list:
+    """Aplica en orden las migraciones pendientes. Devuelve las versiones aplicadas."""
+    done = applied_migrations(conn)
+    applied = []
+    for version, description, sql in MIGRATIONS:
+        if version in done:
+            continue
+        print(f"  -> Aplicando {version}: {description}...")
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+                _record_migration(cursor, version, description)
+            conn.commit()
+            applied.append(version)
+        except Exception as e:
+            conn.rollback()
+            print(f"  -> ❌ Error en la migración {version}: {e}")
+            raise
+    return applied
+
+
+def _is_partitioned(cursor, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def year_partition_sql(year: int, table: str = "historical_prices") -> str:
+    """DDL de la partición anual [1-ene-year, 1-ene-(year+1)) de `table`."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table}_{year} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    )
+
+
+def ensure_year_partitions(conn, through_year: int | None = None) -> list:
+    """
+    Crea las particiones anuales que falten hasta `through_year` (por defecto,
+    el año actual + PARTITION_YEARS_AHEAD). No hace nada si la tabla no está
+    particionada. Los años con filas ya en la partición DEFAULT se omiten.
+    """
+    through_year = through_year or date.today().year + PARTITION_YEARS_AHEAD
+    created = []
+    with conn.cursor() as cursor:
+        if not _is_partitioned(cursor, "historical_prices"):
+            return created
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'historical_prices'::regclass AND c.relname ~ '^historical_prices_[0-9]{4}$'
+        """)
+        years = [int(row[0][-4:]) for row in cursor.fetchall()]
+        first_missing = max(years) + 1 if years else date.today().year
+        for year in range(first_missing, through_year + 1):
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM historical_prices_default WHERE date >= %s AND date < %s)",
+                (date(year, 1, 1), date(year + 1, 1, 1)),
+            )
+            if cursor.fetchone()[0]:
+                print(f"  -> ⚠️ Hay precios de {year} en la partición DEFAULT; no se crea historical_prices_{year}.")
+                continue
+            cursor.execute(year_partition_sql(year))
+            created.append(year)
+    conn.commit()
+    return created
+
+
+def partition_by_year(conn) -> bool:
+    """
+    Convierte historical_prices en una tabla particionada por rango de fecha
+    (una partición por año más una DEFAULT), copiando los datos en una sola
+    transacción. Es idempotente: si ya está particionada no hace nada.
+    """
+    with conn.cursor() as cursor:
+        if _is_partitioned(cursor, "historical_prices"):
+            print("  -> historical_prices ya está particionada por año.")
+            return False
+
+        print("  -> Particionando historical_prices por año (bloquea la tabla durante la copia)...")
+        try:
+            cursor.execute("LOCK TABLE historical_prices IN ACCESS EXCLUSIVE MODE")
+            cursor.execute("SELECT EXTRACT(YEAR FROM MIN(date))::int, EXTRACT(YEAR FROM MAX(date))::int FROM historical_prices")
+            first_year, last_year = cursor.fetchone()
+            today_year = date.today().year
+            first_year = first_year or today_year
+            last_year = max(last_year or today_year, today_year) + PARTITION_YEARS_AHEAD
+
+            cursor.execute("ALTER TABLE historical_prices RENAME TO historical_prices_unpartitioned")
+            cursor.execute("ALTER INDEX IF EXISTS historical_prices_date_brin RENAME TO historical_prices_unpartitioned_date_brin")
+            cursor.execute("""
+                CREATE TABLE historical_prices (
+                    isin TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    nav DOUBLE PRECISION,
+                    PRIMARY KEY (isin, date)
+                ) PARTITION BY RANGE (date)
+            """)
+            for year in range(first_year, last_year + 1):
+                cursor.execute(year_partition_sql(year))
+            cursor.execute("CREATE TABLE historical_prices_default PARTITION OF historical_prices DEFAULT")
+            cursor.execute("""
+                INSERT INTO historical_prices (isin, date, nav)
+                SELECT isin, date, nav FROM historical_prices_unpartitioned ORDER BY isin, date
+            """)
+            cursor.execute("DROP TABLE historical_prices_unpartitioned")
+            cursor.execute("""
+                CREATE INDEX historical_prices_date_brin
+                    ON historical_prices USING brin (date) WITH (pages_per_range = 32)
+            """)
+            _record_migration(cursor, PARTITION_MIGRATION, "historical_prices particionada por año")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"  -> ❌ Error al particionar historical_prices: {e}")
+            raise
+    print(f"  -> ✅ historical_prices particionada ({first_year}-{last_year} + DEFAULT).")
+    return True
+
+
+def cluster_prices(conn):
+    """
+    Reescribe historical_prices en orden (isin, date) para que la lectura de
+    un fondo toque pocas páginas contiguas. Las filas nuevas se añaden al
+    final, así que conviene repetirlo de vez en cuando (p. ej. semanalmente).
+    """
+    old_autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            if _is_partitioned(cursor, "historical_prices"):
+                # CLUSTER sobre particiones solo es posible en PostgreSQL >= 15
+                cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                               "WHERE i.inhparent = 'historical_prices'::regclass ORDER BY c.relname")
+                tables = [row[0] for row in cursor.fetchall()]
+            else:
+                tables = ["historical_prices"]
+            for table in tables:
+                cursor.execute("""
+                    SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE i.indrelid = %s::regclass AND i.indisprimary
+                """, (table,))
+                row = cursor.fetchone()
+                if not row:
+                    print(f"  -> ⚠️ {table} no tiene clave primaria; se omite.")
+                    continue
+                print(f"  -> CLUSTER {table} USING {row[0]}...")
+                cursor.execute(f'CLUSTER "{table}" USING "{row[0]}"')
+                cursor.execute(f'ANALYZE "{table}"')
+    finally:
+        conn.autocommit = old_autocommit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crea y migra el esquema de la base de datos.")
+    parser.add_argument('--status', action='store_true', help="Muestra las migraciones aplicadas y pendientes sin tocar nada.")
+    parser.add_argument('--partition-by-year', action='store_true', help="Particiona historical_prices por año (opcional).")
+    parser.add_argument('--cluster', action='store_true', help="Reordena físicamente historical_prices por (isin, date).")
+    args = parser.parse_args()
+
+    print("--- Gestor de esquema de la base de datos ---")
+    with db_connection() as conn:
+        if not conn:
+            exit(1)
+
+        if args.status:
+            done = applied_migrations(conn)
+            for version, description, _ in MIGRATIONS:
+                mark = "✅" if version in done else "⏳"
+                print(f"  {mark} {version}: {description}")
+            if PARTITION_MIGRATION in done:
+                print(f"  ✅ {PARTITION_MIGRATION}")
+            return
+
+        applied = migrate(conn)
+        print(f"✅ {len(applied)} migraciones aplicadas." if applied else "✅ El esquema ya estaba al día.")
+
+        if args.partition_by_year:
+            partition_by_year(conn)
+        created = ensure_year_partitions(conn)
+        if created:
+            print(f"✅ Particiones anuales creadas: {', '.join(map(str, created))}.")
+
+        if args.cluster:
+            cluster_prices(conn)
+            print("✅ historical_prices reordenada por (isin, date).")
+
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE historical_prices")
+            cursor.execute("ANALYZE fund_metrics")
+        conn.commit()
+
+    print("\n--- Gestor de esquema finalizado ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# tools/synthetic_loader.py
+"""
+Carga una base de datos PostgreSQL local con un catálogo sintético (semilla
+fija) en las mismas tablas que usa la aplicación: funds, historical_prices,
+fund_metrics y asset_requests. Sirve para perfilar los workers y las páginas
+a escala sin tocar Morningstar.
+
+Los datos van a un esquema aparte (`synthetic` por defecto, nunca `public`)
+creado con las migraciones de schema_manager; para apuntar la app o los
+workers a él basta con PGOPTIONS="-c search_path=synthetic". Todo se escribe
+con COPY: los precios en formato binario, por bloques de fondos, y el
+resto en CSV.
+
+Uso:
+    python tools/synthetic_loader.py --funds 20000 --years 20    # ~100M de precios
+    python tools/synthetic_loader.py --funds 1000 --skip-metrics  # sin fund_metrics (para probar el worker)
+    python tools/synthetic_loader.py --drop                       # elimina el esquema
+"""
+
+import sys
+import os
+import io
+import time
+import argparse
+
+import numpy as np
+
+SCHEMA = "synthetic"
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Carga datos sintéticos en PostgreSQL para pruebas de carga.")
+    parser.add_argument('--funds', type=int, default=20000)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--schema', type=str, default=SCHEMA)
+    parser.add_argument('--chunk-funds', type=int, default=200, help="Fondos por transacción de COPY.")
+    parser.add_argument('--requests', type=int, default=None,
+                        help="Filas de asset_requests (por defecto, el 1%% de los fondos).")
+    parser.add_argument('--skip-metrics', action='store_true', help="No rellena fund_metrics.")
+    parser.add_argument('--drop', action='store_true', help="Elimina el esquema y termina.")
+    return parser.parse_args()
+
+
+args = _parse_args() if __name__ == "__main__" else None
+if args is not None:
+    if args.schema == "public":
+        sys.exit("❌ El esquema 'public' es el de la aplicación: usa otro con --schema.")
+    # Todas las conexiones del pool usan el esquema sintético
+    os.environ["PGOPTIONS"] = f"{os.environ.get('PGOPTIONS', '')} -c search_path={args.schema}".strip()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.db_connector import db_connection
+from src.metrics_pipeline import METRIC_ROW_COLUMNS, fund_metric_rows, clean_metric_row
+from src.price_reader import encode_copy_binary
+from src.synthetic_data import synthetic_catalog, synthetic_fund_histories, synthetic_isin
+from tools.schema_manager import migrate
+
+_PRICES_COPY_SQL = "COPY historical_prices (isin, date, nav) FROM STDIN WITH (FORMAT binary)"
+_METRICS_COPY_SQL = f"COPY fund_metrics ({', '.join(METRIC_ROW_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+_FUNDS_COPY_SQL = (
+    "COPY funds (isin, performance_id, security_id, name, ter, morningstar_category, gestora, domicilio, srri, currency) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+_REQUESTS_COPY_SQL = (
+    "COPY asset_requests (isin, requested_by_uid, status, created_at, processed_at) FROM STDIN WITH (FORMAT csv)"
+)
+
+
+def _copy_csv(cursor, sql: str, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join("" if value is None else str(value) for value in row) + "\n")
+    buffer.seek(0)
+    cursor.copy_expert(sql, buffer)
+
+
+def prepare_schema(conn, schema: str):
+    """Crea el esquema con las migraciones de la app y vacía sus tablas."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+    conn.commit()
+    migrate(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("TRUNCATE funds, historical_prices, fund_metrics, asset_requests RESTART IDENTITY")
+    conn.commit()
+
+
+def load_catalog(conn, n_funds: int, seed: int):
+    catalog = synthetic_catalog(n_funds, seed=seed)
+    buffer = io.StringIO()
+    catalog.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.copy_expert(_FUNDS_COPY_SQL, buffer)
+    conn.commit()
+    print(f"✅ {n_funds:,} fondos en funds.")
+
+
+def load_prices_and_metrics(conn, n_funds: int, years: int, seed: int, chunk_funds: int, with_metrics: bool):
+    """COPY de los precios (y sus métricas) por bloques de `chunk_funds` fondos, un commit por bloque."""
+    t0 = time.perf_counter()
+    total_prices = total_metrics = 0
+    for first_code in range(0, n_funds, chunk_funds):
+        size = min(chunk_funds, n_funds - first_code)
+        funds = list(synthetic_fund_histories(size, years=years, seed=seed, first_code=first_code))
+        funds = [(synthetic_isin(code), dates, navs) for code, dates, navs in funds]
+        total_prices += sum(len(dates) for _, dates, _ in funds)
+        metrics = []
+        if with_metrics:
+            for isin, dates, navs in funds:
+                metrics.extend(clean_metric_row(row) for row in fund_metric_rows(isin, dates, navs))
+
+        payload = io.BytesIO(encode_copy_binary(funds))
+        with conn.cursor() as cursor:
+            cursor.copy_expert(_PRICES_COPY_SQL, payload)
+            if metrics:
+                _copy_csv(cursor, _METRICS_COPY_SQL, metrics)
+        conn.commit()
+        total_metrics += len(metrics)
+
+        elapsed = time.perf_counter() - t0
+        print(f"  -> {first_code + size:,}/{n_funds:,} fondos, {total_prices:,} precios "
+              f"({total_prices / elapsed:,.0f} filas/s)")
+    print(f"✅ {total_prices:,} precios y {total_metrics:,} filas de fund_metrics en {time.perf_counter() - t0:.1f}s.")
+
+
+def load_requests(conn, n_funds: int, n_requests: int, seed: int):
+    """
+    Peticiones ya procesadas de fondos del catálogo y, en una de cada cinco,
+    peticiones pendientes de ISINs que aún no están en funds.
+    """
+    rng = np.random.default_rng(seed)
+    n_pending = n_requests // 5
+    processed_codes = rng.choice(n_funds, size=min(n_requests - n_pending, n_funds), replace=False)
+    rows = [
+        (synthetic_isin(int(code)), f"uid-{int(rng.integers(1000)):04d}", 'processed', '2025-01-01', '2025-01-02')
+        for code in np.sort(processed_codes)
+    ]
+    rows += [
+        (synthetic_isin(n_funds + i), f"uid-{int(rng.integers(1000)):04d}", 'pending', '2025-06-30', None)
+        for i in range(n_pending)
+    ]
+    with conn.cursor() as cursor:
+        _copy_csv(cursor, _REQUESTS_COPY_SQL, rows)
+    conn.commit()
+    print(f"✅ {len(rows):,} filas en asset_requests ({n_pending:,} pendientes).")
+
+
+def main():
+    with db_connection() as conn:
+        if not conn:
+            exit(1)
+        if args.drop:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            conn.commit()
+            print(f"✅ Esquema '{args.schema}' eliminado.")
+            return
+
+        print(f"📦 Cargando {args.funds:,} fondos x {args.years} años (semilla {args.seed}) en el esquema '{args.schema}'...")
+        prepare_schema(conn, args.schema)
+        with conn.cursor() as cursor:
+            # Datos regenerables: no hace falta esperar al WAL en cada commit
+            cursor.execute("SET synchronous_commit = off")
+        load_catalog(conn, args.funds, args.seed)
+        load_prices_and_metrics(conn, args.funds, args.years, args.seed, args.chunk_funds,
+                                with_metrics=not args.skip_metrics)
+        n_requests = args.requests if args.requests is not None else max(1, args.funds // 100)
+        load_requests(conn, args.funds, n_requests, args.seed)
+
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE funds, historical_prices, fund_metrics, asset_requests")
+        conn.commit()
+    print(f"\n🏁 Listo. Usa PGOPTIONS=\"-c search_path={args.schema}\" para apuntar la app y los workers a estos datos.")
+
+
+if __name__ == "__main__":
+    main()